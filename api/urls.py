@@ -55,6 +55,7 @@ urlpatterns = [
     path("courier/", include("courier.urls")),
     path("stories/", include("stories.urls")),
     path("restauraunt-mobile/", include("restaurant.urls")),
+    path("rkeeper/", include("rkeeper.urls")),
     path("", include("common.urls")),
     path("", include("payment.urls")),
     # Подключенные API
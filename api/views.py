@@ -1,11 +1,13 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from base.db_router import ReplicaReadMixin
+
 from . import services
 from .models import LastVersions
 
 
-class SearchView(APIView):
+class SearchView(ReplicaReadMixin, APIView):
     def get(self, *args, **kwargs):
         search_text = self.request.query_params.get("search")
         return Response(data=services.search_results(search_text, self.request))
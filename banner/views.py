@@ -3,6 +3,8 @@ from rest_framework.viewsets import ViewSetMixin
 from rest_framework.generics import ListAPIView
 from rest_framework.pagination import LimitOffsetPagination
 
+from common.cache import cached_response
+
 from .filters import BannerFilter
 from .models import Banner
 from .serializers import BannerSerializer
@@ -23,6 +25,10 @@ class BannerViewSet(ViewSetMixin, ListAPIView):
         context['lat'] = self.request.query_params.get('lat')
         context['long'] = self.request.query_params.get('long')
         return context
+
+    @cached_response(tags=["banner", "institution"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
     # permission_classes = [IsAuthenticated]
 
     # def get_queryset(self):
@@ -1,4 +1,7 @@
+import json
 from collections import OrderedDict
+
+from django.db import DatabaseError
 from django.utils import timezone
 
 from rest_framework import viewsets, pagination
@@ -70,3 +73,72 @@ class DynamicPagination(pagination.PageNumberPagination):
                 ]
             )
         )
+
+
+def get_approximate_count(queryset, exact_below=1000):
+    """
+    Row count estimated by the query planner. Small results are counted exactly since
+    that is cheap and the estimate is least accurate there.
+    """
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))[0]["Plan"]
+        estimate = int(plan["Plan Rows"])
+    except (DatabaseError, ValueError, LookupError, TypeError):
+        return queryset.count()
+    if estimate < exact_below:
+        return queryset.count()
+    return estimate
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Pagination by "-id" keyset, without OFFSET and COUNT(*) over the whole queryset.
+    "count" is approximate for large querysets.
+    """
+
+    page_size = 20
+    page_size_query_param = "per_page"
+    max_page_size = 100
+    ordering = "-id"
+    exact_count_below = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = get_approximate_count(queryset, self.exact_count_below)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class KeysetModeMixin:
+    """
+    Lets clients of a page number paginator opt in to KeysetPagination by passing the
+    "cursor" query parameter, empty for the first page.
+    """
+
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_pagination_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class KeysetDynamicPagination(KeysetModeMixin, DynamicPagination):
+    pass
@@ -0,0 +1,105 @@
+"""
+Token and JWT authentication that skips the database for recently seen credentials.
+
+Users are cached by id in the default (Redis) cache and, for a few seconds, in the
+process itself; token keys are cached as the id of their user. Saving or deleting a
+user and deleting a token drop the Redis entries (see forget_user, forget_token), so a
+password or is_active change is seen everywhere after at most AUTH_LOCAL_CACHE_TIMEOUT.
+"""
+import pickle
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = "auth:user:{}"
+TOKEN_KEY = "auth:token:{}"
+LOCAL_CACHE_SIZE = 10_000
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def get_local(key):
+    entry = _local.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    # every request gets its own instance
+    return pickle.loads(entry[1])
+
+
+def set_local(key, value):
+    with _local_lock:
+        if len(_local) >= LOCAL_CACHE_SIZE:
+            _local.pop(next(iter(_local)))
+        _local[key] = (time.monotonic() + settings.AUTH_LOCAL_CACHE_TIMEOUT, pickle.dumps(value))
+
+
+def get_cached(key):
+    value = get_local(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            set_local(key, value)
+    return value
+
+
+def set_cached(key, value):
+    cache.set(key, value, settings.AUTH_CACHE_TIMEOUT)
+    set_local(key, value)
+
+
+def forget(key):
+    _local.pop(key, None)
+    cache.delete(key)
+
+
+def forget_user(user_id):
+    forget(USER_KEY.format(user_id))
+
+
+def forget_token(key):
+    forget(TOKEN_KEY.format(key))
+
+
+def get_cached_user(user_id):
+    return get_cached(USER_KEY.format(user_id))
+
+
+def cache_user(user):
+    # a copy without related objects, they would be served stale from the cache
+    cached = pickle.loads(pickle.dumps(user))
+    cached._state.fields_cache = {}
+    set_cached(USER_KEY.format(user.pk), cached)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user_id = get_cached(TOKEN_KEY.format(key))
+        user = get_cached_user(user_id) if user_id is not None else None
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            set_cached(TOKEN_KEY.format(key), user.pk)
+            cache_user(user)
+            return user, token
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        return user, self.get_model()(key=key, user=user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user = None
+        if api_settings.USER_ID_CLAIM in validated_token:
+            user = get_cached_user(validated_token[api_settings.USER_ID_CLAIM])
+        if user is None or not user.is_active:
+            user = super().get_user(validated_token)
+            cache_user(user)
+        return user
@@ -0,0 +1,143 @@
+"""
+Base of the websocket consumers pushing order and courier events to clients.
+
+Consumers are fully async, so an idle socket costs one coroutine instead of a thread pool
+slot per handler call and a daphne process can hold tens of thousands of them.
+
+A socket reconnecting with ?last_event_id=<id> first receives the events of its streamed
+groups published after that id. If some of them are no longer retained it gets
+{"type": "resync"} instead and has to refetch the full lists.
+"""
+import os
+import time
+from urllib.parse import parse_qs
+
+import orjson
+import redis
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from redis import asyncio as aioredis
+
+from base.renderers import dumps
+from common.events import (
+    EVENT_ID_RE,
+    get_stream_key,
+    get_subscription_groups,
+    is_streamed,
+    parse_event_id,
+)
+from common.metrics import websocket_connected, websocket_disconnected
+
+
+class GroupJsonConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Joins the groups returned by get_group_names() on connect and leaves them on
+    disconnect. Group event handlers of subclasses send the event on as JSON.
+    """
+
+    # label of the websocket_connections metric
+    group_type = None
+
+    def get_group_names(self):
+        raise NotImplementedError
+
+    def get_query_param(self, name):
+        values = parse_qs(self.scope["query_string"].decode()).get(name)
+        return values[0] if values else None
+
+    async def connect(self):
+        # last replayed event id per stream, live copies of these events are skipped
+        self.replayed_ids = {}
+        self.group_names = self.get_group_names()
+        for group_name in self.group_names:
+            await self.channel_layer.group_add(group_name, self.channel_name)
+        await self.accept()
+        websocket_connected(self.group_type)
+
+        last_event_id = self.get_query_param("last_event_id")
+        if last_event_id is not None:
+            await self.replay_events(last_event_id)
+
+    async def get_missed_events(self, last_event_id):
+        """Events of the streamed groups after last_event_id, None if some were trimmed."""
+        last = parse_event_id(last_event_id)
+        client = aioredis.StrictRedis(
+            host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+        )
+        missed = []
+        try:
+            for group_name in self.group_names:
+                if not is_streamed(group_name):
+                    continue
+                key = get_stream_key(group_name)
+                try:
+                    info = await client.xinfo_stream(key)
+                except redis.ResponseError:
+                    # no stream: nothing was published to the group within its ttl
+                    if last[0] / 1000 < time.time() - settings.WEBSOCKET_STREAM_TTL:
+                        return None
+                    continue
+                trimmed = info.get("max-deleted-entry-id")
+                if trimmed is not None and parse_event_id(trimmed.decode()) > last:
+                    return None
+                for event_id, fields in await client.xrange(key, min=f"({last_event_id}"):
+                    event_id = event_id.decode()
+                    event = orjson.loads(fields[b"event"])
+                    missed.append({**event, "event_id": event_id, "event_stream": group_name})
+        finally:
+            await client.aclose()
+        return sorted(missed, key=lambda event: parse_event_id(event["event_id"]))
+
+    async def replay_events(self, last_event_id):
+        missed = None
+        if EVENT_ID_RE.match(last_event_id):
+            try:
+                missed = await self.get_missed_events(last_event_id)
+            except redis.RedisError:
+                missed = None
+        if missed is None:
+            await self.send_json({"type": "resync"})
+            return
+        for event in missed:
+            self.replayed_ids[event["event_stream"]] = parse_event_id(event["event_id"])
+            await self.send_json(event)
+
+    async def disconnect(self, code):
+        group_names = getattr(self, "group_names", None)
+        if group_names is None:
+            return
+        websocket_disconnected(self.group_type)
+        for group_name in group_names:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content).decode()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # the streams are one way, whatever clients send is ignored
+        pass
+
+    async def forward_event(self, event):
+        replayed = self.replayed_ids.get(event.get("event_stream"))
+        if replayed is not None and parse_event_id(event["event_id"]) <= replayed:
+            return
+        await self.send_json(event)
+
+
+class PartitionedGroupConsumer(GroupJsonConsumer):
+    """
+    Subscribes to one partition of "base_group": ?branch=<id> or ?region=<id>. Sockets
+    passing neither keep receiving every event through the global group.
+    """
+
+    base_group = None
+
+    def get_group_names(self):
+        region_id = self.get_query_param("region")
+        branch_id = self.get_query_param("branch")
+        return get_subscription_groups(
+            self.base_group,
+            region_id=int(region_id) if region_id and region_id.isdigit() else None,
+            branch_id=int(branch_id) if branch_id and branch_id.isdigit() else None,
+        )
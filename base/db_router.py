@@ -0,0 +1,133 @@
+"""
+Routing of read-only traffic to the "replica" database.
+
+Reads go to the replica only inside replica_reads(), which ReplicaReadMixin enters for
+safe requests, and only while the replica lag is within REPLICA_MAX_LAG seconds. Users who
+have just written are pinned to the primary for REPLICA_PIN_SECONDS so they read their
+own writes. Without a "replica" alias in DATABASES everything stays on "default".
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB = "replica"
+REPLICA_LAG_CHECK_INTERVAL = 5
+PIN_CACHE_KEY = "db:primary-pin:{}"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_replica_state = {"checked_at": None, "available": False}
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def get_replica_lag():
+    with connections[REPLICA_DB].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def is_replica_available():
+    """Replica lag guard, checked at most every REPLICA_LAG_CHECK_INTERVAL seconds."""
+    if REPLICA_DB not in settings.DATABASES:
+        return False
+
+    checked_at = _replica_state["checked_at"]
+    if checked_at is None or time.monotonic() - checked_at > REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = get_replica_lag()
+        except DatabaseError as e:
+            logger.warning(f"Replica is unavailable: {e}")
+            available = False
+        else:
+            available = lag <= settings.REPLICA_MAX_LAG
+            if not available:
+                logger.warning(f"Replica lags {lag:.1f}s behind, reading from primary")
+        _replica_state.update(checked_at=time.monotonic(), available=available)
+    return _replica_state["available"]
+
+
+def pin_to_primary(user):
+    cache.set(PIN_CACHE_KEY.format(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and cache.get(PIN_CACHE_KEY.format(user.pk)) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        # reads inside a transaction on the primary must see its own writes and locks
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if is_replica_available():
+            return REPLICA_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB
+
+
+class ReplicaReadMixin:
+    """Serves safe requests of a read-only view from the replica."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(request.user):
+            self._replica_token = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryPinMiddleware:
+    """Pins users to the primary after a successful write request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user)
+        return response
@@ -7,3 +7,8 @@ def set_obj_deleted(obj, user):
     obj.deleted_at = timezone.now()
     obj.deleted_user = user
     obj.save()
+
+
+def get_client_ip(request):
+    """nginx passes the peer address as X-Real-IP, clients can't forge it."""
+    return request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR")
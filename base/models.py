@@ -1,7 +1,7 @@
 import os
 from datetime import time
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 from base.enums import DayOfWeekChoices
@@ -40,6 +40,57 @@ class FileCleanupMixin:
         super().delete(*args, **kwargs)
 
 
+class ImageVariantsModel(models.Model):
+    """
+    Models whose images are post-processed in background into THUMBNAIL_ALIASES sizes and
+    WebP/AVIF variants. URLs are kept in "image_variants" keyed by field name.
+    """
+
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты изображений"
+    )
+    # field name -> side of the square the source is cropped to, or None to keep proportions
+    image_variant_fields = {"image": None}
+
+    class Meta:
+        abstract = True
+
+    def get_stale_image_variant_fields(self):
+        stale = []
+        for field_name in self.image_variant_fields:
+            field_file = getattr(self, field_name)
+            entry = (self.image_variants or {}).get(field_name)
+            if field_file and (entry is None or entry.get("source") != field_file.name):
+                stale.append(field_name)
+            elif not field_file and entry is not None:
+                stale.append(field_name)
+        return stale
+
+    def save(self, *args, **kwargs):
+        # "image_variants" is written by the background job only, an instance loaded
+        # before the job finished must not put the old variants back
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "image_variants"
+            ]
+        super().save(*args, **kwargs)
+        # checked against the in-memory variants, a job queued for a stale copy finds the
+        # stored ones up to date and does nothing
+        stale = self.get_stale_image_variant_fields()
+        if stale:
+            from common.tasks import generate_image_variants
+
+            transaction.on_commit(
+                lambda: generate_image_variants.delay(self._meta.label, self.pk, stale)
+            )
+
+
 class TimeStampedModel(models.Model):
     """
     Models that have "created_at" and "created_user" fields
@@ -1,13 +1,19 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
-from institution.models import Institution, InstitutionCategory
-from product.models import Product
+from django.db.models import Q
 from PIL import Image
-from io import BytesIO
-import logging
-from django.db.models import Model, Q
+
 from banner.models import Banner
+from base.models import ImageVariantsModel
+from common.tasks import generate_image_variants
+from institution.models import Institution, InstitutionCategory
+from product.models import Product
 
 
 class NEW_RESOLUTIONS:
@@ -17,68 +23,165 @@ class NEW_RESOLUTIONS:
     BANNER = (1680, 420)
 
 
+MANIFEST_SAVE_EVERY = 200
+
+
 class Command(BaseCommand):
     help = "Resize Thumbnails to new resolution"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--manifest",
+            default=os.path.join(settings.MEDIA_ROOT, ".resize_manifest.json"),
+            help="File with content hashes of already processed images",
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Ignore the manifest and process every image"
+        )
+
     def handle(self, *args, **options):
-        # TO_HANDLE
-        # institution/models.py Institution.image
-        # product/models.py Product.image
-        logging.info("Started resizing ")
-
-        institutions = Institution.objects.all().exclude(image="").exclude(image__isnull=True)
-        for institution in institutions:
-            resize_image_of_object(
-                handler=self,
-                obj=institution,
-                attrnames=["image"],
-                resolution=NEW_RESOLUTIONS.RESTAURANT,
-            )
+        manifest_path = options["manifest"]
+        manifest = {} if options["force"] else load_manifest(manifest_path)
 
-        products = Product.objects.all().exclude(image="").exclude(image__isnull=True)
-        for product in products:
-            resize_image_of_object(
-                handler=self, obj=product, attrnames=["image"], resolution=NEW_RESOLUTIONS.PRODUCT
-            )
+        # a file shared by several rows must be resized only once
+        images = {}
+        owners = {}
+        for name, resolution, label, owner in collect_images():
+            images.setdefault(name, (resolution, label))
+            owners.setdefault(name, []).append(owner)
+        jobs = [
+            (name, resolution, label, manifest.get(name))
+            for name, (resolution, label) in images.items()
+        ]
+        total = len(jobs)
+        self.stdout.write(f"Images to check: {total}, workers: {options['workers']}")
 
-        banners = Banner.objects.all().filter(
-            Q(img_ru__isnull=False) & Q(img_uz__isnull=False) & Q(img_en__isnull=False)
-        )
-        for banner in banners:
-            resize_image_of_object(
-                handler=self,
-                obj=banner,
-                attrnames=["img_ru", "img_uz", "img_en"],
-                resolution=NEW_RESOLUTIONS.BANNER,
-            )
+        counts = {"RESIZED": 0, "SKIPPING": 0, "IMAGE NOT FOUND": 0, "ERROR": 0}
+        resized = []
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [executor.submit(resize_image, *job) for job in jobs]
+            for index, future in enumerate(as_completed(futures), start=1):
+                name, status, digest, label = future.result()
+                counts[status] += 1
+                if status == "RESIZED":
+                    resized.append(name)
+                if digest is not None:
+                    manifest[name] = digest
+
+                style = {
+                    "RESIZED": self.style.SUCCESS,
+                    "SKIPPING": self.style.SUCCESS,
+                    "IMAGE NOT FOUND": self.style.WARNING,
+                }.get(status, self.style.ERROR)
+                self.stdout.write(style(f"[{index}/{total}] {status}: {label}"))
 
-        categories = InstitutionCategory.objects.all().exclude(image__isnull=True)
-        for category in categories:
-            resize_image_of_object(
-                handler=self, obj=category, attrnames=["image"], resolution=NEW_RESOLUTIONS.CATEGORY
+                if index % MANIFEST_SAVE_EVERY == 0:
+                    save_manifest(manifest_path, manifest)
+
+        save_manifest(manifest_path, manifest)
+        refresh_image_variants(owner for name in resized for owner in owners[name])
+        self.stdout.write(", ".join(f"{status}: {count}" for status, count in counts.items()))
+
+
+def collect_images():
+    """Yields (storage name, resolution, label, (model, pk, field name)) of every image to process."""
+    sources = [
+        (Institution.objects.all(), ["image"], NEW_RESOLUTIONS.RESTAURANT),
+        (Product.objects.all(), ["image"], NEW_RESOLUTIONS.PRODUCT),
+        (Banner.objects.all(), ["img_ru", "img_uz", "img_en"], NEW_RESOLUTIONS.BANNER),
+        (InstitutionCategory.objects.all(), ["image"], NEW_RESOLUTIONS.CATEGORY),
+    ]
+    for queryset, attrnames, resolution in sources:
+        obj_type = queryset.model.__name__
+        for attrname in attrnames:
+            if is_cropped_by_variants_job(queryset.model, attrname):
+                continue
+            rows = (
+                queryset.exclude(Q(**{attrname: ""}) | Q(**{f"{attrname}__isnull": True}))
+                .values_list("id", attrname)
+                .iterator()
             )
+            for pk, name in rows:
+                yield name, resolution, f"{obj_type} > {pk}", (queryset.model, pk, attrname)
+
 
+def is_cropped_by_variants_job(model, field_name):
+    """
+    The variants job crops these sources to its own square and rewrites them, resizing
+    them here too would make the two undo each other on every run.
+    """
+    return (
+        issubclass(model, ImageVariantsModel)
+        and model.image_variant_fields.get(field_name) is not None
+    )
 
-def resize_image_of_object(
-    handler: BaseCommand, obj: Model, attrnames: list, resolution: tuple[int, int]
-) -> tuple[bool, int]:
-    for attrname in attrnames:
-        object_image = getattr(obj, attrname)
-        image_path = object_image.path
-        obj_type = str(obj.__class__).split(".")[-1]
-        message_str = f"{obj_type} > {obj.id}"
-        if not os.path.exists(image_path):
-            handler.stdout.write(handler.style.WARNING(f"IMAGE NOT FOUND: {message_str}"))
+
+def refresh_image_variants(owners):
+    """
+    The files were rewritten in place under the same name, so the variants of the rows
+    look up to date. Their entries are dropped and the variants job queued again.
+    """
+    fields = {}
+    for model, pk, field_name in owners:
+        if issubclass(model, ImageVariantsModel) and field_name in model.image_variant_fields:
+            fields.setdefault((model, pk), []).append(field_name)
+
+    for (model, pk), field_names in fields.items():
+        variants = model.objects.filter(pk=pk).values_list("image_variants", flat=True).first()
+        if variants is None:
             continue
-        with Image.open(image_path) as img:
-            if img.size == resolution:
-                handler.stdout.write(handler.style.SUCCESS(f"SKIPPING: {message_str}"))
-                continue
-            img = img.resize(resolution, Image.Resampling.LANCZOS)
+        model.objects.filter(pk=pk).update(
+            image_variants={key: value for key, value in variants.items() if key not in field_names}
+        )
+        generate_image_variants.delay(model._meta.label, pk, field_names)
+
+
+def resize_image(name, resolution, label, known_digest):
+    """
+    Runs in a worker process. The file is read once; if its hash matches the manifest it
+    is not decoded at all. Returns (name, status, digest of the stored file, label).
+    """
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return name, "IMAGE NOT FOUND", None, label
+
+    digest = hashlib.sha256(content).hexdigest()
+    if digest == known_digest:
+        return name, "SKIPPING", digest, label
+
+    try:
+        with Image.open(BytesIO(content)) as img:
+            if img.size == tuple(resolution):
+                return name, "SKIPPING", digest, label
+            img.draft("RGB", resolution)
+            img = img.convert("RGB").resize(resolution, Image.Resampling.LANCZOS)
             buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=95)
-            new_image_content = ContentFile(buffer.getvalue())
-            object_image.save(object_image.name, new_image_content, save=True)
-            handler.stdout.write(handler.style.SUCCESS(f"RESIZED: {message_str}"))
-            continue
-        handler.stdout.write(handler.style.ERROR(f"UNKNOWN ERROR: {message_str}"))
+            img.save(buffer, format="JPEG", quality=85, optimize=True, progressive=True)
+    except Exception:
+        return name, "ERROR", None, label
+
+    content = buffer.getvalue()
+    with open(path, "wb") as f:
+        f.write(content)
+    return name, "RESIZED", hashlib.sha256(content).hexdigest(), label
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
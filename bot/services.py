@@ -1,4 +1,3 @@
-import asyncio
 from textwrap import dedent
 from typing import Union
 
@@ -71,21 +70,17 @@ async def update_status(call: types.CallbackQuery, order_id: int, callback_data:
 
     await message.edit_reply_markup(reply_markup=reply_markup)
 
-locks = {}
-
 async def accept_order(
     call: types.CallbackQuery,
     order_id: int,
     callback_data: OrderCallback,
 ):
-    if order_id not in locks:
-        locks[order_id] = asyncio.Lock()
-    async with locks[order_id]:
-        order = await Order.objects.aget(pk=order_id)
-        preparing_time = callback_data.preparing_time
-        success = await sync_to_async(update_order_status)(order, "accepted", int(preparing_time))
-        if success:
-            await call.answer()
+    # concurrent presses are resolved by the order version, the loser gets an error
+    order = await Order.objects.aget(pk=order_id)
+    preparing_time = callback_data.preparing_time
+    success, _ = await sync_to_async(update_order_status)(order, "accepted", int(preparing_time))
+    if success:
+        await call.answer()
 
 async def prepare_order(
     call: types.CallbackQuery,
@@ -98,7 +93,7 @@ async def prepare_order(
         await call.message.edit_reply_markup(reply_markup=None)
         return await call.answer("Заказ уже в процессе...", show_alert=True)
     
-    success = await sync_to_async(update_order_status)(order, "cooking")
+    success, _ = await sync_to_async(update_order_status)(order, "cooking")
     if success:
         await call.message.edit_reply_markup(reply_markup=None)
  
@@ -107,49 +102,41 @@ async def reject_order(
     order_id: int,
     callback_data: OrderCallback,
 ):
-    if order_id not in locks:
-        locks[order_id] = asyncio.Lock()
-
-    async with locks[order_id]:
-        order = await Order.objects.aget(pk=order_id)
-        print(order.status)
-        success = await sync_to_async(update_order_status)(order, "rejected")
-        if success:
-            await call.answer()
+    order = await Order.objects.aget(pk=order_id)
+    print(order.status)
+    success, _ = await sync_to_async(update_order_status)(order, "rejected")
+    if success:
+        await call.answer()
 
 async def ready_order(
     call: types.CallbackQuery,
     order_id: int,
     callback_data: OrderCallback,
 ):
-    if order_id not in locks:
-        locks[order_id] = asyncio.Lock()
-
-    async with locks[order_id]:
-        order = await get_order(order_id)
-        deadline = await get_timeline(order_id)
-
-        if not deadline:
-            await call.answer("Заказ еще не готов!", show_alert=True)
-            return
-        
-        if order.status == 'ready':
-            await call.answer("Заказ был готов недавно!", show_alert=True)
-            await call.message.edit_reply_markup(reply_markup=None)
-            return
-                 
-        success = await sync_to_async(update_order_status)(order, "ready")
-        if success:
-            keyboard = InlineKeyboardBuilder()
-            item_group = await get_item_group(order_id)
-            if item_group.institution.delivery_by_own:
-                keyboard.add(
-                    types.InlineKeyboardButton(
-                        text="В пути",
-                        callback_data=OrderCallback(order_id=order_id, action="shipping").pack(),
-                    ),
-                )
-            await call.message.edit_reply_markup(reply_markup=keyboard.as_markup())
+    order = await get_order(order_id)
+    deadline = await get_timeline(order_id)
+
+    if not deadline:
+        await call.answer("Заказ еще не готов!", show_alert=True)
+        return
+    
+    if order.status == 'ready':
+        await call.answer("Заказ был готов недавно!", show_alert=True)
+        await call.message.edit_reply_markup(reply_markup=None)
+        return
+             
+    success, _ = await sync_to_async(update_order_status)(order, "ready")
+    if success:
+        keyboard = InlineKeyboardBuilder()
+        item_group = await get_item_group(order_id)
+        if item_group.institution.delivery_by_own:
+            keyboard.add(
+                types.InlineKeyboardButton(
+                    text="В пути",
+                    callback_data=OrderCallback(order_id=order_id, action="shipping").pack(),
+                ),
+            )
+        await call.message.edit_reply_markup(reply_markup=keyboard.as_markup())
 
 
 async def shipping_order(call: types.CallbackQuery, order_id: int, callback_data: dict):
@@ -158,7 +145,7 @@ async def shipping_order(call: types.CallbackQuery, order_id: int, callback_data
         await call.answer("Заказ был доставлен недавно!", show_alert=True)
         await call.message.edit_reply_markup(reply_markup=None)
         return
-    success = await sync_to_async(update_order_status)(order, "shipped")
+    success, _ = await sync_to_async(update_order_status)(order, "shipped")
 
     if success:
         keyboard = InlineKeyboardBuilder()
@@ -180,7 +167,7 @@ async def close_order(call: types.CallbackQuery, order_id: int, callback_data: d
         await call.answer("Заказ был закрыт недавно!", show_alert=True)
         await call.message.edit_reply_markup(reply_markup=None)
         return
-    success = await sync_to_async(update_order_status)(order, "closed")
+    success, _ = await sync_to_async(update_order_status)(order, "closed")
     if success:
         keyboard = InlineKeyboardBuilder()
         keyboard.add(get_status_keyboard(order))
@@ -0,0 +1,162 @@
+"""
+Cached reads on top of the default (Redis) cache.
+
+Every key embeds the current versions of its tags. invalidate_tags() replaces the
+versions, so keys built with the old ones are never read again and simply expire.
+"""
+import functools
+import hashlib
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import translation
+from rest_framework.response import Response
+
+TAG_KEY = "cache-tag:{}"
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_RETRIES = 20
+# >1 refreshes earlier, see should_refresh_early
+EARLY_REFRESH_BETA = 1.0
+
+# model label -> tags of cached reads that include its rows
+MODEL_CACHE_TAGS = {
+    "institution.Institution": ["institution"],
+    "institution.InstitutionCategory": ["institution"],
+    "institution.InstitutionBranch": ["institution", "product"],
+    "product.Product": ["product"],
+    "product.ProductCategory": ["product"],
+    "product.ProductOption": ["product"],
+    "product.OptionItem": ["product"],
+    "product.ProductToBranch": ["product"],
+    "banner.Banner": ["banner"],
+    "stories.Stories": ["stories"],
+    "promo_codes.PromoCode": ["promo_code"],
+}
+# models whose rows only change responses cached with vary_on_user for their customer
+USER_CACHE_MODELS = ["product.LikedProducts", "institution.LikedInstitutions"]
+
+
+def get_tag_versions(tags):
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a fresh unique version, so an evicted tag never resurrects old keys
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    cache.set_many({TAG_KEY.format(tag): time.time_ns() for tag in tags}, None)
+
+
+def invalidate_model_tags(model):
+    """Invalidates the tags of the model once the current transaction commits."""
+    tags = MODEL_CACHE_TAGS.get(model._meta.label)
+    if tags:
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def get_user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def make_key(prefix, tags, parts):
+    versions = ".".join(str(version) for version in get_tag_versions(tags))
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f"{prefix}:{versions}:{digest}"
+
+
+def should_refresh_early(entry):
+    """
+    Probabilistic early expiration: the closer the entry is to its expiry and the longer
+    it took to compute, the likelier one reader recomputes it before everybody misses.
+    """
+    early = entry["delta"] * EARLY_REFRESH_BETA * math.log(1 - random.random())
+    return time.time() - early >= entry["expires"]
+
+
+def get_or_compute(key, compute, timeout):
+    """
+    Returns the cached value of "key" or stores the result of compute(). Only one caller
+    computes a missing value at a time, the others wait for it for up to a second.
+    A None result is returned but not cached.
+    """
+    entry = cache.get(key)
+    if entry is not None and not should_refresh_early(entry):
+        return entry["value"]
+
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return entry["value"]
+        for _ in range(LOCK_RETRIES):
+            time.sleep(LOCK_WAIT)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry["value"]
+
+    try:
+        started = time.monotonic()
+        value = compute()
+        if value is not None:
+            entry = {
+                "value": value,
+                "expires": time.time() + timeout,
+                "delta": time.monotonic() - started,
+            }
+            cache.set(key, entry, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def cached_response(tags, timeout=None, vary_on_user=False):
+    """
+    Caches successful GET responses of a DRF view method. The key varies on the view,
+    host, path, query string and language, and on the user when "vary_on_user" is set.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method != "GET":
+                return method(view, request, *args, **kwargs)
+
+            user = request.user.pk if vary_on_user and request.user.is_authenticated else None
+            key = make_key(
+                f"view:{view.__class__.__name__}:{method.__name__}",
+                [*tags, get_user_tag(user)] if user is not None else tags,
+                (
+                    request.get_host(),
+                    request.path,
+                    sorted(request.query_params.lists()),
+                    translation.get_language(),
+                    user,
+                ),
+            )
+            fresh = {}
+
+            def compute():
+                response = method(view, request, *args, **kwargs)
+                fresh["response"] = response
+                if isinstance(response, Response) and response.status_code == 200:
+                    return response.data
+                return None
+
+            data = get_or_compute(key, compute, timeout or settings.CATALOG_CACHE_TIMEOUT)
+            if "response" in fresh:
+                return fresh["response"]
+            return Response(data)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,209 @@
+"""
+Coalesced publishing of websocket group events.
+
+publish() queues an event once the current transaction commits, so rolled back changes
+are never announced. Inside publish_batch(), entered for every request by
+EventBatchMiddleware, events for the same group, type, order and item group are merged
+(later fields win) and the batch is sent at the end with one async_to_sync hop for all
+group_send calls. Outside a batch each event is sent on its own.
+
+Order events for couriers and operators are partitioned by the region and branch of the
+order's branch (get_partition_groups), so each one reaches only the sockets subscribed to
+that region or branch, plus those still subscribed to the global group.
+
+Before sending, events of streamed groups are appended to a capped Redis Stream per group.
+The stream id is sent along as "event_id", so a reconnecting socket can ask for what it
+missed with ?last_event_id=<id> (see base.consumers).
+"""
+import asyncio
+import logging
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from base.renderers import dumps
+from .metrics import CHANNEL_GROUP_EVENTS
+
+logger = logging.getLogger(__name__)
+
+_batch = ContextVar("event_batch", default=None)
+_redis = {}
+
+STREAM_KEY = "ws-stream:{}"
+# "courier_<id>" groups of courier locations are not streamed
+STREAMED_GROUPS = ("courier",)
+STREAMED_GROUP_PREFIXES = (
+    "institution_",
+    "client_",
+    "courier_region_",
+    "courier_branch_",
+    "ready_orders",
+    "operator",
+)
+EVENT_ID_RE = re.compile(r"^\d+-\d+$")
+
+# for orders of branches without a region
+NO_REGION = "none"
+
+
+class EventBatch:
+    def __init__(self):
+        self.events = {}
+
+    def add(self, group_name, event):
+        # order payloads carry the order as "order_id", AvailableOrdersSerializer ones as "id"
+        order_id = event.get("order_id", event.get("id"))
+        key = (group_name, event["type"], order_id, event.get("group_id"))
+        if key in self.events:
+            CHANNEL_GROUP_EVENTS.labels("coalesced").inc()
+            event = {**self.events[key][1], **event}
+        self.events[key] = (group_name, event)
+
+    def pop_events(self):
+        events, self.events = list(self.events.values()), {}
+        return events
+
+
+def get_redis():
+    if "client" not in _redis:
+        _redis["client"] = redis.StrictRedis(
+            host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+        )
+    return _redis["client"]
+
+
+def is_streamed(group_name):
+    return group_name in STREAMED_GROUPS or group_name.startswith(STREAMED_GROUP_PREFIXES)
+
+
+def get_stream_key(group_name):
+    return STREAM_KEY.format(group_name)
+
+
+def parse_event_id(event_id):
+    """Stream ids are "<ms>-<seq>", compared as tuples."""
+    return tuple(int(part) for part in event_id.split("-"))
+
+
+def add_to_streams(events):
+    """Returns the events with "event_id" and "event_stream" set for streamed groups."""
+    streamed = [index for index, (group_name, _) in enumerate(events) if is_streamed(group_name)]
+    if not streamed:
+        return events
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for index in streamed:
+            group_name, event = events[index]
+            key = get_stream_key(group_name)
+            pipeline.xadd(
+                key,
+                {"event": dumps(event)},
+                maxlen=settings.WEBSOCKET_STREAM_MAXLEN,
+                approximate=True,
+            )
+            pipeline.expire(key, settings.WEBSOCKET_STREAM_TTL)
+        event_ids = pipeline.execute()[::2]
+    except redis.RedisError as e:
+        # live delivery goes on, reconnecting sockets will have to refetch
+        logger.warning(f"Adding websocket events to streams failed: {e}")
+        return events
+
+    events = list(events)
+    for index, event_id in zip(streamed, event_ids):
+        group_name, event = events[index]
+        events[index] = (
+            group_name,
+            {**event, "event_id": event_id.decode(), "event_stream": group_name},
+        )
+    return events
+
+
+async def send_events(events):
+    channel_layer = get_channel_layer()
+    await asyncio.gather(
+        *(channel_layer.group_send(group_name, event) for group_name, event in events)
+    )
+
+
+def flush_events(events):
+    if events:
+        async_to_sync(send_events)(add_to_streams(events))
+        CHANNEL_GROUP_EVENTS.labels("sent").inc(len(events))
+
+
+def enqueue(group_name, event):
+    batch = _batch.get()
+    if batch is None:
+        flush_events([(group_name, event)])
+    else:
+        batch.add(group_name, event)
+
+
+def publish(group_name, event):
+    transaction.on_commit(lambda: enqueue(group_name, event))
+
+
+def get_region_group(base, region_id):
+    return f"{base}_region_{region_id or NO_REGION}"
+
+
+def get_branch_group(base, branch_id):
+    return f"{base}_branch_{branch_id}"
+
+
+def get_partition_groups(base, branch):
+    """Groups an event about an order of "branch" is published to."""
+    return [
+        base,
+        get_region_group(base, branch.region_branch_id),
+        get_branch_group(base, branch.id),
+    ]
+
+
+def get_subscription_groups(base, region_id=None, branch_id=None):
+    """
+    Groups a socket joins: one branch, one region together with orders without a region,
+    or the global group when it asks for neither.
+    """
+    if branch_id:
+        return [get_branch_group(base, branch_id)]
+    if region_id:
+        return [get_region_group(base, region_id), get_region_group(base, None)]
+    return [base]
+
+
+def publish_partitioned(base, branch, event):
+    for group_name in get_partition_groups(base, branch):
+        publish(group_name, event)
+
+
+@contextmanager
+def publish_batch():
+    """Collects the events published inside and sends them on exit, nested batches join the outer one."""
+    if _batch.get() is not None:
+        yield
+        return
+
+    batch = EventBatch()
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        flush_events(batch.pop_events())
+
+
+class EventBatchMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with publish_batch():
+            return self.get_response(request)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# format name -> (PIL format, file extension, save options)
+VARIANT_FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", "avif", {"quality": 60}),
+}
+
+
+def get_variant_formats():
+    """AVIF is produced only when the installed Pillow has the encoder."""
+    extensions = Image.registered_extensions()
+    return [name for name, (_, ext, _) in VARIANT_FORMATS.items() if f".{ext}" in extensions]
+
+
+def get_variant_aliases():
+    """THUMBNAIL_ALIASES sizes, largest first, so that every alias is derived from the previous one."""
+    aliases = settings.THUMBNAIL_ALIASES[""]
+    return sorted(
+        ((name, options["size"]) for name, options in aliases.items()),
+        key=lambda alias: alias[1][0] * alias[1][1],
+        reverse=True,
+    )
+
+
+def encode(image, format_name):
+    pil_format, _, options = VARIANT_FORMATS[format_name]
+    if pil_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def replace_source(storage, name, image):
+    extension = os.path.splitext(name)[1].lower()
+    pil_format = Image.registered_extensions().get(extension, "JPEG")
+    if pil_format == "JPEG":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format=pil_format, quality=75)
+    storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_image_variants(instance, field_name, square=None):
+    """
+    Decodes the image once and stores every THUMBNAIL_ALIASES size in every variant format.
+
+    When `square` is given the source is first center-cropped and resized to a square of
+    that side and written back to the original file. Returns the variants entry:
+    {"source": name, "<alias>": {"<format>": url, ...}, ...}.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return None
+
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name, "rb") as f:
+            image = Image.open(f)
+            image.load()
+    except FileNotFoundError:
+        return None
+
+    image = ImageOps.exif_transpose(image)
+
+    # an already cropped source is not encoded again, every pass would lose quality
+    if square and image.size != (square, square):
+        image = ImageOps.fit(image, (square, square), Image.Resampling.LANCZOS)
+        replace_source(storage, field_file.name, image)
+
+    digest = hashlib.sha1(field_file.name.encode()).hexdigest()[:10]
+    directory = f"variants/{instance._meta.label_lower}/{instance.pk}"
+
+    variants = {"source": field_file.name}
+    resized = image
+    for alias, size in get_variant_aliases():
+        resized = resized.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        variants[alias] = {}
+        for format_name in get_variant_formats():
+            extension = VARIANT_FORMATS[format_name][1]
+            name = f"{directory}/{field_name}_{alias}_{digest}.{extension}"
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(encode(resized, format_name)))
+            variants[alias][format_name] = storage.url(name)
+
+    return variants
+
+
+def delete_image_variants(storage, entry):
+    for alias, formats in entry.items():
+        if alias == "source":
+            continue
+        for url in formats.values():
+            name = url.removeprefix(settings.MEDIA_URL)
+            if storage.exists(name):
+                storage.delete(name)
@@ -0,0 +1,161 @@
+"""
+Per-request instrumentation: query count, DB time, total time and view of every request.
+
+Responses get a Server-Timing header, slow requests are logged with their most repeated
+SQL statements and per-endpoint latency histograms are accumulated in process memory and
+flushed to Redis every REQUEST_METRICS_FLUSH_INTERVAL seconds, so the hot path only
+increments a few counters.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+import redis
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets in milliseconds, the last bucket is unbounded
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRICS_KEY = "request-metrics:{}"
+METRICS_INDEX_KEY = "request-metrics:endpoints"
+REPEATED_SQL_LOGGED = 5
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def get_sql_fingerprint(sql):
+    """Django passes SQL with placeholders, only IN lists of different length differ."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class QueryCollector:
+    """execute_wrapper counting queries and their time per statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def get_repeated(self, limit=REPEATED_SQL_LOGGED):
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[get_sql_fingerprint(sql)] += count
+        return [(sql, count) for sql, count in fingerprints.most_common(limit) if count > 1]
+
+
+class EndpointStats:
+    """Latency histograms per endpoint, accumulated in memory and flushed to Redis."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+        self.redis = None
+
+    def observe(self, endpoint, total_ms, db_ms, queries):
+        bucket = next(
+            (f"le_{bound}" for bound in LATENCY_BUCKETS if total_ms <= bound), "le_inf"
+        )
+        with self.lock:
+            fields = self.pending.setdefault(endpoint, Counter())
+            fields[bucket] += 1
+            fields["count"] += 1
+            fields["total_ms"] += round(total_ms)
+            fields["db_ms"] += round(db_ms)
+            fields["queries"] += queries
+
+            if time.monotonic() - self.flushed_at < settings.REQUEST_METRICS_FLUSH_INTERVAL:
+                return
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        self.flush(pending)
+
+    def get_redis(self):
+        if self.redis is None:
+            self.redis = redis.StrictRedis(
+                host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+            )
+        return self.redis
+
+    def flush(self, pending):
+        try:
+            pipeline = self.get_redis().pipeline(transaction=False)
+            for endpoint, fields in pending.items():
+                pipeline.sadd(METRICS_INDEX_KEY, endpoint)
+                for field, value in fields.items():
+                    pipeline.hincrby(METRICS_KEY.format(endpoint), field, value)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Request metrics flush failed: {e}")
+
+
+endpoint_stats = EndpointStats()
+
+
+def get_endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return f"{request.method} <unmatched>"
+    return f"{request.method} /{match.route}"
+
+
+def get_view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name or match._func_path if match is not None else ""
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = collector.duration * 1000
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db_ms:.1f};desc="{collector.count} queries"',
+                f"app;dur={total_ms - db_ms:.1f}",
+                f"total;dur={total_ms:.1f}",
+            ]
+        )
+
+        endpoint = get_endpoint_name(request)
+        endpoint_stats.observe(endpoint, total_ms, db_ms, collector.count)
+        observe_request(endpoint, response.status_code, total_ms / 1000)
+
+        if (
+            total_ms >= settings.SLOW_REQUEST_MS
+            or collector.count >= settings.SLOW_REQUEST_QUERIES
+        ):
+            repeated = "".join(
+                f"\n  {count}x {sql[:300]}" for sql, count in collector.get_repeated()
+            )
+            logger.warning(
+                f"Slow request {endpoint} ({get_view_name(request)}) {request.get_full_path()}: "
+                f"{total_ms:.0f}ms, {collector.count} queries in {db_ms:.0f}ms{repeated}"
+            )
+        return response
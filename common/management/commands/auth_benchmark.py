@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from base.authentication import CachedJWTAuthentication, CachedTokenAuthentication
+from user.models import User
+
+
+def measure(authenticate, repeat):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            authenticate()
+        elapsed = time.perf_counter() - started
+    return elapsed / repeat * 1000, len(queries) / repeat
+
+
+class Command(BaseCommand):
+    help = "Compare the per request cost of database and cached token and JWT authentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="Defaults to the first active user with a token")
+        parser.add_argument("--repeat", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["user_id"]:
+            user = User.objects.get(pk=options["user_id"])
+        else:
+            user = User.objects.filter(is_active=True, auth_token__isnull=False).first()
+            if user is None:
+                self.stdout.write("No active user with a token")
+                return
+        key = Token.objects.get_or_create(user=user)[0].key
+        access_token = AccessToken.for_user(user)
+
+        cases = [
+            ("token", lambda: TokenAuthentication().authenticate_credentials(key)),
+            ("cached token", lambda: CachedTokenAuthentication().authenticate_credentials(key)),
+            ("jwt", lambda: JWTAuthentication().get_user(access_token)),
+            ("cached jwt", lambda: CachedJWTAuthentication().get_user(access_token)),
+        ]
+        self.stdout.write(f"{'authentication':16} {'ms':>8} {'queries':>8}")
+        for name, authenticate in cases:
+            # fills the caches, so only hits are measured
+            authenticate()
+            ms, queries = measure(authenticate, options["repeat"])
+            self.stdout.write(f"{name:16} {ms:>8.3f} {queries:>8.2f}")
@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from base.models import ImageVariantsModel
+from common.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = "Queue generate_image_variants for existing rows whose image variants are missing or stale"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", help="Model label, e.g. product.Product, defaults to all")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows")
+
+    def handle(self, *args, **options):
+        models = [
+            model
+            for model in apps.get_models()
+            if issubclass(model, ImageVariantsModel)
+            and (not options["model"] or model._meta.label in options["model"])
+        ]
+        for model in models:
+            fields = [model._meta.pk.name, "image_variants", *model.image_variant_fields]
+            queued = 0
+            for instance in model._default_manager.only(*fields).iterator(chunk_size=2000):
+                stale = instance.get_stale_image_variant_fields()
+                if not stale:
+                    continue
+                if not options["dry_run"]:
+                    generate_image_variants.delay(model._meta.label, instance.pk, stale)
+                queued += 1
+            self.stdout.write(f"{model._meta.label}: {queued} rows queued")
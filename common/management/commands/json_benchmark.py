@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from base.renderers import ORJSONRenderer, dumps
+from institution.models import Institution
+from user.models import User
+
+
+def measure(render, data, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(data)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = "Compare stdlib and orjson rendering of real API responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", action="append", dest="paths", help="API path to render, can be repeated"
+        )
+        parser.add_argument("--user-id", type=int, help="Log in as this user, needed for CRM paths")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        paths = options["paths"]
+        if not paths:
+            paths = ["/api/institutions/", "/api/crm/orders/?per_page=100"]
+            institution_id = Institution.objects.values_list("id", flat=True).first()
+            if institution_id is not None:
+                paths.insert(1, f"/api/institutions/{institution_id}/")
+
+        client = Client()
+        if options["user_id"]:
+            client.force_login(User.objects.get(pk=options["user_id"]))
+
+        stdlib, orjson = JSONRenderer(), ORJSONRenderer()
+        self.stdout.write(f"{'path':50} {'bytes':>9} {'json ms':>9} {'orjson ms':>10} {'speedup':>8}")
+        for path in paths:
+            response = client.get(path)
+            data = getattr(response, "data", None)
+            if response.status_code != 200 or data is None:
+                self.stdout.write(self.style.WARNING(f"{path}: status {response.status_code}"))
+                continue
+
+            stdlib_ms = measure(stdlib.render, data, options["repeat"])
+            orjson_ms = measure(orjson.render, data, options["repeat"])
+            self.stdout.write(
+                f"{path[:50]:50} {len(dumps(data)):>9} {stdlib_ms:>9.2f} {orjson_ms:>10.2f} "
+                f"{stdlib_ms / orjson_ms:>7.1f}x"
+            )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+
+from common.instrumentation import (
+    LATENCY_BUCKETS,
+    METRICS_INDEX_KEY,
+    METRICS_KEY,
+    endpoint_stats,
+)
+
+
+def get_percentile(fields, count, percentile):
+    """Upper bound of the bucket holding the percentile, None for the unbounded bucket."""
+    seen = 0
+    for bound in LATENCY_BUCKETS:
+        seen += fields.get(f"le_{bound}", 0)
+        if seen >= count * percentile:
+            return bound
+    return None
+
+
+class Command(BaseCommand):
+    help = "Show per-endpoint request latency and query counts collected by RequestMetricsMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sort", choices=["count", "total_ms", "queries", "p95"], default="total_ms")
+        parser.add_argument("--limit", type=int, default=30)
+        parser.add_argument("--reset", action="store_true", help="Delete collected metrics")
+
+    def handle(self, *args, **options):
+        client = endpoint_stats.get_redis()
+        endpoints = sorted(endpoint.decode() for endpoint in client.smembers(METRICS_INDEX_KEY))
+
+        if options["reset"]:
+            client.delete(METRICS_INDEX_KEY, *[METRICS_KEY.format(endpoint) for endpoint in endpoints])
+            self.stdout.write(self.style.SUCCESS(f"Deleted metrics of {len(endpoints)} endpoints"))
+            return
+
+        rows = []
+        for endpoint in endpoints:
+            fields = {
+                key.decode(): int(value)
+                for key, value in client.hgetall(METRICS_KEY.format(endpoint)).items()
+            }
+            count = fields.get("count", 0)
+            if not count:
+                continue
+            p95 = get_percentile(fields, count, 0.95)
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "count": count,
+                    "total_ms": fields.get("total_ms", 0),
+                    "avg_ms": fields.get("total_ms", 0) / count,
+                    "p50": get_percentile(fields, count, 0.5),
+                    "p95": p95,
+                    "db_ms": fields.get("db_ms", 0) / count,
+                    "queries": fields.get("queries", 0) / count,
+                }
+            )
+
+        key = options["sort"]
+        rows.sort(key=lambda row: float("inf") if row[key] is None else row[key], reverse=True)
+
+        self.stdout.write(
+            f"{'endpoint':60} {'count':>8} {'avg ms':>8} {'p50<=':>7} {'p95<=':>7} {'db ms':>8} {'queries':>8}"
+        )
+        for row in rows[: options["limit"]]:
+            self.stdout.write(
+                f"{row['endpoint'][:60]:60} {row['count']:>8} {row['avg_ms']:>8.1f} "
+                f"{row['p50'] or 'inf':>7} {row['p95'] or 'inf':>7} "
+                f"{row['db_ms']:>8.1f} {row['queries']:>8.1f}"
+            )
@@ -0,0 +1,74 @@
+import asyncio
+import resource
+import time
+
+import websockets
+from django.core.management.base import BaseCommand
+
+
+def get_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+class Command(BaseCommand):
+    help = "Open many idle websocket connections to one daphne process and report how many it holds"
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="e.g. ws://127.0.0.1:4547/ws/operator/")
+        parser.add_argument("--connections", type=int, default=10000)
+        parser.add_argument("--rate", type=int, default=500, help="New connections per second")
+        parser.add_argument("--hold", type=int, default=30, help="Seconds to keep them idle")
+        parser.add_argument("--pid", type=int, help="daphne pid on this host, to report its memory")
+
+    def handle(self, *args, **options):
+        limit = raise_open_files_limit()
+        if limit < options["connections"] + 100:
+            self.stdout.write(self.style.WARNING(f"Open files limit is {limit}, raise it with ulimit -n"))
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        pid = options["pid"]
+        rss_before = get_rss_mb(pid) if pid else None
+        sockets = []
+        failed = 0
+
+        async def open_one():
+            nonlocal failed
+            try:
+                sockets.append(await websockets.connect(options["url"], ping_interval=None))
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                failed += 1
+
+        started = time.monotonic()
+        pending = []
+        for index in range(options["connections"]):
+            pending.append(asyncio.create_task(open_one()))
+            if (index + 1) % options["rate"] == 0:
+                await asyncio.sleep(1)
+        await asyncio.gather(*pending)
+        self.stdout.write(
+            f"Opened {len(sockets)} connections in {time.monotonic() - started:.1f}s, {failed} failed"
+        )
+
+        await asyncio.sleep(options["hold"])
+        open_count = sum(1 for socket in sockets if socket.open)
+        self.stdout.write(f"Still open after {options['hold']}s idle: {open_count}")
+        if pid:
+            rss = get_rss_mb(pid)
+            self.stdout.write(
+                f"daphne RSS {rss_before:.0f}MB -> {rss:.0f}MB, "
+                f"{(rss - rss_before) * 1024 / max(open_count, 1):.1f}KB per connection"
+            )
+
+        await asyncio.gather(*(socket.close() for socket in sockets))
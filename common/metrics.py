@@ -0,0 +1,215 @@
+"""
+Prometheus metrics of the web (gunicorn, daphne), channel worker and celery processes.
+
+gunicorn and daphne serve them on /metrics/, runworker and celery workers start a
+separate HTTP server on METRICS_PORT. Processes forked by gunicorn or a prefork celery
+worker share samples through PROMETHEUS_MULTIPROC_DIR, which must be a per service
+directory emptied before the service starts.
+"""
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+
+import redis
+import requests
+from django.conf import settings
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# seconds, from a cached catalog read to a slow external call
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# seconds, from an accepted order to one delivered in two hours
+ORDER_BUCKETS = (60, 180, 300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency per endpoint",
+    ["endpoint", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open websocket connections per group type",
+    ["group_type"],
+    multiprocess_mode="livesum",
+)
+CHANNEL_MESSAGE_DURATION = Histogram(
+    "channel_message_duration_seconds",
+    "Processing time of channel messages per consumer handler",
+    ["consumer", "handler"],
+    buckets=LATENCY_BUCKETS,
+)
+CHANNEL_MESSAGE_ERRORS = Counter(
+    "channel_message_errors_total",
+    "Channel messages whose handler raised",
+    ["consumer", "handler"],
+)
+CHANNEL_GROUP_EVENTS = Counter(
+    "channel_group_events_total",
+    "Websocket group events sent or merged into an already queued one",
+    ["result"],
+)
+EXTERNAL_API_DURATION = Histogram(
+    "external_api_duration_seconds",
+    "Latency of calls to external APIs",
+    ["service", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+EXTERNAL_API_ERRORS = Counter(
+    "external_api_errors_total",
+    "External API calls that raised or returned an HTTP error status",
+    ["service", "operation"],
+)
+ORDER_STATUS_REACHED = Histogram(
+    "order_status_reached_seconds",
+    "Time from order creation until it reached a status",
+    ["status"],
+    buckets=ORDER_BUCKETS,
+)
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Run time of celery tasks",
+    ["task", "state"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def observe_request(endpoint, status, seconds):
+    HTTP_REQUEST_DURATION.labels(endpoint, status).observe(seconds)
+
+
+def websocket_connected(group_type):
+    WEBSOCKET_CONNECTIONS.labels(group_type).inc()
+
+
+def websocket_disconnected(group_type):
+    WEBSOCKET_CONNECTIONS.labels(group_type).dec()
+
+
+def observe_handler(handler):
+    """Times a consumer handler, sync or async, and counts the messages it failed on."""
+
+    def observe(consumer, started, failed):
+        labels = (consumer.__class__.__name__, handler.__name__)
+        CHANNEL_MESSAGE_DURATION.labels(*labels).observe(time.perf_counter() - started)
+        if failed:
+            CHANNEL_MESSAGE_ERRORS.labels(*labels).inc()
+
+    if inspect.iscoroutinefunction(handler):
+
+        @functools.wraps(handler)
+        async def async_wrapper(consumer, *args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await handler(consumer, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                observe(consumer, started, failed)
+
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(consumer, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = handler(consumer, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            observe(consumer, started, failed)
+
+    return wrapper
+
+
+@contextmanager
+def track_external_call(service, operation):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_API_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        EXTERNAL_API_DURATION.labels(service, operation).observe(time.perf_counter() - started)
+
+
+def timed_request(service, operation, method, url, session=None, **kwargs):
+    """requests.request() recorded as an external call, HTTP error statuses count as errors."""
+    with track_external_call(service, operation):
+        response = (session or requests).request(method, url, **kwargs)
+    if response.status_code >= 400:
+        EXTERNAL_API_ERRORS.labels(service, operation).inc()
+    return response
+
+
+def observe_order_status(order):
+    ORDER_STATUS_REACHED.labels(order.status).observe(
+        (order.updated_at - order.created_at).total_seconds()
+    )
+
+
+class BacklogCollector:
+    """
+    Reads queue lengths from Redis on every scrape: celery queues are lists in the broker
+    database, channels_redis keeps the messages of a channel in a sorted set.
+    """
+
+    def __init__(self, celery_queues=(), channels=()):
+        self.celery_queues = celery_queues
+        self.channels = channels
+        self.redis = redis.StrictRedis(
+            host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+        )
+
+    def collect(self):
+        queues = GaugeMetricFamily(
+            "celery_queue_length", "Tasks waiting in a celery queue", labels=["queue"]
+        )
+        backlog = GaugeMetricFamily(
+            "channel_layer_backlog", "Messages waiting on a channel", labels=["channel"]
+        )
+        prefix = settings.CHANNEL_LAYERS["default"]["CONFIG"].get("prefix", "asgi")
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for queue in self.celery_queues:
+                pipeline.llen(queue)
+            for channel in self.channels:
+                pipeline.zcard(f"{prefix}{channel}")
+            lengths = iter(pipeline.execute())
+        except redis.RedisError:
+            return
+        for queue in self.celery_queues:
+            queues.add_metric([queue], next(lengths))
+        for channel in self.channels:
+            backlog.add_metric([channel], next(lengths))
+        yield queues
+        yield backlog
+
+
+def get_registry():
+    """A registry merging all processes in multiprocess mode, the default one otherwise."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port, *collectors):
+    registry = get_registry()
+    for collector in collectors:
+        registry.register(collector)
+    start_http_server(port, registry=registry)
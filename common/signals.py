@@ -0,0 +1,54 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authtoken.models import Token
+
+from base.authentication import forget_token, forget_user
+
+from .cache import (
+    MODEL_CACHE_TAGS,
+    USER_CACHE_MODELS,
+    get_user_tag,
+    invalidate_model_tags,
+    invalidate_tags,
+)
+
+
+def invalidate_cached_reads(sender, **kwargs):
+    invalidate_model_tags(sender)
+
+
+def invalidate_customer_cached_reads(sender, instance, **kwargs):
+    tag = get_user_tag(instance.customer_id)
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    # right away and again after commit, so no request caches the old row in between
+    forget_user(instance.pk)
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+def invalidate_cached_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+    transaction.on_commit(lambda: forget_token(instance.key))
+
+
+def connect_cache_invalidation():
+    for label in MODEL_CACHE_TAGS:
+        model = apps.get_model(label)
+        post_save.connect(invalidate_cached_reads, sender=model, dispatch_uid=f"cache-{label}")
+        post_delete.connect(invalidate_cached_reads, sender=model, dispatch_uid=f"cache-{label}")
+    for label in USER_CACHE_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(
+            invalidate_customer_cached_reads, sender=model, dispatch_uid=f"cache-{label}"
+        )
+        post_delete.connect(
+            invalidate_customer_cached_reads, sender=model, dispatch_uid=f"cache-{label}"
+        )
+    user_model = get_user_model()
+    post_save.connect(invalidate_cached_user, sender=user_model, dispatch_uid="auth-cache-user")
+    post_delete.connect(invalidate_cached_user, sender=user_model, dispatch_uid="auth-cache-user")
+    post_delete.connect(invalidate_cached_token, sender=Token, dispatch_uid="auth-cache-token")
@@ -0,0 +1,30 @@
+from celery import shared_task
+from django.apps import apps
+
+from common.cache import invalidate_model_tags
+from common.images import build_image_variants, delete_image_variants
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field_names):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    variants = dict(instance.image_variants or {})
+    for field_name in field_names:
+        if field_name not in instance.get_stale_image_variant_fields():
+            # a duplicate job, the variants of this source exist already
+            continue
+        entry = build_image_variants(
+            instance, field_name, square=instance.image_variant_fields[field_name]
+        )
+        previous = variants.pop(field_name, None)
+        if previous and (entry is None or previous["source"] != entry["source"]):
+            delete_image_variants(getattr(instance, field_name).storage, previous)
+        if entry is not None:
+            variants[field_name] = entry
+
+    model.objects.filter(pk=pk).update(image_variants=variants)
+    invalidate_model_tags(model)
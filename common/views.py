@@ -1,9 +1,14 @@
 import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import UpdateAPIView
 from rest_framework.views import APIView
 
+from .metrics import get_registry
 from .models import Settings
 from .serializers import SettingsSerializer
 from order.push_notifications.consumers import send_notification_to_all, send_notification_by_phone_number
@@ -47,3 +52,11 @@ class NotificationView(APIView):
             result = send_notification_by_phone_number(to, title, body, data, app)
             
         return Response({"message": result})
+
+
+def metrics(request):
+    """Prometheus scrape endpoint of gunicorn and daphne, see common.metrics."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -16,6 +16,8 @@ class DeliverySettingsAdmin(admin.ModelAdmin):
 @admin.register(Courier)
 class CourierAdmin(admin.ModelAdmin):
     autocomplete_fields = ("user",)
+    # refreshed from the balance ledger, corrections are added as adjustment entries
+    readonly_fields = ["balance"]
 
 
 @admin.register(InstitutionDeliverySettings)
@@ -1,40 +1,30 @@
-import json
+from base.consumers import GroupJsonConsumer, PartitionedGroupConsumer
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
 
+class CourierLocationConsumer(GroupJsonConsumer):
+    group_type = "courier_location"
 
-class CourierLocationConsumer(WebsocketConsumer):
-    def connect(self):
+    def get_group_names(self):
         self.courier_id = self.scope["url_route"]["kwargs"]["courier_id"]
-        self.courier_group_name = f"courier_{self.courier_id}"
-        async_to_sync(self.channel_layer.group_add)(self.courier_group_name, self.channel_name)
+        return [f"courier_{self.courier_id}"]
 
-        self.accept()
-
-    def receive(self, text_data=None, bytes_data=None):
-        async_to_sync(self.channel_layer.group_send)(
-            self.courier_group_name,
+    async def receive(self, text_data=None, bytes_data=None):
+        # the courier app sends its location as is, it is relayed without decoding
+        await self.channel_layer.group_send(
+            self.group_names[0],
             {
                 "type": "send_location",
                 "text": text_data,
             },
         )
 
-    def send_location(self, event):
-        text_data = json.dumps(event)
-        self.send(text_data=text_data)
-
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(self.courier_group_name, self.channel_name)
-
+    async def send_location(self, event):
+        await self.forward_event(event)
 
-class ReadyOrdersConsumer(WebsocketConsumer):
-    def connect(self):
-        async_to_sync(self.channel_layer.group_add)("ready_orders", self.channel_name)
 
-        self.accept()
+class ReadyOrdersConsumer(PartitionedGroupConsumer):
+    group_type = "ready_orders"
+    base_group = "ready_orders"
 
-    def send_order_status(self, event):
-        text_data = json.dumps(event)
-        self.send(text_data)
+    async def send_order_status(self, event):
+        await self.forward_event(event)
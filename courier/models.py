@@ -1,7 +1,7 @@
 from django.db import models
-from django.db.models import F
 
 from order.models import Order
+from payment.ledger import add_entry, get_balance
 
 
 class AbstractDeliverySettings(models.Model):
@@ -84,11 +84,9 @@ class Courier(models.Model):
         verbose_name = "Курьер"
         verbose_name_plural = "Курьеры"
 
-    def update_balance(self, amount, type):
-        if type == 'in':
-            Courier.objects.filter(id=self.id).update(balance=F('balance') + amount)
-        elif type == 'out':
-            Courier.objects.filter(id=self.id).update(balance=F('balance') - amount)
+    def get_balance(self):
+        """The ledger balance, balance itself is refreshed by the periodic rollup."""
+        return get_balance(courier=self)
 
     def __str__(self):
         return self.user.phone_number
@@ -107,7 +105,7 @@ class Transaction(models.Model):
 
     @staticmethod
     def create_with_balance(courier, order, amount, type, name):
-        courier.update_balance(amount, type)
+        add_entry(amount if type == 'in' else -amount, name, courier=courier, order=order)
         return Transaction.objects.create(
             courier=courier,
             order=order,
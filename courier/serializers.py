@@ -1,5 +1,4 @@
 from crm.api.promo_code.serializers import CrmPromoCodeSerializer
-from order.promo_codes.models import PromoCodeUsage
 from order.promo_codes.serializers import PromoCodeInfoSerializer
 from order.serializers import OrderItemGroupSerializer
 from rest_framework import serializers
@@ -15,6 +14,7 @@ from courier.models import DeliverySettings
 from institution.models import Institution
 from order.models import Order
 from user.models import User
+from base.helpers import get_client_ip
 from user.services import check_otp, send_otp_sms
 from .models import Courier
 from django.conf import settings
@@ -73,13 +73,7 @@ class AvailableOrdersSerializer(serializers.ModelSerializer):
         return name.strip()
         
     def get_prices(self, obj):
-        promocode = 0
-        try:
-            promo = PromoCodeUsage.objects.select_related("promo_code").get(order=obj, user=obj.customer)
-            if promo:
-                promocode = promo.promo_code.sum
-        except PromoCodeUsage.DoesNotExist:
-            pass
+        promocode = obj.discount_sum or 0
         price_info = {
             "discount_amount":  promocode,
             "delivery_amount":  obj.delivering_sum,
@@ -155,7 +149,8 @@ class PhoneNumberSerializer(serializers.Serializer):
         if settings.DEBUG:
             success = True
         else:
-            success = send_otp_sms(user)
+            request = self.context.get("request")
+            success = send_otp_sms(user, ip=get_client_ip(request) if request else None)
         if not success:
             raise PermissionDenied(detail="error")
         return data
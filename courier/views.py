@@ -131,7 +131,7 @@ class GetCourierID(APIView):
     def get(self, request):
         response_data = {
             "courier_id": request.user.courier.id,
-            "balance": request.user.courier.balance,
+            "balance": request.user.courier.get_balance(),
         }
 
         return Response(data=response_data)
@@ -162,7 +162,7 @@ class GetCourierID(APIView):
     def get(self, request):
         response_data = {
             "courier_id": request.user.courier.id,
-            "balance": request.user.courier.balance,
+            "balance": request.user.courier.get_balance(),
         }
 
         return Response(data=response_data)
@@ -310,7 +310,9 @@ class TakeOrderView(APIView):
         except Order.DoesNotExist:
             return Response(status=404)
         if order.courier == request.user.courier:
-            update_order_status(order, "shipped")
+            success, error = update_order_status(order, "shipped")
+            if not success:
+                return Response(status=400, data={"result": "error", "error": error})
             return Response(
                 data={
                     "result": "success",
@@ -326,7 +328,9 @@ class CloseOrderView(APIView):
             return Response(status=404, data={"error": "not found"})
 
         order.courier = request.user.courier
-        update_order_status(order, "closed")
+        success, error = update_order_status(order, "closed")
+        if not success:
+            return Response(status=400, data={"result": "error", "error": error})
         return Response(
             data={
                 "result": "success",
@@ -381,7 +385,7 @@ class GetVerificationCodeAPIView(APIView):
         )
     )
     def post(self, request, *args, **kwargs):
-        serializer = PhoneNumberSerializer(data=request.data)
+        serializer = PhoneNumberSerializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
         return Response({"status": "success"})
 
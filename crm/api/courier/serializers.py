@@ -3,6 +3,7 @@ from rest_framework import serializers
 
 from base.serializer import DynamicFieldsModelSerializer
 from courier.models import Courier, DeliverySettings
+from payment.ledger import set_balance
 
 from crm.api.user.serializers import CrmUserSerializer, CrmUserUpdateSerializer
 
@@ -78,6 +79,7 @@ class CrmCourierUpdateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         
         user_data = validated_data.pop("user", None)
+        balance = validated_data.pop("balance", None)
 
         # ⚡️ Nested user update
         if user_data:
@@ -94,4 +96,8 @@ class CrmCourierUpdateSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+
+        # the column is a cache of the ledger, a changed balance is recorded as an adjustment
+        if balance is not None and balance != instance.balance:
+            set_balance(balance, courier=instance)
         return instance
\ No newline at end of file
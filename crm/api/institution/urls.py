@@ -1,6 +1,6 @@
 from django.urls import path, include
 
-from institution.views import ImportView
+from institution.views import ImportView, ImportStatusView
 
 from . import views
 
@@ -89,6 +89,7 @@ urlpatterns = [
         ),
     ),
     path("institutions/<int:pk>/import/", ImportView.as_view()),
+    path("institutions/<int:pk>/import/<str:task_id>/", ImportStatusView.as_view()),
 
     path(
         "institution-branches/",
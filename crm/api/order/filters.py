@@ -1,7 +1,7 @@
 from django_filters import rest_framework as filters
 
 from courier.models import Courier
-from order.models import Order, OrderItemGroup
+from order.models import Order, OrderItemGroup, OrderStatsHourly
 
 
 class CrmOrderFilter(filters.FilterSet):
@@ -13,6 +13,20 @@ class CrmOrderFilter(filters.FilterSet):
         fields = ["status"]
 
 
+class OrderStatsFilter(filters.FilterSet):
+    """Same parameters as CrmOrderFilter; the date range is matched with an hour precision."""
+
+    created_date_after = filters.DateTimeFilter(method="filter_created_date_after")
+    created_date_before = filters.DateTimeFilter(field_name="hour", lookup_expr="lte")
+
+    class Meta:
+        model = OrderStatsHourly
+        fields = ["status"]
+
+    def filter_created_date_after(self, queryset, name, value):
+        return queryset.filter(hour__gte=value.replace(minute=0, second=0, microsecond=0))
+
+
 class OrderItemGroupFilter(filters.FilterSet):
     id = filters.NumberFilter(field_name="order__id")
     created_date_after = filters.DateTimeFilter(field_name="order__created_at", lookup_expr="gte")
@@ -66,6 +66,8 @@ class CrmOrderSerializer(DynamicFieldsModelSerializer):
             "package_amount",
             "package_quantity"
         ]
+        # changed through update_status, which runs the status transitions
+        read_only_fields = ["status"]
 
 
     def get_customer(self, obj):
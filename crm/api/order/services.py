@@ -2,10 +2,13 @@ import time
 from typing import Iterable
 
 from django.db import transaction
+from django.db.models import Prefetch
 
 from courier.models import Courier
 from order.helpers import send_message
 from order.models import Order, OrderItemGroup, OrderItem
+from order.services import get_commission_percentage
+from order.state_machine import CONFLICT_ERROR, claim_order
 # from order.status_controller import send_message
 from order.tasks import delayed_notification_task
 from order.utils import notify_courier, notify_institution, notify_operator
@@ -19,19 +22,21 @@ def change_order_courier(order: Order, new_courier: Courier):
     if order.status in ["closed", "rejected"]:
         return False, "Order is already completed or cancelled"
 
+    # bumps the version, a courier taking the order from an older copy fails
+    if not claim_order(order, courier=new_courier):
+        return False, CONFLICT_ERROR
+
     if current_courier:
         if current_courier.order_set.filter(status__in=["shipped", "accepted"]).count() == 0:
             current_courier.status = Courier.Status.FREE
             current_courier.save()
             # TODO: handle courier balance
 
-    order.courier = new_courier
     order.timeline.courier_assign_at = timezone.now()
     order.timeline.preparing_start_at = timezone.now()
     if new_courier:
         order.courier.status = Courier.Status.DELIVERING
         order.courier.save(update_fields=["status"])
-    order.save()
     
     notify_courier(order)
     notify_operator(order)
@@ -48,34 +53,43 @@ def change_order_courier(order: Order, new_courier: Courier):
 
 
 def recalculate_order_products(order: Order):
-    item_groups = order.item_groups.all()
+    """
+    Recomputes item, group and order sums from one prefetch and writes them back with a
+    bulk_update per model. Incident items stay listed but are not charged.
+    """
+    item_groups = list(
+        order.item_groups.select_related("institution").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product")),
+            "items__options",
+        )
+    )
 
+    items = []
     total_sum = 0
-    _total_sum = 0
+    products_sum = 0
     for group in item_groups:
-        products_sum = 0
-        _products_sum = 0
+        group_products_sum = 0
         for item in group.items.all():
-            items_product_sum = 0
-            options_sum = sum([option.adding_price for option in item.options.all()])
-            items_product_sum += (item.product.price + options_sum) * item.count
-            item.total_sum = items_product_sum
-            if item.is_incident:
-                _total_sum += items_product_sum
-                _products_sum += items_product_sum
-            products_sum += items_product_sum
-            item.save()
-        
-        group.total_sum = products_sum + group.delivering_sum - _products_sum
-        group.commission = round((products_sum - _products_sum) * (group.institution.tax_percentage_ordinary / 100), -1)
-        group.save()
+            options_sum = sum(option.adding_price for option in item.options.all())
+            item.total_sum = (item.product.price + options_sum) * item.count
+            if not item.is_incident:
+                group_products_sum += item.total_sum
+            items.append(item)
+
+        comission_percentage = get_commission_percentage(group.institution, order)
+        group.products_sum = group_products_sum
+        group.total_sum = group_products_sum + group.delivering_sum
+        group.commission = round(group_products_sum * comission_percentage / 100, -1)
+        products_sum += group_products_sum
         total_sum += group.total_sum
-    
-    order.products_sum = products_sum - _products_sum
-    discount = order.discount_sum
-    order.total_sum = total_sum - discount
-    order.save()
-    
+
+    with transaction.atomic():
+        OrderItem.objects.bulk_update(items, ["total_sum"])
+        OrderItemGroup.objects.bulk_update(item_groups, ["products_sum", "total_sum", "commission"])
+
+        order.products_sum = products_sum
+        order.total_sum = total_sum - order.discount_sum
+        order.save(update_fields=["products_sum", "total_sum"])
 
 
 def add_order_item(order_group: OrderItemGroup, product: Product, count: int, options: Iterable, is_incident: None):
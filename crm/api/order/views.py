@@ -7,7 +7,10 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from base.api_views import CustomPagination, MultiSerializerViewSetMixin, DynamicPagination
+from base.api_views import (
+    CustomPagination, MultiSerializerViewSetMixin, DynamicPagination, KeysetDynamicPagination
+)
+from base.db_router import ReplicaReadMixin
 from crm.api.order.filters import OrderItemGroupFilter
 from crm.api.order.serializers import (
     CrmOrderItemGroupSerializer,
@@ -19,7 +22,7 @@ from crm.api.order.serializers import (
     CrmOderUpdateSerializer,
 )
 from crm.api.order.services import recalculate_order_products, change_order_courier, add_order_item
-from order.models import OrderItemGroup, OrderItem, Order
+from order.models import OrderItemGroup, OrderItem, Order, OrderStatsHourly
 from order.status_controller import cancel_order, update_order_status
 from .permissions import OrderPermission
 
@@ -35,7 +38,7 @@ class OrderViewSet(MultiSerializerViewSetMixin, ModelViewSet):
     }
     permission_classes = [IsAuthenticated, OrderPermission]
     filter_backends = [DjangoFilterBackend]
-    pagination_class = DynamicPagination
+    pagination_class = KeysetDynamicPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -64,7 +67,7 @@ class OrderViewSet(MultiSerializerViewSetMixin, ModelViewSet):
                 else:
                     return Response({"message": message}, status=400)
             else:
-                success, message = update_order_status(order, status, preparing_time)
+                success, message = update_order_status(order, status, preparing_time, force=True)
                 if success is True:
                     return Response({"message": "success"})
                 elif success is False:
@@ -175,17 +178,17 @@ class OrderItemViewSet(MultiSerializerViewSetMixin, ModelViewSet):
         recalculate_order_products(order_item.order_item_group.order)
         return Response(status=204)
     
-import io
-import pandas as pd
+import tempfile
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import HttpResponse
+from django.http import FileResponse
 from order.models import Order
 from reportlab.lib.pagesizes import letter
 
-from django.db.models import Count, Q, Sum, F
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, F
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from rest_framework.viewsets import ReadOnlyModelViewSet
@@ -202,7 +205,104 @@ def clean_sheet_name(name: str, default: str = "Report") -> str:
     cleaned = cleaned[:31]
     return cleaned if cleaned else default
 
-class ReportAPIView(APIView):
+REPORT_BATCH_SIZE = 2000
+
+REPORT_COLUMNS = [
+    ("ИД заказа", 12),
+    ("Дата", 14),
+    ("Легальная название компании", 32),
+    ("Название товара", 40),
+    ("Склад", 24),
+    ("Цена товара", 16),
+    ("Кол-во", 10),
+    ("Общая сумма товара", 22),
+    ("Цена скидки", 15),
+    ("Доход", 14),
+    ("Сум или процент", 19),
+    ("Тип оплаты", 14),
+]
+
+
+def get_report_items(orders):
+    """Items of the given orders with their sums computed on the database side."""
+    options_sum = (
+        OrderItem.options.through.objects.filter(orderitem_id=OuterRef("pk"))
+        .values("orderitem_id")
+        .annotate(total=Sum("optionitem__adding_price"))
+        .values("total")
+    )
+    return OrderItem.objects.filter(
+        order_item_group__order__in=orders,
+        order_item_group__institution_branch__institution__isnull=False,
+    ).annotate(
+        unit_price=F("product__price") + Coalesce(Subquery(options_sum), 0),
+        line_total=F("unit_price") * F("count"),
+        tax=Coalesce("order_item_group__institution_branch__institution__tax_percentage_ordinary", 0),
+    )
+
+
+def write_report_xlsx(items, sheet_name):
+    """Streams report rows into a write-only workbook, memory doesn't depend on the row count."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    ws = workbook.create_sheet(sheet_name)
+    for col_idx, (_, width) in enumerate(REPORT_COLUMNS, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    header = []
+    for title, _ in REPORT_COLUMNS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    rows = items.order_by("-id").values_list(
+        "id",
+        "order_item_group__order_id",
+        "order_item_group__order__created_at",
+        "order_item_group__institution_branch__institution__legal_name",
+        "product__name",
+        "order_item_group__institution_branch__name",
+        "unit_price",
+        "count",
+        "line_total",
+        "tax",
+        "order_item_group__order__payment_method",
+    )
+    # keyset batches: server side cursors are disabled, so iterator() would fetch everything
+    last_id = None
+    while True:
+        batch = list((rows.filter(id__lt=last_id) if last_id else rows)[:REPORT_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        for _, order_id, created_at, legal_name, name, branch, price, count, total, tax, payment in batch:
+            ws.append([
+                order_id,
+                timezone.localtime(created_at).strftime("%Y-%m-%d"),
+                legal_name,
+                name,
+                branch,
+                price,
+                count,
+                total,
+                0,
+                round(total * (tax / 100), 2),
+                f"{tax}%",
+                "Payme" if payment == "payme" else "Наличные",
+            ])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+class ReportAPIView(ReplicaReadMixin, APIView):
     
     def get(self, request):
         try:
@@ -221,10 +321,8 @@ class ReportAPIView(APIView):
                 start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
                 end_date = now
                 
-            orders = Order.objects.select_related('customer', 'operator').prefetch_related('item_groups__institution_branch__institution','item_groups__items__product'
-            ).filter(created_at__gte=start_date, created_at__lte=end_date)
-            
-            
+            orders = Order.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
+
             if payment:
                 orders = orders.filter(payment_method=payment)   
 
@@ -233,84 +331,63 @@ class ReportAPIView(APIView):
             else:
                 orders = orders.filter(item_groups__institution_branch__institution=institution)
 
-            
             order_stats = orders.aggregate(
-                closed_orders=Count('id', filter=Q(status='closed')),  # 'closed' statusidagi buyurtmalar soni
-                rejected_orders=Count('id', filter=Q(status='rejected')),  # 'rejected' statusidagi buyurtmalar soni
+                closed_orders=Count('id', filter=Q(status='closed'), distinct=True),  # 'closed' statusidagi buyurtmalar soni
+                rejected_orders=Count('id', filter=Q(status='rejected'), distinct=True),  # 'rejected' statusidagi buyurtmalar soni
             )
-            orders = orders.filter(status='closed')
-            
-            detail =  {
-                "products_sum": 0,
-                "cash_sum": 0,
-                "payme_sum": 0,
+            items = get_report_items(orders.filter(status='closed').values("id"))
+            first_item = items.values_list(
+                "tax", "order_item_group__institution_branch__institution__name"
+            ).first()
+            tax_percentage, institution_name = first_item or (0, None)
+
+            if export_type == "xls":
+                sheet_name = clean_sheet_name(institution_name)
+                filename = f"{sheet_name}_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                return FileResponse(
+                    write_report_xlsx(items, sheet_name),
+                    as_attachment=True,
+                    filename=filename,
+                    content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                )
+
+            totals = items.aggregate(
+                products_count=Coalesce(Sum("count"), 0),
+                products_sum=Coalesce(Sum("line_total"), 0),
+                cash_sum=Coalesce(
+                    Sum("line_total", filter=Q(order_item_group__order__payment_method="cash")), 0
+                ),
+                payme_sum=Coalesce(
+                    Sum("line_total", filter=~Q(order_item_group__order__payment_method="cash")), 0
+                ),
+                price_diff_sum=Coalesce(
+                    Sum(
+                        (F("product__price") - F("product__old_price")) * F("count"),
+                        filter=Q(product__old_price__isnull=False) & ~Q(product__old_price=0),
+                    ),
+                    0,
+                ),
+                # delivery sum is counted once per item, as the report always did
+                delivery_sum=Coalesce(Sum("order_item_group__order__delivering_sum"), 0),
+            )
+
+            detail = {
+                "products_sum": totals["products_sum"],
+                "cash_sum": totals["cash_sum"],
+                "payme_sum": totals["payme_sum"],
                 "payme_commision": 1,
-                "payme_commision_sum": 0,
-                "commission": 0,
-                "income": 0,
-                "products_count": 0,
-                "price_diff_sum": 0,
-                "delivery_sum": 0,
+                "payme_commision_sum": round(totals["payme_sum"] * (1/100), 2),
+                "commission": tax_percentage,
+                "income": round(totals["products_sum"] * (tax_percentage/100), 2),
+                "products_count": totals["products_count"],
+                "price_diff_sum": totals["price_diff_sum"],
+                "delivery_sum": totals["delivery_sum"],
                 "delivery_discount_sum": 0,
                 "order_count": order_stats['closed_orders'],
                 "order_uncompleted_count": order_stats['rejected_orders'],
                 "diff_sum": 0
             }
-            
-            # Ma'lumotlarni yig'ish
-            
-            rows = []
-            for order in orders:
-                for item_group in order.item_groups.all():
-                    branch = item_group.institution_branch
-                    if not branch or not branch.institution:
-                        continue
-                    
-                    institution = branch.institution
-                    tax_percentage = institution.tax_percentage_ordinary or 0
-                    detail['commission'] = tax_percentage
-                    
-                    for item in item_group.items.all():
-                        
-                        product = item.product
-                        options_sum = sum([option.adding_price for option in item.options.all()])
-                        products_sum = product.price + options_sum
-                        total_item_sum = products_sum * item.count
-                        income = total_item_sum * (tax_percentage / 100)
-                        
-                        detail['income'] += round(income, 2)
-                        detail['products_count'] += item.count
-                        detail["products_sum"] += round(total_item_sum, 2)
-                        detail["price_diff_sum"] += round((product.price - (product.old_price or 0)) * item.count, 2) if product.old_price else round(0, 2)
-                        detail["delivery_sum"] += round(order.delivering_sum, 2)
-                        
-                        if order.payment_method == "cash": 
-                            detail["cash_sum"] += round(total_item_sum, 2)
-                        else:
-                            detail["payme_sum"] += round(total_item_sum, 2)
-                            
-
-                        rows.append({
-                            "ИД заказа": order.id,
-                            "Дата": order.created_at.strftime("%Y-%m-%d"),
-                            "Легальная название компании": institution.legal_name,
-                            "Название товара": product.name,
-                            "Склад": branch.name,
-                            "Цена товара": round(products_sum, 2),
-                            "Кол-во": item.count,
-                            "Общая сумма товара": round(total_item_sum, 2),
-                            "Цена скидки": 0,
-                            "Доход": round(income, 2),
-                            "Сум или процент": f"{tax_percentage}%",
-                            "Тип оплаты": "Payme" if order.payment_method == "payme" else "Наличные",
-                        })
-
-
-            df = pd.DataFrame(rows)
-
-            detail["payme_commision_sum"] = round(detail["payme_sum"] * (1/100), 2)
-            detail["income"] = round(detail["products_sum"] * (detail["commission"]/100), 2)
-            
+
             if detail["payme_sum"] == 0:
                 detail["diff_sum"] = round(detail['income'], 2)
             else:
@@ -319,70 +396,32 @@ class ReportAPIView(APIView):
             if detail['diff_sum'] < detail['payme_sum']:
                 detail['diff_sum'] = -detail['diff_sum']
 
-            if export_type == "xls":
-                
-                sheet_name = clean_sheet_name(institution.name)
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name=sheet_name)
-                    ws = writer.sheets[sheet_name]
-
-                    from openpyxl.utils import get_column_letter
-                    from openpyxl.styles import Font, Alignment
-
-                    for col_idx, column in enumerate(df.columns, 1):
-                        max_length = max(
-                            df[column].astype(str).map(len).max(),
-                            len(column)
-                        )
-                        adjusted_width = max_length + 4  # extra space
-                        ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
-
-                    for cell in ws[1]:
-                        cell.font = Font(bold=True)
-                        cell.alignment = Alignment(horizontal="left", vertical="center")
-
-                    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-                        for cell in row:
-                            cell.alignment = Alignment(wrap_text=True, horizontal="left", vertical="center")
-
-                output.seek(0)
-                filename = f"{sheet_name}_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                response = HttpResponse(
-                    output,
-                    content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-                response["Content-Disposition"] = f'attachment; filename="{filename}"'
-                return response
-            else:
-                return Response(detail, status=status.HTTP_200_OK)
+            return Response(detail, status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class OrderStatsView(APIView):
+class OrderStatsView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         today = timezone.now()
         start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-        # orders = Order.objects.filter(status="closed", created_at__gte=start_of_month)
-        orders = Order.objects.filter(
-            status="closed",
-            created_at__gte=start_of_month
-        ).filter(
+        rows = OrderStatsHourly.objects.filter(status="closed", hour__gte=start_of_month).filter(
             Q(payment_method="payme", is_paid=True) | Q(payment_method="cash")
         )
-
-        product_total = orders.aggregate(total=Sum("total_sum"))["total"] or 0
-        cash_total = orders.filter(payment_method="cash").aggregate(total=Sum("total_sum"))["total"] or 0
-        payme_total = orders.filter(payment_method="payme").aggregate(total=Sum("total_sum"))["total"] or 0
-        order_ids = orders.values_list("id", flat=True)
-        total_commission = OrderItemGroup.objects.filter(
-            order_id__in=order_ids
-        ).aggregate(total=Sum("commission"))["total"] or 0
+        totals = rows.aggregate(
+            product_total=Coalesce(Sum("total_sum"), 0),
+            cash_total=Coalesce(Sum("total_sum", filter=Q(payment_method="cash")), 0),
+            payme_total=Coalesce(Sum("total_sum", filter=Q(payment_method="payme")), 0),
+            total_commission=Coalesce(Sum("commission"), 0),
+        )
+        product_total = totals["product_total"]
+        cash_total = totals["cash_total"]
+        payme_total = totals["payme_total"]
+        total_commission = totals["total_commission"]
 
         return Response({
             "product_total": round(product_total, 2),
@@ -139,6 +139,11 @@ class CrmProductToBranchSerializer(serializers.ModelSerializer):
         ]
 
 
+class CrmProductAvailabilitySerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    branch = serializers.IntegerField()
+    is_available = serializers.BooleanField()
+
 
 class CrmProductDetailSerializer(CrmProductSerializer):
     options = CrmProductOptionSerializer(many=True, read_only=True)
@@ -0,0 +1,39 @@
+from institution.models import InstitutionBranch
+from institution.services import bump_menu_version
+from product.models import Product, ProductToBranch
+
+
+def set_products_availability(rows, institution=None):
+    """
+    Applies (product, branch, is_available) rows with a single INSERT ... ON CONFLICT DO UPDATE
+    and bumps the menu version of every affected branch once. Rows referring to products
+    and branches of different institutions, or outside "institution" when it is given,
+    are skipped. Returns the number of applied rows.
+    """
+    # the same pair twice would make ON CONFLICT update one row twice, the last row wins
+    availability = {(row["product"], row["branch"]): row["is_available"] for row in rows}
+    if not availability:
+        return 0
+
+    products = Product.objects.filter(id__in={product for product, _ in availability})
+    branches = InstitutionBranch.objects.filter(id__in={branch for _, branch in availability})
+    if institution is not None:
+        products = products.filter(institution=institution)
+        branches = branches.filter(institution=institution)
+    product_institutions = dict(products.values_list("id", "institution_id"))
+    branch_institutions = dict(branches.values_list("id", "institution_id"))
+
+    links = [
+        ProductToBranch(product_id=product, institution_branches_id=branch, is_available=is_available)
+        for (product, branch), is_available in availability.items()
+        if product in product_institutions
+        and product_institutions[product] == branch_institutions.get(branch)
+    ]
+    ProductToBranch.objects.bulk_create(
+        links,
+        update_conflicts=True,
+        unique_fields=["product", "institution_branches"],
+        update_fields=["is_available"],
+    )
+    bump_menu_version({link.institution_branches_id for link in links})
+    return len(links)
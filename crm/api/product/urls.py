@@ -31,6 +31,10 @@ urlpatterns = [
             }
         ),
     ),
+    path(
+        "products/availability/",
+        views.ProductViewSet.as_view({"post": "bulk_availability"}),
+    ),
     path(
         "products/<int:pk>/",
         views.ProductViewSet.as_view(
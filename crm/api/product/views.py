@@ -17,7 +17,9 @@ from crm.api.product.serializers import (
     CrmProductOptionUpdateSerializer,
     CrmProductDetailSerializer,
     CrmProductCreateSerializer,
+    CrmProductAvailabilitySerializer,
 )
+from crm.api.product.services import set_products_availability
 from product.models import Product, ProductCategory, ProductOption, OptionItem, ProductToBranch
 from .permissions import ProductPermission
 
@@ -81,6 +83,7 @@ class ProductViewSet(MultiSerializerViewSetMixin, ModelViewSet):
         "retrieve": CrmProductDetailSerializer,
         "create": CrmProductCreateSerializer,
         "partial_update": CrmProductCreateSerializer,
+        "bulk_availability": CrmProductAvailabilitySerializer,
     }
     pagination_class = DynamicPagination
     filter_backends = [SearchFilter, DjangoFilterBackend]
@@ -125,15 +128,10 @@ class ProductViewSet(MultiSerializerViewSetMixin, ModelViewSet):
         data = request.data
         product = Product.objects.get(pk=pk)
         if isinstance(data, list):
-            for row in data:
-                product_to_branch, created = ProductToBranch.objects.get_or_create(
-                    product=product,
-                    institution_branches_id=row['id'],
-                    defaults={'is_available': row['status']}
-                )
-                if not created:
-                    product_to_branch.is_available = row['status'] 
-                    product_to_branch.save()
+            set_products_availability(
+                {"product": product.id, "branch": row["id"], "is_available": row["status"]}
+                for row in data
+            )
 
             serializer = self.get_serializer(product)
             return Response(serializer.data)
@@ -159,6 +157,17 @@ class ProductViewSet(MultiSerializerViewSetMixin, ModelViewSet):
 
         return Response(serializer.errors, status=400)
 
+    def bulk_availability(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        institution = None
+        if request.user.type in ["institution_admin", "institution_owner"]:
+            institution = request.user.get_institution()
+            if institution is None:
+                return Response({"updated": 0})
+        updated = set_products_availability(serializer.validated_data, institution)
+        return Response({"updated": updated})
+
     def list(self, request, *args, **kwargs):
         if self.request.user.get_institution():
             if isinstance(self.request.user.get_institution(), int):
@@ -10,6 +10,7 @@ from django.db.models import Count, Q, Sum
 from rest_framework.filters import OrderingFilter
 from rest_framework import status
 from base.api_views import MultiSerializerViewSetMixin, CustomPagination
+from base.authentication import forget_user
 from crm.api.user.serializers import (
     CustomTokenObtainSerializer,
     CrmUserSerializer,
@@ -152,6 +153,7 @@ class LogoutDeviceView(APIView):
             device = CustomFCMDevice.objects.filter(user=user, registration_id=register_id, app_name=app_name, type=type).first()
             if device:
                 device.delete()
+            forget_user(user.id)
 
             return Response({"status": "success"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -382,7 +382,7 @@ class OrderDetailView(HaveAccessToOrderMixin, DetailView):
             if status == "rejected":
                 cancel_order(order_item_group.order, ignore_constraints=True)
             else:
-                update_order_status(order_item_group.order, status)
+                update_order_status(order_item_group.order, status, force=True)
 
         return redirect(reverse("order-detail-admin", kwargs={"pk": order_item_group_id}))
 
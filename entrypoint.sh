@@ -8,6 +8,10 @@ uv run manage.py migrate
 echo "Start collect static"
 uv run manage.py collectstatic --noinput
 
+# Prometheus samples of the Gunicorn workers, served on /metrics/
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus/gunicorn
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start Gunicorn processes
 echo "Starting Gunicorn server."
 exec uv run gunicorn tuktuk.wsgi:application --bind 0.0.0.0:4546 --workers 2 --log-level info --access-logfile - --error-logfile -
@@ -0,0 +1,11 @@
+#!/bin/sh
+# Prometheus samples of the prefork pool and the queue depth, served on METRICS_PORT
+export METRICS_PORT=9102
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus/celery
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# CELERY_QUEUES picks the queues of this worker, e.g. "sms" for the one time password worker
+CELERY_QUEUES=${CELERY_QUEUES:-celery}
+
+echo "Starting Celery worker for queues $CELERY_QUEUES."
+exec uv run celery -A tuktuk worker --loglevel=info -Q "$CELERY_QUEUES" -n "$CELERY_QUEUES@%h"
@@ -1,4 +1,6 @@
 #!/bin/sh
 # Start Uvicorn processes
 echo "Starting Consumers."
+# Prometheus metrics of the consumers and the channel backlog
+export METRICS_PORT=9101
 exec uv run manage.py runworker firebase-notify telegram-notify
\ No newline at end of file
@@ -55,6 +55,8 @@ class InstitutionAdmin(admin.ModelAdmin):
         ),
     )
 
+    # refreshed from the balance ledger, corrections are added as adjustment entries
+    readonly_fields = ["balance"]
     inlines = [AddressInline]
 
 
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("institution", "0049_alter_institution_position"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="institutionbranch",
+            name="menu_version",
+            field=models.PositiveIntegerField(default=0, verbose_name="Версия меню"),
+        ),
+    ]
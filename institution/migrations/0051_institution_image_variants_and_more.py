@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("institution", "0050_institutionbranch_menu_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="institution",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Варианты изображений"
+            ),
+        ),
+        migrations.AddField(
+            model_name="institutioncategory",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Варианты изображений"
+            ),
+        ),
+    ]
@@ -1,33 +1,16 @@
 import datetime
 
-from PIL.Image import Resampling
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models import Count, Q, Prefetch, ForeignKey
 from modeltrans.fields import TranslationField
 
-from base.models import FlagsModel, BaseScheduleModel
+from base.models import FlagsModel, BaseScheduleModel, ImageVariantsModel
 from product.models import ProductCategory, Product
 from .managers import InstitutionBranchManager, InstitutionQuerySet
-from PIL import Image
 
 
-def image_examination(image_path):
-    try:
-        with Image.open(image_path) as img:
-            min_side = min(img.size)
-            left = (img.width - min_side) // 2
-            top = (img.height - min_side) // 2
-            right = left + min_side
-            bottom = top + min_side
-            cropped_img = img.crop((left, top, right, bottom))
-            resized_img = cropped_img.resize((1000, 1000), Resampling.LANCZOS)
-            resized_img.save(image_path, quality=75)
-    except FileNotFoundError:
-        pass
-
-
-class InstitutionCategory(FlagsModel):
+class InstitutionCategory(ImageVariantsModel, FlagsModel):
     icon = models.FileField(
         verbose_name="Иконка SVG", upload_to="categories_icons/", null=True, blank=False
     )
@@ -35,10 +18,7 @@ class InstitutionCategory(FlagsModel):
     image = models.ImageField(
         upload_to="institution/categories/images/", verbose_name="Фото", null=True
     )
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        image_examination(self.image.path)
+    image_variant_fields = {"image": 1000}
 
     position = models.IntegerField(verbose_name="Позиция в списке", blank=True, null=True)
     translation_fields = ("title",)
@@ -56,7 +36,7 @@ class InstitutionCategory(FlagsModel):
         return self.translation_fields
 
 
-class Institution(FlagsModel):
+class Institution(ImageVariantsModel, FlagsModel):
     TYPES = (("restaurant", "ресторан"), ("shop", "магазин"))
     inn = models.CharField(max_length=50, null=True, blank=True, verbose_name="ИНН")
     pinfl = models.CharField(max_length=100, null=True, blank=True, verbose_name="ПИНФЛ")
@@ -70,13 +50,8 @@ class Institution(FlagsModel):
     client_id = models.CharField(max_length=100, null=True, blank=True, verbose_name="Клиент ИД")
     client_secret = models.CharField(max_length=100, null=True, blank=True, verbose_name="Клиент секрет")
     # RKEEPER
-    
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # image_examination(self.image.path)
-        if self.image and hasattr(self.image, 'path'):
-            image_examination(self.image.path)
+    image_variant_fields = {"image": 1000, "logo": None}
 
     is_open = models.BooleanField(default=False, verbose_name="Открыто ли")
     description = models.TextField(null=True, blank=True, verbose_name="Описание")
@@ -213,6 +188,7 @@ class InstitutionBranch(FlagsModel):
     is_available = models.BooleanField(default=False, verbose_name="Доступен")
     min_order_amount = models.IntegerField(default=0, verbose_name="Минимальная сумма заказа")
     places_id = models.CharField(max_length=100, null=True, blank=True, verbose_name="Rkeeper ID")
+    menu_version = models.PositiveIntegerField(default=0, verbose_name="Версия меню")
     min_preorder_minutes = models.IntegerField(
         default=0, verbose_name="Минимальное кол-во минут для предзаказа"
     )
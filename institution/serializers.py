@@ -44,7 +44,9 @@ class InstitutionListSerializer(serializers.ModelSerializer):
     has_active_branch = serializers.BooleanField()
     category = InstitutionCategoryListSerializer()
     image = ThumbnailSerializer("small")
+    image_webp = ThumbnailSerializer("small", format="webp", source="image")
     logo = ThumbnailSerializer("logo")
+    logo_webp = ThumbnailSerializer("logo", format="webp", source="logo")
     address = InstitutionAddressSerializer(allow_null=True)
     delivery_price = serializers.IntegerField(allow_null=True, default=None)
     min_order_amount = serializers.IntegerField(allow_null=True, default=None)
@@ -61,6 +63,7 @@ class InstitutionListSerializer(serializers.ModelSerializer):
             "i18n",
             "owner",
             "balance",
+            "image_variants",
             "tax_percentage_ordinary",
             "secondary_categories",
             "free_delivery",
@@ -1,16 +1,14 @@
-import requests
 from shapely.geometry.point import Point
 from shapely.geometry.polygon import Polygon
 
 from address.models import Address, Region
+from common.cache import invalidate_model_tags
 from crm.api.institution.services import create_institution_default_schedule
 from institution.models import Institution, InstitutionBranch
 from order.distance_calculator import calculate_distance
 from order.exceptions import CantFindSuitableBranchError
-from product.models import OptionItem, Product, ProductCategory, ProductOption, ProductToBranch
-from django.core.files.base import ContentFile
 
-from django.db.models import Q
+from django.db.models import F, Q
 
 def get_region_by_coordinates(lat, long):
     user_point = Point(lat, long)
@@ -87,92 +85,8 @@ def seed_institution_branch(institution: Institution, data):
     else:
         return True
 
-def seed_category(institution, data):
-    # print("created category")
-    exist = ProductCategory.objects.filter(institution=institution, uuid=data['id'])
-    if not exist.exists():
-        res = ProductCategory.objects.create(
-            uuid=data['id'],
-            name=data['name'],
-            position=1,
-            institution=institution
-        )
-        return res
-    else:
-        pass
-        # print("BOR ", data['name'])
-
-def get_image(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        image_name = url.split("/")[-1]
-        return image_name, response.content
-    return None
-
-def seed_products(institution, branch, data):
-    cat = ProductCategory.objects.filter(institution=institution, uuid=data['categoryId']).first()
-    if cat:
-        serviceCodesUz = data['serviceCodesUz']
-        product = Product.objects.filter(uuid=data['id']).first()
-        if not product:
-            try:    
-                product = Product.objects.create(
-                    uuid=data['id'],
-                    name=data['name'],
-                    description=data['description'],
-                    short_description="",
-                    status="active",
-                    price=data['price'],
-                    commission=18,
-                    spic_id=serviceCodesUz.get('mxikCodeUz', 0),
-                    package_code=serviceCodesUz.get('packageCodeUz', 0),
-                    vat=12,
-                    category=cat,
-                    institution=institution,
-                    is_available=True
-                )
-                image, response = get_image(data['images'][0]['url'])
-                if image is not None:
-                    product.image.save(image, ContentFile(response), save=True)
 
-                if data.get('modifierGroups'):
-                    modifierGroups = data['modifierGroups']
-                    for modifierGroup in modifierGroups:
-                        if not ProductOption.objects.filter(uuid=modifierGroup.get('id', None)).exists():
-                            option = ProductOption.objects.create(
-                                uuid=modifierGroup.get('id', None),
-                                title=modifierGroup['name'],
-                                is_required=False,
-                                product=product
-                            )
-                            modifiers = modifierGroup['modifiers']
-                            for modifier in modifiers:
-                                if not OptionItem.objects.filter(uuid=modifier['id']).exists():
-                                    OptionItem.objects.create(
-                                        uuid=modifier['id'],
-                                        title=modifier['name'],
-                                        option=option,
-                                        adding_price=modifier['price'],
-                                        is_default=True
-                                    )
-                branch = InstitutionBranch.objects.get(places_id=branch)  # mavjud branch
-                if not ProductToBranch.objects.filter(product=product, institution_branches=branch).exists():
-                    # print("OKOKOKOKO")
-                    ProductToBranch.objects.create(
-                        product=product,
-                        institution_branches=branch,
-                        is_available=True
-                    )
-                return product
-            except Exception as e:
-                print("EXP error", e)
-            return "ok"
-        else:
-            branch = InstitutionBranch.objects.get(places_id=branch)  # mavjud branch
-            if not ProductToBranch.objects.filter(product=product, institution_branches=branch).exists():
-                # print("OKOKOKOKO")
-                ProductToBranch.objects.create(
-                    product=product,
-                    institution_branches=branch,
-                    is_available=True
-                )
+def bump_menu_version(branch_ids):
+    """Invalidates cached menus of the given branches."""
+    InstitutionBranch.objects.filter(id__in=branch_ids).update(menu_version=F("menu_version") + 1)
+    invalidate_model_tags(InstitutionBranch)
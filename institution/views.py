@@ -1,9 +1,8 @@
 
+from celery.result import AsyncResult
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
-import threading
-
 from django.db.models import Avg, Q, Prefetch, Exists, OuterRef, F, IntegerField, Case, Value, When, BooleanField, Subquery, Count
 from django.db.models.functions import Round, Coalesce
 from django.contrib.gis.geos import Point
@@ -12,7 +11,6 @@ from django.contrib.gis.db.models import Func, PointField
 
 
 from order.feedback.models import InstitutionFeedback
-from institution.services import seed_category, seed_institution_branch, seed_products
 
 from rest_framework import views
 from rest_framework.pagination import PageNumberPagination
@@ -26,9 +24,11 @@ from rest_framework.decorators import action
 
 
 from address.models import Address
+from base.db_router import ReplicaReadMixin
+from common.cache import cached_response
 from product.models import Product, ProductToBranch, ProductCategory
 from product.serializers import ProductListSerializer
-from rkeeper.services import rkeeperAPI
+from rkeeper.tasks import import_menu
 from .filters import InstitutionFilterSet
 
 from .models import (
@@ -46,7 +46,7 @@ from .serializers import (
 )
 
 
-class InstitutionCategoryViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
+class InstitutionCategoryViewSet(ReplicaReadMixin, ViewSetMixin, ListAPIView, RetrieveAPIView):
     queryset = InstitutionCategory.objects.get_available()
     serializer_class = InstitutionCategoryListSerializer
 
@@ -55,8 +55,16 @@ class InstitutionCategoryViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
             return InstitutionCategoryDetailSerializer
         return InstitutionCategoryListSerializer
 
+    @cached_response(tags=["institution"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(tags=["institution"], vary_on_user=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
-class InstitutionViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
+class InstitutionViewSet(ReplicaReadMixin, ViewSetMixin, ListAPIView, RetrieveAPIView):
     queryset = (
         Institution.objects.get_available().select_related("category")
     ).prefetch_related(
@@ -192,6 +200,7 @@ class InstitutionViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
         return queryset
         
         
+    @cached_response(tags=["institution", "product"], vary_on_user=True)
     def retrieve(self, request, pk, *args, **kwargs):
         instance = self.get_object()
         lat = float(request.query_params.get("lat", 0))
@@ -289,7 +298,7 @@ class InstitutionViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
             )
         ]
     )
-    
+    @cached_response(tags=["institution", "product"], vary_on_user=True)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -433,7 +442,7 @@ class RateInstitutionView(views.APIView):
         return Response(response)
 
 
-class SearchView(views.APIView):
+class SearchView(ReplicaReadMixin, views.APIView):
     def get(self, request, pk):
         try:
             institution = Institution.objects.get_available().select_related("category").annotate(rating=Round(Avg("feedback_rates__value"), 2))
@@ -459,34 +468,18 @@ class ImportView(views.APIView):
             "client_id": institution.client_id,
             "client_secret": institution.client_secret
         }
-    
-    def do_import(self, id):
-        institution = Institution.objects.get(pk=id)
 
-        rkeeper = rkeeperAPI(endpoint_url=institution.endpoint_url, client_id=institution.client_id, client_secret=institution.client_secret)
-        
-        restaurants = rkeeper.get_restaurants()
-        
-        # logging.basicConfig()
-
-        for rest in restaurants['places']:
-            seed_institution_branch(institution, rest)
-            menu = rkeeper.get_menu(rest['id'])
-            
-            # print(f"Branch: {rest['id']} | Kategoriya: {len(menu['categories'])} | Produkt: {len(menu['items'])}")
-
-            for cat in menu['categories']:
-                seed_category(institution, cat)
-            for item in menu['items']:
-                seed_products(institution, rest['id'], item)
-                
-    def get(self, request, pk):
-        threading.Thread(target=self.do_import, args=(pk,)).start()
+    def start_import(self, pk):
+        task = import_menu.delay(pk)
         return Response({
             "status": "accepted",
-            "message": "Import jarayoni boshlandi."
+            "message": "Import jarayoni boshlandi.",
+            "task_id": task.id,
         })
-    
+
+    def get(self, request, pk):
+        return self.start_import(pk)
+
     def post(self, request, pk):
         institution = Institution.objects.get(pk=pk)
         data = request.data
@@ -495,8 +488,16 @@ class ImportView(views.APIView):
         institution.endpoint_url = data.get("endpoint_url", "https://rkeeper.api.deliveryhub.uz")
         institution.save()
 
-        threading.Thread(target=self.do_import, args=(pk,)).start()
-        return Response({
-            "status": "accepted",
-            "message": "Import jarayoni boshlandi."
-        })
+        return self.start_import(pk)
+
+
+class ImportStatusView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, task_id):
+        result = AsyncResult(task_id)
+        if result.state == "PROGRESS":
+            return Response({"status": result.state, **result.info})
+        if result.failed():
+            return Response({"status": result.state, "message": str(result.result)})
+        return Response({"status": result.state, "result": result.result})
@@ -12,7 +12,8 @@ admin.site.unregister(Group)
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    readonly_fields = ["created_at", "fcm_device"]
+    # changed only through update_order_status(), plain saves leave these columns alone
+    readonly_fields = ["created_at", "fcm_device", "status", "version", "stats_contribution"]
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("customer")
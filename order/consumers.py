@@ -1,14 +1,13 @@
-import json
-
 from aiogram import Bot
 from aiogram import types
 from aiogram.filters.callback_data import CallbackData
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from typing import Optional
-from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.sync import sync_to_async
 from channels.consumer import AsyncConsumer
-from channels.generic.websocket import WebsocketConsumer
 
+from base.consumers import GroupJsonConsumer, PartitionedGroupConsumer
+from common.metrics import observe_handler
 from order.models import Order, TelegramMessage
 from tuktuk.settings import BOT_TOKEN
 
@@ -18,63 +17,43 @@ class OrderCallback(CallbackData, prefix="order"):
     order_id: str
     preparing_time: Optional[str] = None
 
-class InstitutionConsumer(WebsocketConsumer):
-    def connect(self):
+class InstitutionConsumer(GroupJsonConsumer):
+    group_type = "institution"
+
+    def get_group_names(self):
         self.institution_id = self.scope["url_route"]["kwargs"]["institution_id"]
-        self.institution_group_name = f"institution_{self.institution_id}"
-        async_to_sync(self.channel_layer.group_add)(self.institution_group_name, self.channel_name)
+        return [f"institution_{self.institution_id}"]
 
-        self.accept()
+    async def order_data(self, event):
+        await self.forward_event(event)
 
-    def order_data(self, event):
-        text_data_to_send = json.dumps(event)
-        self.send(text_data=text_data_to_send)
 
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(self.institution_group_name, self.channel_name)
+class OrderConsumer(GroupJsonConsumer):
+    group_type = "client"
 
-class OrderConsumer(WebsocketConsumer):
-    def connect(self):
+    def get_group_names(self):
         self.client_id = self.scope["url_route"]["kwargs"].get("client_id", None)
-        self.group_name = f"client_{self.client_id}"
-        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
-
-        self.accept()
-
-    def order(self, event):
-        text_data_to_send = json.dumps(event)
-        self.send(text_data=text_data_to_send)
-
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
-
+        return [f"client_{self.client_id}"]
 
-class OperatorConsumer(WebsocketConsumer):
-    def connect(self):
-        async_to_sync(self.channel_layer.group_add)("operator", self.channel_name)
+    async def order(self, event):
+        await self.forward_event(event)
 
-        self.accept()
 
-    def order_data(self, event):
-        text_data_to_send = json.dumps(event)
-        self.send(text_data=text_data_to_send)
+class OperatorConsumer(PartitionedGroupConsumer):
+    group_type = "operator"
+    base_group = "operator"
 
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)("operator", self.channel_name)
+    async def order_data(self, event):
+        await self.forward_event(event)
 
-class CourierConsumer(WebsocketConsumer):
-    def connect(self):
-        self.courier_group_name = "courier"
-        async_to_sync(self.channel_layer.group_add)(self.courier_group_name, self.channel_name)
 
-        self.accept()
+class CourierConsumer(PartitionedGroupConsumer):
+    group_type = "courier"
+    base_group = "courier"
 
-    def order_data(self, event):
-        text_data_to_send = json.dumps(event)
-        self.send(text_data=text_data_to_send)
+    async def order_data(self, event):
+        await self.forward_event(event)
 
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(self.courier_group_name, self.channel_name)
 
 @sync_to_async
 def update_message(order_id, text=None, mid=0, mid2=0):
@@ -100,6 +79,7 @@ class TelegramBotConsumer(AsyncConsumer):
         self.bot = Bot(BOT_TOKEN)
         super(TelegramBotConsumer, self).__init__()
 
+    @observe_handler
     async def send_cancel_message(self, message=None):
         telegram_id = message["telegram_id"]
         order_id = message["order_id"]
@@ -107,6 +87,7 @@ class TelegramBotConsumer(AsyncConsumer):
 
         await self.bot.send_message(telegram_id, text)
 
+    @observe_handler
     async def send_message(self, message=None):
         try:
             telegram_id_str = message["telegram_id_str"] or ""
@@ -136,6 +117,7 @@ class TelegramBotConsumer(AsyncConsumer):
         except Exception as e:
             print("SD", e)
             
+    @observe_handler
     async def edit_message(self, message=None):
         try:
             telegram_id_str = message["telegram_id_str"] or ""
@@ -0,0 +1,59 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from common.events import get_branch_group, get_region_group
+from order.models import OrderItemGroup
+
+PARTITIONED_GROUPS = ("courier", "ready_orders", "operator")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the websocket fan-out of recent orders with region partitioned groups "
+        "against a single global group, using the current group membership"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Orders created in this many days")
+
+    def handle(self, *args, **options):
+        client = redis.StrictRedis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0)
+        prefix = settings.CHANNEL_LAYERS["default"]["CONFIG"].get("prefix", "asgi")
+
+        orders = Counter(
+            OrderItemGroup.objects.filter(
+                order__created_at__gte=timezone.now() - timedelta(days=options["days"])
+            ).values_list("institution_branch__region_branch_id", "institution_branch_id")
+        )
+        total_orders = sum(orders.values())
+        if not total_orders:
+            self.stdout.write("No orders in the period")
+            return
+        self.stdout.write(f"Item groups of the last {options['days']} days: {total_orders}")
+
+        for base in PARTITIONED_GROUPS:
+            members = {base: client.zcard(f"{prefix}:group:{base}")}
+            for pattern in (get_region_group(base, "*"), get_branch_group(base, "*")):
+                for key in client.scan_iter(match=f"{prefix}:group:{pattern}"):
+                    members[key.decode().split(":group:", 1)[1]] = client.zcard(key)
+            # region sockets are also members of the group of orders without a region
+            subscribed = sum(members.values()) - members.get(get_region_group(base, None), 0)
+
+            partitioned = 0
+            for (region_id, branch_id), count in orders.items():
+                reached = (
+                    members.get(base, 0)
+                    + members.get(get_region_group(base, region_id), 0)
+                    + members.get(get_branch_group(base, branch_id), 0)
+                )
+                partitioned += reached * count
+            self.stdout.write(
+                f"{base:14} sockets {subscribed:>6}  deliveries per event: "
+                f"global {subscribed:>6}  partitioned {partitioned / total_orders:>8.1f}"
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from order.stats import ROLLUP_BATCH_SIZE, rebuild_order_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly order stats rollup from orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rows = rebuild_order_stats(
+            batch_size=options["batch_size"],
+            progress=lambda last_id: self.stdout.write(f"Processed orders up to id {last_id}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rollup rows: {rows}"))
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('institution', '0051_institution_image_variants_and_more'),
+        ('order', '0047_order_is_process'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stats_contribution',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='OrderStatsHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('status', models.CharField(choices=[('pre-order', 'пред-заказ'), ('created', 'создан'), ('pending', 'ожидает оплаты'), ('accepted', 'принят'), ('cooking', 'готовится'), ('rejected', 'отменен'), ('ready', 'готов'), ('shipped', 'в пути'), ('closed', 'закрыт'), ('incident', 'инцидент')], max_length=255, verbose_name='Статус')),
+                ('payment_method', models.CharField(choices=[('cash', 'наличными'), ('payme', 'payme'), ('terminal', 'терминал')], max_length=255, verbose_name='Метод оплаты')),
+                ('is_paid', models.BooleanField(default=False, verbose_name='Статус оплаты')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Кол-во заказов')),
+                ('completed_count', models.IntegerField(default=0, verbose_name='Кол-во завершенных заказов')),
+                ('products_sum', models.BigIntegerField(default=0, verbose_name='Сумма продуктов')),
+                ('total_sum', models.BigIntegerField(default=0, verbose_name='Общая сумма')),
+                ('commission', models.BigIntegerField(default=0, verbose_name='Комиссия')),
+                ('institution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='institution.institution', verbose_name='Заведение')),
+                ('institution_branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='institution.institutionbranch', verbose_name='Филиал заведения')),
+            ],
+            options={
+                'verbose_name': 'Почасовая статистика заказов',
+                'verbose_name_plural': 'Почасовая статистика заказов',
+                'indexes': [models.Index(fields=['hour', 'status'], name='order_stats_hour_status_idx'), models.Index(fields=['institution', 'hour'], name='order_stats_inst_hour_idx')],
+            },
+        ),
+    ]
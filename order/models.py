@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from fcm_django.models import FCMDevice
 from .managers import OrderManager
 
@@ -23,6 +24,15 @@ class ORDER_STATUS(models.TextChoices):
     CLOSED = "closed", "закрыт"
 
 
+COMPLETED_STATUSES = ("closed", "rejected")
+# fields of Order that OrderStatsHourly depends on
+STATS_FIELDS = {"status", "payment_method", "is_paid", "products_sum", "total_sum", "completed_at"}
+# fields of Order that a plain save() of a loaded order never writes back, a stale copy
+# would revert them. Their owners write them with queries of their own: the status and
+# version by order.state_machine.claim_order, the contribution by order.stats
+MANAGED_FIELDS = {"status", "version", "stats_contribution"}
+
+
 class Order(models.Model):
     STATUSES = (
         ("pre-order", "пред-заказ"),
@@ -86,6 +96,10 @@ class Order(models.Model):
     cdt = models.CharField(max_length=512, null=True, blank=True)
     uuid = models.UUIDField(blank=True, null=True)
     restaurant_status = models.CharField(choices=RKEEPER_STATUS, verbose_name="Статус Rkeeper", max_length=60, null=True, blank=True)
+    # what the order currently adds to OrderStatsHourly, see order.stats
+    stats_contribution = models.JSONField(default=list, blank=True, editable=False)
+    # bumped by every status transition and courier assignment, see order.state_machine
+    version = models.PositiveIntegerField(default=0, editable=False)
     objects: OrderManager = OrderManager()
 
     class Meta:
@@ -96,6 +110,34 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ №{self.id} пользователя {self.customer}"
 
+    def save(self, *args, **kwargs):
+        from .stats import refresh_order_stats
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None and not self._state.adding and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = update_fields = {
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MANAGED_FIELDS
+            }
+        completed = self.status in COMPLETED_STATUSES
+        if completed != (self.completed_at is not None):
+            self.completed_at = timezone.now() if completed else None
+            if update_fields is not None:
+                kwargs["update_fields"] = update_fields = {*update_fields, "completed_at"}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or STATS_FIELDS.intersection(update_fields):
+                refresh_order_stats(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from .stats import discard_order_stats
+
+        with transaction.atomic():
+            discard_order_stats(self.pk)
+            return super().delete(*args, **kwargs)
+
 class OrderStatusTimeline(models.Model):
     order = models.OneToOneField("Order", on_delete=models.CASCADE, related_name="timeline")
     
@@ -144,6 +186,13 @@ class OrderItemGroup(models.Model):
     def __str__(self):
         return f"Группа для заказа №{self.order.id}"
 
+    def save(self, *args, **kwargs):
+        from .stats import refresh_order_stats
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            refresh_order_stats(self.order_id)
+
     @property
     def institution_address_branch(self):
         if self.institution_branch and self.institution_branch.address:
@@ -151,6 +200,47 @@ class OrderItemGroup(models.Model):
         return None
 
 
+class OrderStatsHourly(models.Model):
+    """
+    Rollup of orders by the hour they were created in. "completed_count" is the only counter
+    keyed by the hour of completion instead. Rows are maintained incrementally by order.stats
+    and may repeat a key, so they are always read with Sum().
+    """
+
+    hour = models.DateTimeField(verbose_name="Час")
+    institution = models.ForeignKey(
+        "institution.Institution", verbose_name="Заведение", on_delete=models.CASCADE
+    )
+    institution_branch = models.ForeignKey(
+        "institution.InstitutionBranch",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Филиал заведения",
+    )
+    status = models.CharField(verbose_name="Статус", choices=Order.STATUSES, max_length=255)
+    payment_method = models.CharField(
+        verbose_name="Метод оплаты", max_length=255, choices=PAYMENT_METHODS
+    )
+    is_paid = models.BooleanField(default=False, verbose_name="Статус оплаты")
+    orders_count = models.IntegerField(default=0, verbose_name="Кол-во заказов")
+    completed_count = models.IntegerField(default=0, verbose_name="Кол-во завершенных заказов")
+    products_sum = models.BigIntegerField(default=0, verbose_name="Сумма продуктов")
+    total_sum = models.BigIntegerField(default=0, verbose_name="Общая сумма")
+    commission = models.BigIntegerField(default=0, verbose_name="Комиссия")
+
+    class Meta:
+        verbose_name = "Почасовая статистика заказов"
+        verbose_name_plural = "Почасовая статистика заказов"
+        indexes = [
+            models.Index(fields=["hour", "status"], name="order_stats_hour_status_idx"),
+            models.Index(fields=["institution", "hour"], name="order_stats_inst_hour_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.institution_id} {self.hour:%Y-%m-%d %H:00} {self.status}"
+
+
 class OrderItem(models.Model):
     order_item_group = models.ForeignKey(
         OrderItemGroup, on_delete=models.CASCADE, verbose_name="Группа", related_name="items"
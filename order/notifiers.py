@@ -2,6 +2,7 @@ from aiogram import Bot
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from common.events import publish
 from tuktuk.settings import BOT_TOKEN
 
 channel_layer = get_channel_layer()
@@ -65,12 +66,11 @@ class BaseOrderNotifier:
 
 class WebsocketOrderNotifier(BaseOrderNotifier):
     def notify(self, groups=None):
-        channel_layer = get_channel_layer()
         if not groups:
             groups = self.order.item_groups.all()
         
         for group in groups:
-            async_to_sync(channel_layer.group_send)(
+            publish(
                 f"institution_{group.institution_id}",
                 # {
                 #     "type": "order_data",
@@ -5,3 +5,12 @@ class FeedbackConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "order.promo_codes"
     verbose_name = "Промокоды"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .models import PromoCodeUsage
+        from .services import forget_usage, remember_usage
+
+        post_save.connect(remember_usage, sender=PromoCodeUsage, dispatch_uid="promo-code-users")
+        post_delete.connect(forget_usage, sender=PromoCodeUsage, dispatch_uid="promo-code-users")
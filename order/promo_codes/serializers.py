@@ -1,7 +1,23 @@
+from django.utils.encoding import smart_str
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from order.promo_codes.models import PromoCode, PromoCodeUsage
+from order.promo_codes.models import PromoCode
+from order.promo_codes.services import ALREADY_USED_ERROR, is_used_by, promo_code_index
+
+
+class UsablePromoCodeField(serializers.SlugRelatedField):
+    """A usable code by "code", looked up in the in-process index of active codes."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("queryset", PromoCode.objects.filter_usable())
+        super().__init__(slug_field="code", **kwargs)
+
+    def to_internal_value(self, data):
+        promo_code = promo_code_index.get_usable(smart_str(data))
+        if promo_code is None:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_str(data))
+        return promo_code
 
 
 class PromoCodeNotUsedByUserValidator:
@@ -10,15 +26,8 @@ class PromoCodeNotUsedByUserValidator:
     def __call__(self, value, serializer):
         if request := serializer.context.get("request"):
             user_id = request.user.id
-            if PromoCodeUsage.objects.filter(user_id=user_id, promo_code=value).exists():
-                raise ValidationError({
-                    "status": "error",
-                    "message": {
-                        "uz": "Siz ushbu koddan foydalangansiz.",
-                        "ru": "Вы уже использовали этот код.",
-                        "en": "You have already used this code."
-                    }
-                })
+            if user_id is not None and is_used_by(value.id, user_id):
+                raise ValidationError(ALREADY_USED_ERROR)
 
 
 class PromoCodeInfoSerializer(serializers.ModelSerializer):
@@ -35,8 +44,6 @@ class PromoCodeInfoSerializer(serializers.ModelSerializer):
 
 
 class GetPromoCodeInfoSerializer(serializers.Serializer):
-    promo_code = serializers.SlugRelatedField(
-        queryset=PromoCode.objects.filter_usable(),
-        slug_field="code",
+    promo_code = UsablePromoCodeField(
         validators=[PromoCodeNotUsedByUserValidator()],
     )
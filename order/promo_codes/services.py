@@ -1,5 +1,152 @@
+"""
+Promo code checks that stay off the database while a campaign runs.
+
+Codes are looked up in a per process index of active codes, rebuilt when the
+"promo_code" cache tag changes (any PromoCode save or delete). Who already used a
+code is kept in a Redis set per code, loaded from PromoCodeUsage on first use and
+kept up to date by the usage signals once their transaction commits. The unique
+(user, promo_code) constraint stays the final word on redemption.
+"""
+import logging
+import os
+import threading
+
+import redis
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from common.cache import get_tag_versions
 from order.promo_codes.models import PromoCodeUsage, PromoCode
 
+logger = logging.getLogger(__name__)
+
+PROMO_CODE_TAG = "promo_code"
+PROMO_CODE_FIELDS = (
+    "id",
+    "name",
+    "status",
+    "description",
+    "sum",
+    "code",
+    "revokable",
+    "min_order_sum",
+    "created_at",
+    "is_active",
+    "start_date",
+    "end_date",
+)
+USERS_KEY = "promo-code:{}:users"
+# member of every loaded set, user ids start at 1
+LOADED_MARKER = 0
+USERS_TTL = 7 * 24 * 60 * 60
+
+ALREADY_USED_ERROR = {
+    "status": "error",
+    "message": {
+        "uz": "Siz ushbu koddan foydalangansiz.",
+        "ru": "Вы уже использовали этот код.",
+        "en": "You have already used this code."
+    }
+}
+
+_redis = {}
+
+
+class PromoCodeIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.codes = {}
+
+    def get_codes(self):
+        version = get_tag_versions([PROMO_CODE_TAG])[0]
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    rows = PromoCode.objects.filter(
+                        is_active=True, end_date__gte=timezone.now()
+                    ).values_list(*PROMO_CODE_FIELDS)
+                    self.codes = {row[PROMO_CODE_FIELDS.index("code")]: row for row in rows}
+                    self.version = version
+        return self.codes
+
+    def get_usable(self, code):
+        """An unsaved copy of the usable code, None if there is none."""
+        row = self.get_codes().get(code)
+        if row is None:
+            return None
+        promo_code = PromoCode.from_db("default", PROMO_CODE_FIELDS, row)
+        if not promo_code.start_date <= timezone.now() <= promo_code.end_date:
+            return None
+        return promo_code
+
+
+promo_code_index = PromoCodeIndex()
+
+
+def get_redis():
+    if "client" not in _redis:
+        _redis["client"] = redis.StrictRedis(
+            host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+        )
+    return _redis["client"]
+
+
+def get_users_key(promo_code_id):
+    return USERS_KEY.format(promo_code_id)
+
+
+def load_users(promo_code_id):
+    user_ids = set(
+        PromoCodeUsage.objects.filter(promo_code_id=promo_code_id).values_list("user_id", flat=True)
+    )
+    key = get_users_key(promo_code_id)
+    pipeline = get_redis().pipeline()
+    pipeline.sadd(key, LOADED_MARKER, *user_ids)
+    pipeline.expire(key, USERS_TTL)
+    pipeline.execute()
+    return user_ids
+
+
+def is_used_by(promo_code_id, user_id):
+    try:
+        loaded, used = get_redis().smismember(get_users_key(promo_code_id), [LOADED_MARKER, user_id])
+        if not loaded:
+            return user_id in load_users(promo_code_id)
+        return bool(used)
+    except redis.RedisError as e:
+        logger.warning(f"Promo code users set unavailable: {e}")
+        return PromoCodeUsage.objects.filter(user_id=user_id, promo_code_id=promo_code_id).exists()
+
+
+def update_users(promo_code_id, user_id, used):
+    key = get_users_key(promo_code_id)
+    try:
+        client = get_redis()
+        # unloaded sets are left alone, the next check loads them with the change
+        if not client.sismember(key, LOADED_MARKER):
+            return
+        if used:
+            client.sadd(key, user_id)
+        else:
+            client.srem(key, user_id)
+    except redis.RedisError as e:
+        logger.warning(f"Promo code users set not updated, dropping it: {e}")
+        try:
+            get_redis().delete(key)
+        except redis.RedisError:
+            pass
+
+
+def remember_usage(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: update_users(instance.promo_code_id, instance.user_id, True))
+
+
+def forget_usage(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_users(instance.promo_code_id, instance.user_id, False))
+
 
 class PromoCodeService:
     def __init__(self, promo_code: PromoCode):
@@ -12,9 +159,14 @@ class PromoCodeService:
         return self.promo_code.min_order_sum
 
     def use(self, user, order):
-        promo = PromoCode.objects.filter(code=self.promo_code, is_active=True, status='active')
-        if promo:
-            PromoCodeUsage.objects.create(user=user, promo_code=self.promo_code, order=order)
+        if not self.promo_code.is_active or self.promo_code.status != "active":
+            return
+        try:
+            with transaction.atomic():
+                PromoCodeUsage.objects.create(user=user, promo_code=self.promo_code, order=order)
+        except IntegrityError:
+            # a concurrent order of the same user redeemed it first
+            raise ValidationError(ALREADY_USED_ERROR)
         # if self.promo_code.revokable:
             # self.promo_code.is_active = False
             # self.promo_code.save()
@@ -12,6 +12,7 @@ from firebase_admin.messaging import (
     send
 )
 
+from common.metrics import observe_handler, track_external_call
 from order.models import Order
 from user.models import CustomFCMDevice, User
 
@@ -21,6 +22,7 @@ class FirebaseConsumer(SyncConsumer):
     def __init__(self):
         super().__init__()
 
+    @observe_handler
     def courier_new_order_notification(self, message=None):
         message = Message(
             notification=Notification(title="Новый заказ", body="Новый заказ"),
@@ -34,12 +36,14 @@ class FirebaseConsumer(SyncConsumer):
         couriers = CustomFCMDevice.objects.filter(app_name="courier", active=True)
         print(f"[DEBUG] Found {couriers.count()} courier devices")
         
-        response = couriers.send_message(message)
+        with track_external_call("fcm", "send_message"):
+            response = couriers.send_message(message)
         invalid_ids = response.deactivated_registration_ids
 
         if invalid_ids:
             CustomFCMDevice.objects.filter(registration_id__in=invalid_ids).delete()
 
+    @observe_handler
     def institution_new_order_notification(self, message):
         try:
             order = Order.objects.get(pk=message["order_id"])
@@ -93,7 +97,8 @@ class FirebaseConsumer(SyncConsumer):
                     )
                 )
             )
-            res = new_devices.send_message(msg)
+            with track_external_call("fcm", "send_message"):
+                res = new_devices.send_message(msg)
             print(f"[DEBUG] FCM response: {res}")
             invalid_ids = res.deactivated_registration_ids
 
@@ -105,6 +110,7 @@ class FirebaseConsumer(SyncConsumer):
             print("[ERROR] Failed to send FCM notification", e)
             print(traceback.format_exc())
 
+    @observe_handler
     def institution_courier_accept_notification(self, message):
         order = Order.objects.get(pk=message["order_id"])
         
@@ -137,7 +143,8 @@ class FirebaseConsumer(SyncConsumer):
             }
         )
         
-        response = new_devices.send_message(message)
+        with track_external_call("fcm", "send_message"):
+            response = new_devices.send_message(message)
 
         print(response)
         invalid_ids = response.deactivated_registration_ids
@@ -145,6 +152,7 @@ class FirebaseConsumer(SyncConsumer):
         if invalid_ids:
             CustomFCMDevice.objects.filter(registration_id__in=invalid_ids).delete()
 
+    @observe_handler
     def institution_cancel_notification(self, message):
         order = Order.objects.get(pk=message["order_id"])
         
@@ -178,7 +186,8 @@ class FirebaseConsumer(SyncConsumer):
             }
         )
         
-        response = new_devices.send_message(message)
+        with track_external_call("fcm", "send_message"):
+            response = new_devices.send_message(message)
 
         print(response)
 
@@ -187,6 +196,7 @@ class FirebaseConsumer(SyncConsumer):
         if invalid_ids:
             CustomFCMDevice.objects.filter(registration_id__in=invalid_ids).delete()
 
+    @observe_handler
     def order_courier_ready_notification(self, message):
         order = Order.objects.get(pk=message["order_id"])
         
@@ -200,23 +210,26 @@ class FirebaseConsumer(SyncConsumer):
                 notification=Notification(title=f"Заказ №{message['order_id']} готов и ждет вас", body=f"Заказ №{message['order_id']} готов и ждет вас"),
             )
 
-            response = new_devices.send_message(message)
+            with track_external_call("fcm", "send_message"):
+                response = new_devices.send_message(message)
             invalid_ids = response.deactivated_registration_ids
 
             if invalid_ids:
                 CustomFCMDevice.objects.filter(registration_id__in=invalid_ids).delete()
 
+    @observe_handler
     def send_notification(self, message=None):
 
         order = Order.objects.get(pk=message["order_id"])
         new_devices = CustomFCMDevice.objects.filter(user=order.customer, active=True)
         
-        response = new_devices.send_message(
-            Message(
-                notification=Notification(title=message["title"], body=message["body"]),
-                data={"order_id": str(message["order_id"])},
-            ),
-        )
+        with track_external_call("fcm", "send_message"):
+            response = new_devices.send_message(
+                Message(
+                    notification=Notification(title=message["title"], body=message["body"]),
+                    data={"order_id": str(message["order_id"])},
+                ),
+            )
 
         invalid_ids = response.deactivated_registration_ids
 
@@ -241,7 +254,8 @@ def send_notification_to_all(title, body, data=None, app="client"):
                 data={"app_id": app_list[app], **(data or {})},
                 tokens=chunk,
             )
-            response = send_each_for_multicast(multicast_message)
+            with track_external_call("fcm", "send_each_for_multicast"):
+                response = send_each_for_multicast(multicast_message)
         
             for idx, res in enumerate(response.responses):
                 if not res.success:
@@ -269,7 +283,8 @@ def send_notification_by_phone_number(phone_number, title, body, data=None, app=
                 data={"app_id": app_list[app], **(data or {})},
                 token=device.registration_id,
             )
-            response = send(message)
+            with track_external_call("fcm", "send"):
+                response = send(message)
             return {"status": "ok", "data": {"success": 1, "fail": 0}, "error": ""}
         else:
             return {"status": "error", "data": [], "error": "Aktiv token yo'q"}
@@ -1,13 +1,15 @@
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from common.events import publish_partitioned
 from courier.serializers import AvailableOrdersSerializer
 
 
 # Courier #
 def notify_ready_order(order):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
+    group = order.item_groups.select_related("institution_branch").first()
+    publish_partitioned(
         "ready_orders",
+        group.institution_branch,
         {
             "type": "send_order_status",
             **AvailableOrdersSerializer(order).data
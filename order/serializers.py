@@ -18,8 +18,11 @@ from product.serializers import OptionItemSerializer, ThumbnailSerializer
 from .models import Order, OrderItem, OrderItemGroup, OrderStatusTimeline
 from product.models import OptionItem, Product
 from courier.models import Courier
-from .promo_codes.models import PromoCode, PromoCodeUsage
-from .promo_codes.serializers import PromoCodeInfoSerializer, PromoCodeNotUsedByUserValidator
+from .promo_codes.serializers import (
+    PromoCodeInfoSerializer,
+    PromoCodeNotUsedByUserValidator,
+    UsablePromoCodeField,
+)
 
 
 class OrderFCMDeviceSerializer(DeviceSerializerMixin):
@@ -123,7 +126,28 @@ class OrderTimelineSerializer(serializers.ModelSerializer):
         model = OrderStatusTimeline
         fields = ["preparing_start_at", "preparing_completed_at", "preparing_lates", "courier_assign_at", "courier_arrived_at", "courier_take_it_at", "courier_lates", "delivered_at"]
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderProductsMixin:
+    """Flat list of the products of all item groups, read from the item_groups prefetches."""
+
+    def get_products(self, obj):
+        return [
+            {
+                "id": item.id,
+                "name_ru": item.product.name_ru,
+                "name_uz": item.product.name_uz,
+                "name_en": item.product.name_en,
+                "image": item.product.image.url if item.product.image else None,
+                "count": item.count,
+                "amount": item.product.price,
+                "total": item.count * item.product.price,
+                "options": OptionItemSerializer(item.options.all(), many=True).data,
+            }
+            for group in obj.item_groups.all()
+            for item in group.items.all()
+        ]
+
+
+class OrderSerializer(OrderProductsMixin, serializers.ModelSerializer):
     item_groups = OrderItemGroupSerializer(many=True)
     customer = serializers.IntegerField(source="customer.id", read_only=True)
     status = serializers.ReadOnlyField()
@@ -140,9 +164,7 @@ class OrderSerializer(serializers.ModelSerializer):
     # fcm_device = OrderFCMDeviceSerializer(allow_null=True)
     courier = CourierSerializer(read_only=True, allow_null=True)
     
-    promo_code = serializers.SlugRelatedField(
-        queryset=PromoCode.objects.filter_usable(),
-        slug_field="code",
+    promo_code = UsablePromoCodeField(
         required=False,
         allow_null=True,
         write_only=True,
@@ -232,32 +254,8 @@ class OrderSerializer(serializers.ModelSerializer):
         
         return institution_data
          
-    def get_products(self, obj):
-        products = []
-        for group in obj.item_groups.all():
-            for item in group.items.all():
-                product = {
-                    "id": item.id,
-                    "name_ru": item.product.name_ru,
-                    "name_uz": item.product.name_uz,
-                    "name_en": item.product.name_en,
-                    "image": item.product.image.url if item.product.image else None,
-                    "count": item.count,
-                    "amount": item.product.price,
-                    "total": item.count * item.product.price,
-                    "options":  OptionItemSerializer(item.options.all(), many=True).data,
-                }
-                products.append(product)
-        return products
-        
     def get_discount_sum(self, obj):
-        try:
-            promo = PromoCodeUsage.objects.select_related("promo_code").get(order=obj, user=obj.customer)
-            if promo:
-                promocode = promo.promo_code.sum
-        except PromoCodeUsage.DoesNotExist:
-            promocode = 0
-        return promocode
+        return obj.discount_sum or 0
         
     # def get_prices(self, obj):
     #     promocode = 0
@@ -350,6 +348,54 @@ class OrderSerializer(serializers.ModelSerializer):
 
         return total_time >= timezone.now()
 
+
+class OrderListSerializer(OrderProductsMixin, serializers.ModelSerializer):
+    """
+    Customer order history entry. Reads only annotations of OrderViewSet.get_list_queryset
+    and its prefetches, so a page costs the same number of queries for any history size.
+    """
+
+    institution = serializers.SerializerMethodField()
+    products = serializers.SerializerMethodField()
+    discount_sum = serializers.IntegerField(source="promo_discount_sum", read_only=True)
+    has_institution_feedback = serializers.BooleanField(read_only=True)
+    has_delivery_feedback = serializers.BooleanField(read_only=True)
+    created_at = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "status",
+            "payment_method",
+            "is_paid",
+            "created_at",
+            "institution",
+            "products",
+            "discount_sum",
+            "products_sum",
+            "delivering_sum",
+            "total_sum",
+            "has_institution_feedback",
+            "has_delivery_feedback",
+        ]
+
+    def get_created_at(self, obj):
+        return timezone.localtime(obj.created_at, pytz.timezone("Asia/Tashkent")).isoformat()
+
+    def get_institution(self, obj):
+        groups = obj.item_groups.all()
+        if not groups:
+            return None
+        institution = groups[0].institution
+        branch = groups[0].institution_branch
+        return {
+            "name": institution.name,
+            "logo": institution.logo.url if institution.logo else "",
+            "branch": branch.name if branch else None,
+        }
+
+
 class OrderRestaurantSerializer(OrderSerializer):
     total_sum = serializers.SerializerMethodField()
     prices = serializers.SerializerMethodField()
@@ -392,14 +438,7 @@ class OrderRestaurantSerializer(OrderSerializer):
         return None
 
     def get_prices(self, obj):
-        promocode = 0
-        try:
-            promo = PromoCodeUsage.objects.select_related("promo_code").get(order=obj, user=obj.customer)
-            if promo:
-                promocode = promo.promo_code.sum
-        except PromoCodeUsage.DoesNotExist:
-            pass
-        
+        promocode = obj.discount_sum or 0
         price_info = {
             "discount_amount":  promocode,
             "delivery_amount":  obj.delivering_sum,
@@ -454,7 +493,7 @@ class OrderAssignmentValidator:
 
         institution = self.order.item_groups.first().institution
         if self.order.payment_method == "cash" and (self.order.uuid or institution.is_holding):
-            if self.courier.balance < self.order.total_sum:
+            if self.courier.get_balance() < self.order.total_sum:
                 logger.error(f"Order {self.order.id} not found for courier {self.courier.id}")
                 return self._error([
                     "Kechirasiz, buyurtmani rasmiylashtirish uchun balansingizda yetarli mablag' mavjud emas.",
@@ -1,8 +1,6 @@
 import requests
 from datetime import timedelta
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 
 from django.utils import timezone
 from django.db import transaction
@@ -15,6 +13,7 @@ from .utils import notify
 from .serializers import OrderSerializer
 
 from user.models import User
+from common.events import publish
 from common.models import Settings
 from courier.models import InstitutionDeliverySettings
 from institution.models import InstitutionBranchSchedule
@@ -49,6 +48,26 @@ def calculate_delivering_sum(
         delivery_settings.min_delivery_price + delivery_settings.price_per_km * distance, -2
     )
 
+def get_commission_percentage(institution, order, settings=None):
+    """Commission rule of the institution for the order's delivery type, global if unset."""
+    if order.self_pickup:
+        comission_percentage = institution.tax_percentage_self_pickup
+        if comission_percentage is None:
+            settings = settings or Settings.load()
+            comission_percentage = settings.common_percentage_self_pickup
+    elif institution.delivery_by_own:
+        comission_percentage = institution.tax_percentage_restaurant_couriers
+        if comission_percentage is None:
+            settings = settings or Settings.load()
+            comission_percentage = settings.common_percentage_restaurant_couriers
+    else:
+        comission_percentage = institution.tax_percentage_ordinary
+        if comission_percentage is None:
+            settings = settings or Settings.load()
+            comission_percentage = settings.common_percentage_ordinary
+    return comission_percentage
+
+
 class OrderItemGroupService:
     def __init__(self, validated_data=None, order_service=None, instance=None):
         self.validated_data = validated_data
@@ -81,24 +100,7 @@ class OrderItemGroupService:
 
     def _calculate_commission(self):
         institution = self.validated_data["institution"]
-        order = self.instance.order
-
-        if order.self_pickup:
-            comission_percentage = institution.tax_percentage_self_pickup
-            if comission_percentage is None:
-                settings = Settings.load()
-                comission_percentage = settings.common_percentage_self_pickup
-        elif institution.delivery_by_own:
-            comission_percentage = institution.tax_percentage_restaurant_couriers
-            if comission_percentage is None:
-                settings = Settings.load()
-                comission_percentage = settings.common_percentage_restaurant_couriers
-        else:
-            comission_percentage = institution.tax_percentage_ordinary
-            if comission_percentage is None:
-                settings = Settings.load()
-                comission_percentage = settings.common_percentage_ordinary
-
+        comission_percentage = get_commission_percentage(institution, self.instance.order)
         comission = (self._calculate_products_sum() * comission_percentage) / 100
         return round(comission, -1)
 
@@ -124,9 +126,8 @@ class OrderItemGroupService:
             OrderItem.options.through.objects.bulk_create(_options_through)
 
     def _send_order_data(self):
-        channel_layer = get_channel_layer()
         group = self.instance.item_groups.first()
-        async_to_sync(channel_layer.group_send)(
+        publish(
             f"institution_{self.instance.institution_id}",
             {
                 "type": "order_data",
@@ -145,7 +146,7 @@ class OrderItemGroupService:
             }
         )
         
-        async_to_sync(channel_layer.group_send)(
+        publish(
             f"order_{self.instance.id}",
             {
                 "type": "order_by_id",
@@ -0,0 +1,151 @@
+"""
+Order status transitions.
+
+A transition table (see order.status_controller.TRANSITIONS) maps every status an order
+can be moved to onto the statuses it may come from, guards checked before anything is
+written, calls to external services, effects applied to the order inside the transaction
+and hooks run once it committed, so pushes, Telegram messages and payment cancellations
+never announce a rolled back change.
+
+Nothing is locked up front. Guards and calls (e.g. the Payme charge) run outside any
+transaction; a transition with calls first claims the order with a compare-and-set on
+Order.version, which commits at once, so a concurrent transition from the same copy fails
+instead of calling out a second time. The effects then run in a short transaction that
+ends with a second compare-and-set writing the status. The order row is only locked from
+that UPDATE to the commit. Whoever moves the order first wins, a transition started from
+an older copy fails with CONFLICT_ERROR and changes nothing. If the order was changed
+between the calls and the second compare-and-set, the hooks the calls registered with
+on_conflict() undo them, e.g. cancel the Payme receipt that was just paid.
+"""
+import functools
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from order.models import Order
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_ERROR = "Заказ был изменён, обновите данные"
+
+
+class Transition:
+    def __init__(self, sources, guards=(), calls=(), effects=(), after_commit=()):
+        self.sources = frozenset(sources)
+        self.guards = guards
+        self.calls = calls
+        self.effects = effects
+        self.after_commit = after_commit
+
+
+class Conflict(Exception):
+    pass
+
+
+class TransitionContext:
+    """What guards, calls, effects and hooks of one transition share."""
+
+    def __init__(self, order, source, target, preparing_time=None):
+        self.order = order
+        self.source = source
+        self.target = target
+        self.preparing_time = preparing_time
+        # set by a call that failed, e.g. a declined payment. The effects are skipped and
+        # the order is moved to "target" instead, which the call may change
+        self.error = None
+        self.after_commit = []
+        # undo what a successful call did outside the database, run if the status can't
+        # be written afterwards because the order changed meanwhile
+        self.after_conflict = []
+
+    def on_commit(self, hook):
+        self.after_commit.append(hook)
+
+    def on_conflict(self, hook):
+        self.after_conflict.append(hook)
+
+
+def claim_order(order, **changes):
+    """
+    Bumps the version of the order if nobody changed it since it was read, applying
+    "changes" in the same UPDATE. Returns False if the order is stale.
+    """
+    updated = Order.objects.filter(pk=order.pk, version=order.version).update(
+        version=F("version") + 1, **changes
+    )
+    if not updated:
+        return False
+    order.version += 1
+    for field, value in changes.items():
+        setattr(order, field, value)
+    return True
+
+
+def run_hook(hook, context):
+    try:
+        hook(context)
+    except Exception:
+        # the transition is decided, one failed notification must not hide it
+        logger.exception(f"{hook.__name__} failed for Order {context.order.id} -> {context.target}")
+
+
+def run_transition(transitions, order, status, preparing_time=None, force=False, save=None):
+    """
+    Moves "order" to "status", "force" skips the check of the source status.
+    "save" is called with the context after the effects to persist the order.
+    Returns (success, error).
+    """
+    if order.status == status:
+        logger.info(f"Order {order.id} already has status {status}")
+        return False, f"Заказ уже в статусе {status}"
+
+    rule = transitions.get(status)
+    if rule is None:
+        return False, f"Неизвестный статус {status}"
+    if not force and order.status not in rule.sources:
+        return False, f"Нельзя перевести заказ из статуса {order.status} в {status}"
+
+    context = TransitionContext(order, order.status, status, preparing_time)
+    for guard in rule.guards:
+        error = guard(context)
+        if error:
+            return False, error
+
+    if rule.calls:
+        if not claim_order(order):
+            logger.warning(f"Order {order.id} changed concurrently, {status} not applied")
+            return False, CONFLICT_ERROR
+        for call in rule.calls:
+            call(context)
+            if context.error is not None:
+                break
+
+    effects, hooks = (rule.effects, rule.after_commit) if context.error is None else ((), ())
+    try:
+        with transaction.atomic():
+            order.status = context.target
+            for effect in effects:
+                effect(context)
+            if not claim_order(order, status=context.target):
+                raise Conflict
+            logger.info(f"Order {order.id} status set to {context.target}")
+            if save is not None:
+                save(context)
+
+            for hook in (*hooks, *context.after_commit):
+                transaction.on_commit(functools.partial(run_hook, hook, context))
+    except Conflict:
+        order.status = context.source
+        if rule.calls and context.error is None:
+            logger.error(f"Order {order.id} changed after the calls of {status} succeeded")
+            for hook in context.after_conflict:
+                run_hook(hook, context)
+        else:
+            logger.warning(f"Order {order.id} changed concurrently, {status} not applied")
+        return False, CONFLICT_ERROR
+
+    if context.error is not None:
+        logger.error(f"Error occurred while updating order {order.id}: {context.error}")
+        return False, context.error
+    return True, None
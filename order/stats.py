@@ -0,0 +1,221 @@
+"""
+Incremental maintenance of the OrderStatsHourly rollup.
+
+Every order keeps in "stats_contribution" the rollup entries it currently adds. After the
+order or one of its item groups is saved, the contribution is rebuilt and the difference
+with the stored one is inserted as new rollup rows. Rows are never updated in place, so
+transitions of orders of the same restaurant and hour never wait on one another;
+compact_order_stats() (celery beat) merges the rows repeating a key.
+
+The stored contribution is replaced with a compare-and-set instead of locking the order,
+a refresh that lost the race reads the order again.
+"""
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import COMPLETED_STATUSES, STATS_FIELDS, Order, OrderItemGroup, OrderStatsHourly
+
+COUNTERS = ("orders_count", "completed_count", "products_sum", "total_sum", "commission")
+ROLLUP_BATCH_SIZE = 2000
+ROLLUP_KEY_FIELDS = ("hour", "institution_id", "institution_branch_id", "status", "payment_method", "is_paid")
+REFRESH_ATTEMPTS = 3
+GROUP_FIELDS = ("institution_id", "institution_branch_id", "products_sum", "total_sum", "commission")
+
+logger = logging.getLogger(__name__)
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def get_contribution(order, groups):
+    """
+    Returns [[key, counters], ...] the order adds to the rollup. Every item group counts the
+    order for its institution and branch with the group's own sums and commission, an order
+    without item groups is not counted.
+    """
+    entries = {}
+    for group in groups:
+        key = (
+            group["institution_id"],
+            group["institution_branch_id"],
+            order["status"],
+            order["payment_method"],
+            order["is_paid"],
+        )
+        counters = entries.setdefault(
+            key, {"orders_count": 1, "products_sum": 0, "total_sum": 0, "commission": 0}
+        )
+        for name in ("products_sum", "total_sum", "commission"):
+            counters[name] += group[name]
+
+    created = truncate_hour(order["created_at"]).isoformat()
+    completed = order["status"] in COMPLETED_STATUSES and order["completed_at"] is not None
+    contribution = []
+    for key, counters in entries.items():
+        contribution.append([[created, *key], counters])
+        if completed:
+            contribution.append(
+                [[truncate_hour(order["completed_at"]).isoformat(), *key], {"completed_count": 1}]
+            )
+    return contribution
+
+
+def get_rollup_deltas(old, new):
+    deltas = {}
+    for sign, contribution in ((-1, old), (1, new)):
+        for key, counters in contribution:
+            delta = deltas.setdefault(tuple(key), dict.fromkeys(COUNTERS, 0))
+            for name, value in counters.items():
+                delta[name] += sign * value
+    return {key: delta for key, delta in deltas.items() if any(delta.values())}
+
+
+def get_rollup_lookup(key):
+    hour, institution_id, branch_id, status, payment_method, is_paid = key
+    return dict(
+        hour=datetime.fromisoformat(hour),
+        institution_id=institution_id,
+        institution_branch_id=branch_id,
+        status=status,
+        payment_method=payment_method,
+        is_paid=is_paid,
+    )
+
+
+def apply_contribution_change(old, new):
+    OrderStatsHourly.objects.bulk_create(
+        [
+            OrderStatsHourly(**get_rollup_lookup(key), **delta)
+            for key, delta in get_rollup_deltas(old, new).items()
+        ]
+    )
+
+
+def replace_contribution(order_id, old, new):
+    """Stores "new" and inserts the rollup difference if the order still contributes "old"."""
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order_id, stats_contribution=old).update(
+            stats_contribution=new
+        )
+        if updated:
+            apply_contribution_change(old, new)
+    return bool(updated)
+
+
+def refresh_order_stats(order_id):
+    for _ in range(REFRESH_ATTEMPTS):
+        order = (
+            Order.objects.filter(pk=order_id)
+            .values(*STATS_FIELDS, "created_at", "stats_contribution")
+            .first()
+        )
+        if order is None:
+            return
+        groups = OrderItemGroup.objects.filter(order_id=order_id).order_by("id").values(*GROUP_FIELDS)
+        contribution = get_contribution(order, groups)
+        if contribution == order["stats_contribution"]:
+            return
+        if replace_contribution(order_id, order["stats_contribution"], contribution):
+            return
+    logger.warning(f"Stats of order {order_id} kept changing, left to the next rebuild")
+
+
+def discard_order_stats(order_id):
+    for _ in range(REFRESH_ATTEMPTS):
+        contribution = (
+            Order.objects.filter(pk=order_id).values_list("stats_contribution", flat=True).first()
+        )
+        if not contribution or replace_contribution(order_id, contribution, []):
+            return
+
+
+def compact_order_stats(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Merges rollup rows repeating a key into one row and drops keys that add up to nothing.
+    Only the rows read are deleted, so deltas inserted meanwhile stay as rows of their own.
+    Returns the number of rows removed.
+    """
+    repeated = (
+        OrderStatsHourly.objects.values(*ROLLUP_KEY_FIELDS)
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    hours = sorted({row["hour"] for row in repeated})
+    removed = 0
+    for start in range(0, len(hours), batch_size):
+        with transaction.atomic():
+            groups = {}
+            # locked, so that a concurrent compaction skips the rows merged here
+            rows = (
+                OrderStatsHourly.objects.select_for_update()
+                .filter(hour__in=hours[start:start + batch_size])
+                .values("id", *ROLLUP_KEY_FIELDS, *COUNTERS)
+            )
+            for row in rows:
+                key = tuple(row[field] for field in ROLLUP_KEY_FIELDS)
+                groups.setdefault(key, []).append(row)
+
+            merged = []
+            deleted_ids = []
+            for key, key_rows in groups.items():
+                if len(key_rows) < 2:
+                    continue
+                deleted_ids.extend(row["id"] for row in key_rows)
+                total = {name: sum(row[name] for row in key_rows) for name in COUNTERS}
+                if any(total.values()):
+                    merged.append(OrderStatsHourly(**dict(zip(ROLLUP_KEY_FIELDS, key)), **total))
+            OrderStatsHourly.objects.filter(id__in=deleted_ids).delete()
+            OrderStatsHourly.objects.bulk_create(merged, batch_size=batch_size)
+            removed += len(deleted_ids) - len(merged)
+    return removed
+
+
+def rebuild_order_stats(batch_size=ROLLUP_BATCH_SIZE, progress=None):
+    """
+    Recomputes the whole rollup from orders in id batches. Runs in one transaction so
+    dashboards keep reading the old rows until it commits.
+    """
+    totals = {}
+    with transaction.atomic():
+        OrderStatsHourly.objects.all().delete()
+        last_id = 0
+        while True:
+            orders = list(
+                Order.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values("id", *STATS_FIELDS, "created_at")[:batch_size]
+            )
+            if not orders:
+                break
+            last_id = orders[-1]["id"]
+
+            groups = {}
+            for group in (
+                OrderItemGroup.objects.filter(order_id__in=[order["id"] for order in orders])
+                .order_by("order_id", "id")
+                .values("order_id", *GROUP_FIELDS)
+            ):
+                groups.setdefault(group["order_id"], []).append(group)
+
+            updated = []
+            for order in orders:
+                contribution = get_contribution(order, groups.get(order["id"], []))
+                for key, delta in get_rollup_deltas([], contribution).items():
+                    total = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                    for name, value in delta.items():
+                        total[name] += value
+                updated.append(Order(id=order["id"], stats_contribution=contribution))
+            Order.objects.bulk_update(updated, ["stats_contribution"])
+            if progress is not None:
+                progress(last_id)
+
+        OrderStatsHourly.objects.bulk_create(
+            [OrderStatsHourly(**get_rollup_lookup(key), **total) for key, total in totals.items()],
+            batch_size=batch_size,
+        )
+    return len(totals)
@@ -8,6 +8,8 @@ from django.utils import timezone
 from django.db import transaction
 
 
+from common.events import publish_batch
+from common.metrics import observe_order_status
 from ofd.services import OFDReceiptService
 
 from courier.models import Courier, Transaction
@@ -17,31 +19,45 @@ from order.models import Order
 from order.promo_codes.models import PromoCodeUsage
 from order.services import payme
 from order.serializers import OrderAssignmentValidator
+from order.state_machine import Transition, claim_order, run_transition
 from order.utils import notify_courier, notify_institution, notify_operator
 from order.push_notifications.services import notify_ready_order, send_notification, send_notification_to_couriers, send_notification_order_cancel_institution
 
+from payment.ledger import add_entry
 from payment.models import Payment
 from payme.utils import cancel_payment
 
 logger = logging.getLogger(__name__)
 
+ACCEPTED_BODY = "Ваш заказ принят и скоро будет готов!"
+ASSIGNED_TO_OTHER_COURIER = {
+    'uz': "Kechirasiz, bu buyurtma allaqachon boshqa kuryerga topshirilgan.",
+    'ru': "Извините, этот заказ уже передан другому курьеру.",
+    'en': "Sorry, this order has already been assigned to another courier.",
+}
+ACTIVE_STATUSES = ("pre-order", "created", "pending", "accepted", "cooking", "ready", "shipped", "incident")
+
+
+@publish_batch()
 def assign_order_to_courier(order_id, courier):
+    try:
+        order = Order.objects.select_related("timeline").get(id=order_id)
+    except Order.DoesNotExist:
+        logger.warning(f"Order {order_id} not found for courier {courier.id}")
+        return {'status': False, 'message': {'uz': "Buyurtma topilmadi.", 'ru': "Заказ не найден.", 'en': "Order not found."}}
+
+    validator = OrderAssignmentValidator(order, courier)
+    error = validator.validate()
+    if error:
+        logger.error(f"Order {order_id}, courier {courier.id} | {error}")
+        return error
+
     with transaction.atomic():
-        try:
-            order = Order.objects.select_for_update().get(id=order_id)
-        except Order.DoesNotExist:
-            logger.warning(f"Order {order_id} not found for courier {courier.id}")
-            return {'status': False, 'message': {'uz': "Buyurtma topilmadi.", 'ru': "Заказ не найден.", 'en': "Order not found."}}
-
-        validator = OrderAssignmentValidator(order, courier)
-        error = validator.validate()
-        if error:
-            logger.error(f"Order {order_id}, courier {courier.id} | {error}")
-            
-            return error
-       
-         # Assign order
-        order.courier = courier
+        # another courier or a status change got there first
+        if not claim_order(order, courier=courier):
+            logger.warning(f"Order {order_id} changed while courier {courier.id} was taking it")
+            return {'status': False, 'message': ASSIGNED_TO_OTHER_COURIER}
+
         order.timeline.courier_assign_at = timezone.now()
         order.timeline.save()
         order.save()
@@ -50,190 +66,293 @@ def assign_order_to_courier(order_id, courier):
         courier.status = Courier.Status.DELIVERING
         courier.save()
 
-        send_message(order, "courier")
+        transaction.on_commit(lambda: send_message(order, "courier"))
 
         notify_courier(order)
         notify_operator(order)
         notify_institution(order)
+        notify_ready_order(order)
 
-        logger.info(f"Order {order.id} successfully assigned to courier {courier.id}")
+    logger.info(f"Order {order.id} successfully assigned to courier {courier.id}")
+    return {'status': True, 'message': {}, 'order': order}
 
-        notify_ready_order(order)
 
-        return {'status': True, 'message': {}, 'order': order}
+# guards, return an error message to refuse the transition
 
+def check_courier_assigned(context):
+    if context.source != "created" and context.order.courier is None:
+        return "Курьер не назначен"
 
 
-def update_order_status(order: Order, status, preparing_time=None):
-    from order.tasks import delayed_send_notification
+def check_not_in_process(context):
+    if context.order.is_process:
+        return "Заказ в процессе обработки стороне заведения"
+
+
+# calls, made outside the transaction under the claimed version
+
+def charge_payme(context):
+    order = context.order
+    if order.payment_method != "payme" or order.is_paid:
+        return
+    # a concurrent accept of the same copy fails to claim the order and can't charge twice
+    result = payme(order)
+    print(f"Payme result for Order {order.id}: {result}")
+    if result and result['status'] == 'success':
+        context.on_commit(announce_paid)
+        context.on_conflict(refund_payme)
+    else:
+        context.error = result.get('message', 'Unknown error') if result else 'Unknown error'
+        context.target = "created"
+        context.on_commit(announce_payment_error)
 
-    error = None
-    if order.status != "created" and order.courier is None:
-        return False, "Курьер не назначен"
-    
-    with transaction.atomic():
-        if order.status == status:
-            logger.info(f"Order {order.id} already has status {status}")
-            return False
-
-        # 1. Set status
-        order.status = status
-        group = order.item_groups.first()
-        logger.info(f"Order {order.id} status set to {status}")
-
-        # 2. Handle preparation time
-        if preparing_time is not None:
-            logger.info(f"Setting preparing time for Order {order.id}: {preparing_time}")
-            send_message(order, "accepted", int(preparing_time))
-            order.preparing_time = preparing_time
-
-        # 3. Handle status-specific logic
-        if status == "accepted":
-            logger.info(f"Handling 'accepted' for Order {order.id}")
-            if order.is_process:
-                return False, "Заказ в процессе обработки стороне заведения"
-            
-            title = f"Ваш заказ №{order.id} принят заведением"
-            body = "Ваш заказ принят и скоро будет готов!"
-            
-            if order.payment_method == "cash":
-                if order.uuid is not None:
-                    title = f"Ваш заказ №{order.id} был принят, ждём подтверждения заведения"
-                    body = "Ожидаем подтверждения заказа от ресторана. Это может занять до 10-15 минут."
-            
-                send_notification(order.id, title, body)
-                
-                if not group.institution.delivery_by_own:
-                    send_notification_to_couriers(order_id=order.id)
-                    notify_ready_order(order)
-
-            elif order.payment_method == "payme":
-                if order.is_paid == False:
-                    result = payme(order)
-                    print(f"Payme result for Order {order.id}: {result}")
-                    if result and result['status'] == 'success':
-
-                        if not group.institution.delivery_by_own:
-                            send_notification_to_couriers(order_id=order.id)
-                            notify_ready_order(order)
-
-                        send_notification(order.id, title, body)
-                        delayed_send_notification.delay(order.id, "Оплата прошла!", f"Спасибо! Платёж успешно завершён для заказа №{order.id}.")
-                    else:
-                        error = result.get('message', 'Unknown error') if result else 'Unknown error'
-                        send_notification(order.id, f"Ошибка оплаты для заказа №{order.id}", error)
-                        order.status = "created"
-                        
-                        send_message(order, "payme_error", 0, error)
-
-                        logger.warning(f"Payme error for Order {order.id}: {error}")
-
-        elif status == "incident":
-            logger.info(f"Handling 'incident' for Order {order.id}")
-            notify_ready_order(order)
-            send_message(order, "incident")
-            
-        
-        elif status == "rejected":
-            logger.info(f"Handling 'rejected' for Order {order.id}")
-            order.timeline.rejected_at = timezone.now()
-            notify_ready_order(order)
-            send_notification(order.id, f"Ваш заказ №{order.id} был отклонён", "Заведение не смогло принять заказ.")
-            send_message(order, "cancel")
-            
-            promo = PromoCodeUsage.objects.filter(user_id=order.customer, order=order)
-            if promo.exists():
-                promo.delete()    
-            time.sleep(2)
-            send_notification_order_cancel_institution(order.id)
-            order.is_paid = False
-            
-            if order.payment_method == 'payme':
-                receipt_id = order.receipt_id
-                cancel_payment(receipt_id)
-                send_notification(order.id, "Платёж отменён", f"Ваш платёж был отменён.")
-
-        elif status == "closed":
-            logger.info(f"Handling 'closed' for Order {order.id}")
-            order.timeline.delivered_at = timezone.now()
-            branch = order.item_groups.first()
-            max_time = branch.institution.max_delivery_time
-            
-            send_notification(order.id, f"Ваш заказ №{order.id} был доставлен", "Ваш заказ был доставлен! Оставьте отзыв пожалуйста.")
 
-            if order.timeline.courier_take_it_at:
-                delta = order.timeline.delivered_at - order.timeline.courier_take_it_at
-                minutes = int(delta.total_seconds() / 60)
-                order.timeline.courier_lates = abs(max_time - minutes) if max_time < minutes else 0
-            
-            if not order.is_paid:
-                payment = Payment.objects.create(
-                    order=order,
-                    payment_type="INCOME",
-                    payment_method=order.payment_method,
-                    amount=order.total_sum,
-                    receipt_required=settings.GNK_INTEGRATION_AVAILABLE,
-                )
-                if settings.GNK_INTEGRATION_AVAILABLE:
-                    try:
-                        OFDReceiptService(payment).create_sale_receipt()
-                    except Exception as e:
-                        logger.error(f"OFDReceiptService failed for Order {order.id}: {e}")
-                        pass
-
-            group = order.item_groups.first()
-            institution = group.institution
-            institution.balance -= group.commission  # %
-            group.save()
-            logger.info(f"Institution Balance updated {institution.balance} for Order {order.id}")
-
-            courier = Courier.objects.filter(order=order).first()
-            if order.payment_method == "payme":
-                institution.balance += group.products_sum
-                Transaction.create_with_balance(courier=courier, order=order, amount=order.delivering_sum, name='delivering', type='in')
-                logger.info(f"Courier balance updated {courier.balance} for Order {order.id} delivering in")
+def refund_payme(context):
+    # the order was moved by someone else after the charge, it is not accepted
+    order = context.order
+    cancel_payment(order.receipt_id)
+    order.is_paid = False
+    order.save(update_fields=["is_paid"])
+    send_notification(order.id, "Платёж отменён", f"Ваш платёж был отменён.")
 
-                
-            if order.payment_method == 'cash':
-                if order.uuid is not None or branch.institution.is_holding:
-                    Transaction.create_with_balance(courier=courier, order=order, amount=order.products_sum, name='order_amount', type='out')
-                    logger.info(f"Courier balance updated {courier.balance} for Order {order.id} order_amount out")
-                    
-                if order.discount_sum > 0:
-                    Transaction.create_with_balance(courier=courier, order=order, amount=order.discount_sum, name='promo_code', type='in')
-
-            if courier.order_set.filter(status__in=["shipped", "accepted"]).count() == 0:
-                courier.status = Courier.Status.FREE
-            institution.save()
-
-        elif status == "shipped":
-            logger.info(f"Handling 'shipped' for Order {order.id}")
-            order.timeline.shipped_at = timezone.now()
-            order.timeline.preparing_completed_at = timezone.now()
-            lates = order.timeline.preparing_completed_at - order.timeline.preparing_start_at
-            order.timeline.preparing_lates = lates.total_seconds() / 60 if order.preparing_time else 0
-            
-        elif status == "ready":
-            logger.info(f"Handling 'ready' for Order {order.id}")
-            order.timeline.preparing_completed_at = timezone.now()
 
-        # 5. Save everything
-        order.save()
-        order.timeline.save()
-        
-        logger.info(f"Order {order.id} and timeline saved")
+# effects, change the order inside the transaction, before the status is written
+
+def set_preparing_time(context):
+    if context.preparing_time is not None:
+        logger.info(f"Setting preparing time for Order {context.order.id}: {context.preparing_time}")
+        context.order.preparing_time = context.preparing_time
+        context.on_commit(announce_preparing_time)
 
-        # 6. Notify related parties
-        if order.status != "created":
-            logger.info(f"Notifications sent for Order {order.id}")
-            notify_courier(order)
-            notify_institution(order)
-            notify_operator(order)
-        if error is not None:
-            logger.error(f"Error occurred while updating order {order.id}: {error}")
-            return False, error
-        return True, None
 
+def record_rejection(context):
+    order = context.order
+    order.timeline.rejected_at = timezone.now()
+    PromoCodeUsage.objects.filter(user_id=order.customer, order=order).delete()
+    order.is_paid = False
+
+
+def record_ready(context):
+    context.order.timeline.preparing_completed_at = timezone.now()
+
+
+def record_shipment(context):
+    order = context.order
+    order.timeline.shipped_at = timezone.now()
+    order.timeline.preparing_completed_at = timezone.now()
+    if order.preparing_time and order.timeline.preparing_start_at:
+        lates = order.timeline.preparing_completed_at - order.timeline.preparing_start_at
+        order.timeline.preparing_lates = lates.total_seconds() / 60
+    else:
+        order.timeline.preparing_lates = 0
+
+
+def record_delivery(context):
+    order = context.order
+    order.timeline.delivered_at = timezone.now()
+    max_time = order.item_groups.first().institution.max_delivery_time
+    if order.timeline.courier_take_it_at:
+        delta = order.timeline.delivered_at - order.timeline.courier_take_it_at
+        minutes = int(delta.total_seconds() / 60)
+        order.timeline.courier_lates = abs(max_time - minutes) if max_time < minutes else 0
+
+
+def create_income_payment(context):
+    order = context.order
+    if order.is_paid:
+        return
+    context.payment = Payment.objects.create(
+        order=order,
+        payment_type="INCOME",
+        payment_method=order.payment_method,
+        amount=order.total_sum,
+        receipt_required=settings.GNK_INTEGRATION_AVAILABLE,
+    )
+    if settings.GNK_INTEGRATION_AVAILABLE:
+        context.on_commit(create_sale_receipt)
+
+
+def settle_balances(context):
+    # ledger inserts only, concurrent closes of one institution or courier don't wait on each other
+    order = context.order
+    group = order.item_groups.first()
+    institution = group.institution
+    add_entry(-group.commission, "commission", institution=institution, order=order)  # %
+    logger.info(f"Institution commission {group.commission} recorded for Order {order.id}")
+
+    courier = order.courier
+    if order.payment_method == "payme":
+        add_entry(group.products_sum, "products", institution=institution, order=order)
+        Transaction.create_with_balance(courier=courier, order=order, amount=order.delivering_sum, name='delivering', type='in')
+        logger.info(f"Courier balance updated for Order {order.id} delivering in")
+
+    if order.payment_method == 'cash':
+        if order.uuid is not None or institution.is_holding:
+            Transaction.create_with_balance(courier=courier, order=order, amount=order.products_sum, name='order_amount', type='out')
+            logger.info(f"Courier balance updated for Order {order.id} order_amount out")
+
+        if order.discount_sum > 0:
+            Transaction.create_with_balance(courier=courier, order=order, amount=order.discount_sum, name='promo_code', type='in')
+
+    if not courier.order_set.filter(status__in=["shipped", "accepted"]).exclude(pk=order.pk).exists():
+        courier.status = Courier.Status.FREE
+        courier.save(update_fields=["status"])
+
+
+def save_order(context):
+    order = context.order
+    order.save()
+    order.timeline.save()
+    transaction.on_commit(lambda: observe_order_status(order))
+    logger.info(f"Order {order.id} and timeline saved")
+
+    if order.status != "created":
+        notify_courier(order)
+        notify_institution(order)
+        notify_operator(order)
+
+
+# hooks, run once the transition committed
+
+def announce_preparing_time(context):
+    send_message(context.order, "accepted", int(context.preparing_time))
+
+
+def offer_to_couriers(context):
+    order = context.order
+    if not order.item_groups.first().institution.delivery_by_own:
+        send_notification_to_couriers(order_id=order.id)
+        notify_ready_order(order)
+
+
+def announce_accepted(context):
+    order = context.order
+    if order.payment_method != "cash":
+        return
+    title = f"Ваш заказ №{order.id} принят заведением"
+    body = ACCEPTED_BODY
+    if order.uuid is not None:
+        title = f"Ваш заказ №{order.id} был принят, ждём подтверждения заведения"
+        body = "Ожидаем подтверждения заказа от ресторана. Это может занять до 10-15 минут."
+    send_notification(order.id, title, body)
+    offer_to_couriers(context)
+
+
+def announce_paid(context):
+    from order.tasks import delayed_send_notification
+
+    order = context.order
+    offer_to_couriers(context)
+    send_notification(order.id, f"Ваш заказ №{order.id} принят заведением", ACCEPTED_BODY)
+    delayed_send_notification.delay(order.id, "Оплата прошла!", f"Спасибо! Платёж успешно завершён для заказа №{order.id}.")
+
+
+def announce_payment_error(context):
+    order = context.order
+    send_notification(order.id, f"Ошибка оплаты для заказа №{order.id}", context.error)
+    send_message(order, "payme_error", 0, context.error)
+    logger.warning(f"Payme error for Order {order.id}: {context.error}")
+
+
+def announce_incident(context):
+    notify_ready_order(context.order)
+    send_message(context.order, "incident")
+
+
+def announce_rejection(context):
+    order = context.order
+    notify_ready_order(order)
+    send_notification(order.id, f"Ваш заказ №{order.id} был отклонён", "Заведение не смогло принять заказ.")
+    send_message(order, "cancel")
+    time.sleep(2)
+    send_notification_order_cancel_institution(order.id)
+
+    if order.payment_method == 'payme':
+        cancel_payment(order.receipt_id)
+        send_notification(order.id, "Платёж отменён", f"Ваш платёж был отменён.")
+
+
+def announce_delivery(context):
+    order = context.order
+    send_notification(order.id, f"Ваш заказ №{order.id} был доставлен", "Ваш заказ был доставлен! Оставьте отзыв пожалуйста.")
+
+
+def create_sale_receipt(context):
+    try:
+        OFDReceiptService(context.payment).create_sale_receipt()
+    except Exception as e:
+        logger.error(f"OFDReceiptService failed for Order {context.order.id}: {e}")
+
+
+TRANSITIONS = {
+    # only reached with force, e.g. an operator putting an order back
+    "pre-order": Transition(
+        sources=(),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time,),
+    ),
+    "created": Transition(
+        sources=(),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time,),
+    ),
+    "pending": Transition(
+        sources=(),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time,),
+    ),
+    "accepted": Transition(
+        sources=("pre-order", "created", "pending", "incident"),
+        guards=(check_courier_assigned, check_not_in_process),
+        calls=(charge_payme,),
+        effects=(set_preparing_time,),
+        after_commit=(announce_accepted,),
+    ),
+    "cooking": Transition(
+        sources=("accepted", "incident"),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time,),
+    ),
+    "ready": Transition(
+        sources=("accepted", "cooking", "incident"),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time, record_ready),
+    ),
+    "shipped": Transition(
+        sources=("accepted", "cooking", "ready", "incident"),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time, record_shipment),
+    ),
+    "closed": Transition(
+        sources=("accepted", "cooking", "ready", "shipped", "incident"),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time, record_delivery, create_income_payment, settle_balances),
+        after_commit=(announce_delivery,),
+    ),
+    "incident": Transition(
+        sources=("created", "accepted", "cooking", "ready", "shipped"),
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time,),
+        after_commit=(announce_incident,),
+    ),
+    "rejected": Transition(
+        sources=ACTIVE_STATUSES,
+        guards=(check_courier_assigned,),
+        effects=(set_preparing_time, record_rejection),
+        after_commit=(announce_rejection,),
+    ),
+}
+
+
+@publish_batch()
+def update_order_status(order: Order, status, preparing_time=None, force=False):
+    """
+    Moves the order along TRANSITIONS, "force" (operators) allows any source status.
+    Returns (success, error).
+    """
+    return run_transition(
+        TRANSITIONS, order, status, preparing_time=preparing_time, force=force, save=save_order
+    )
 
 
 # def update_order_status(order: Order, status, preparing_time=None):
@@ -390,8 +509,9 @@ def cancel_order(order, ignore_constraints=False):
         if is_dated or has_courier:
             return False, "order is dated or has a courier"
 
-    if not update_order_status(order, "rejected"):
-        return False, "unknown error"
+    success, error = update_order_status(order, "rejected", force=ignore_constraints)
+    if not success:
+        return False, error or "unknown error"
    
     return True, "success"
 
@@ -1,13 +1,20 @@
-from celery import shared_task
+import logging
 import time
+from datetime import timedelta
+
+from celery import shared_task
 
 from order.models import Order
 from order.push_notifications.services import send_notification
-from order.status_controller import update_order_status
+from order.stats import compact_order_stats
 from rkeeper.services import rkeeperAPI
+from rkeeper.status import RESTAURANT_STATUSES, apply_restaurant_status
 from django.utils import timezone
 from django.db.models import Q
 
+logger = logging.getLogger(__name__)
+
+
 @shared_task
 def delayed_notification_task(order_id):
     time.sleep(60)
@@ -24,37 +31,38 @@ def delayed_send_notification(order_id, title, body):
     time.sleep(3)
     send_notification(order_id, title, body)
     
+@shared_task
+def compact_order_stats_task():
+    return compact_order_stats()
+
+
 @shared_task
 def bulk_check_order_statuses():
-    orders = Order.objects.filter(status="accepted", uuid__isnull=False).filter(
-        Q(restaurant_status__isnull=True) | Q(restaurant_status__in=['NEW', 'COOKING', 'ACCEPTED_BY_RESTAURANT'])
+    """
+    Reconciles restaurant statuses of orders whose webhook callbacks were lost.
+    Orders changed recently are skipped, their callbacks are most likely on the way.
+    """
+    orders = (
+        Order.objects.filter(status="accepted", uuid__isnull=False)
+        .filter(
+            Q(restaurant_status__isnull=True)
+            | Q(restaurant_status__in=['NEW', 'COOKING', 'ACCEPTED_BY_RESTAURANT'])
+        )
+        .filter(updated_at__lt=timezone.now() - timedelta(minutes=2))
+        .select_related("timeline")
     )
 
     for order in orders:
-        group = order.item_groups.first()
+        group = order.item_groups.select_related("institution").first()
         institution = group.institution
-        rkeeper = rkeeperAPI(client_id=institution.client_id, client_secret=institution.client_secret)
+        rkeeper = rkeeperAPI(client_id=institution.client_id, client_secret=institution.client_secret, endpoint_url=institution.endpoint_url)
         response = rkeeper.get_order_status(order.uuid)
-        if response and isinstance(response, dict):
-            status = response.get('status', None)
-
-        if status in ['NEW', 'COOKING', 'ACCEPTED_BY_RESTAURANT', 'READY', 'CANCELLED']:
-            if order.restaurant_status != status:
-                try:
-                    order.restaurant_status = status
-                    order.save(update_fields=["restaurant_status"])
-                    print(f"updated {order.restaurant_status}")
-                except Exception as e:
-                    print("Error on change statys", status, e)
-
-                if status == 'ACCEPTED_BY_RESTAURANT':
-                    order.timeline.preparing_start_at = timezone.now()
-                    order.timeline.save()
-
-                    send_notification(order.id, f"Ваш заказ №{order.id} принят заведением", "Ваш заказ принят заведением и скоро будет готов!")
-
-                if status == 'READY':
-                    update_order_status(order, "ready")
+        if not response or not isinstance(response, dict):
+            continue
 
-                if status == 'CANCELLED':
-                    update_order_status(order, "rejected")
\ No newline at end of file
+        status = response.get('status', None)
+        if status in RESTAURANT_STATUSES and order.restaurant_status != status:
+            try:
+                apply_restaurant_status(order, status)
+            except Exception as e:
+                logger.error(f"Error on change status {status} for Order {order.id}: {e}")
@@ -1,8 +1,13 @@
+from courier.models import Courier
 from institution.models import Institution
-from order.models import Order, OrderStatusTimeline
+from order.models import Order, OrderItemGroup, OrderStatsHourly, OrderStatusTimeline
+from order.state_machine import CONFLICT_ERROR, claim_order
+from order.stats import compact_order_stats, rebuild_order_stats
 from order.status_controller import update_order_status
+from user.models import User
 import pytest
 from unittest import mock
+from django.db.models import F, Sum
 from django.utils import timezone
 
 
@@ -33,10 +38,16 @@ def order(db, mocker):
     return order
 
 
+@pytest.fixture
+def courier(db):
+    user = User.objects.create_user("+998901234570", "password")
+    return Courier.objects.create(user=user, passport_series="AA1234567", transport="car")
+
+
 def test_update_order_status_to_accepted_cash(order):
-    result = update_order_status(order, 'accepted', preparing_time=15)
+    success, error = update_order_status(order, 'accepted', preparing_time=15)
 
-    assert result is True
+    assert success is True
     assert order.status == 'accepted'
     assert order.preparing_time == 15
     assert order.timeline is not None
@@ -46,11 +57,11 @@ def test_update_order_status_to_accepted_payme_success(order, mocker):
     order.payment_method = 'payme'
     order.save()
 
-    mocker.patch('delivery.payments.payme', return_value={'status': 'success'})
+    mocker.patch('order.status_controller.payme', return_value={'status': 'success'})
 
-    result = update_order_status(order, 'accepted')
+    success, error = update_order_status(order, 'accepted')
 
-    assert result is True
+    assert success is True
     assert order.status == 'accepted'
 
 
@@ -58,57 +69,109 @@ def test_update_order_status_to_accepted_payme_error(order, mocker):
     order.payment_method = 'payme'
     order.save()
 
-    mocker.patch('delivery.payments.payme', return_value={
+    mocker.patch('order.status_controller.payme', return_value={
         'status': 'error', 'message': 'Invalid card'
     })
 
-    result = update_order_status(order, 'accepted')
+    success, error = update_order_status(order, 'accepted')
 
-    assert result is True
-    assert order.status == 'rejected'
+    assert success is False
+    assert error == 'Invalid card'
+    assert order.status == 'created'
 
 
 def test_update_order_status_same_status(order):
     order.status = 'accepted'
-    order.save()
+    order.save(update_fields=['status'])
 
-    result = update_order_status(order, 'accepted')
+    success, error = update_order_status(order, 'accepted')
 
-    assert result is False
+    assert success is False
+    assert error is not None
 
 
 def test_update_order_status_to_rejected(order):
-    result = update_order_status(order, 'rejected')
+    success, error = update_order_status(order, 'rejected')
 
-    assert result is True
+    assert success is True
     assert order.status == 'rejected'
     assert order.timeline.rejected_at is not None
 
 
-def test_update_order_status_to_ready(order):
-    result = update_order_status(order, 'ready')
+def test_update_order_status_to_ready(order, courier):
+    order.status = 'cooking'
+    order.courier = courier
+    order.save(update_fields=['status', 'courier'])
 
-    assert result is True
+    success, error = update_order_status(order, 'ready')
+
+    assert success is True
     assert order.status == 'ready'
     assert order.timeline.ready_at is not None
 
 
-def test_update_order_status_to_shipped(order):
-    result = update_order_status(order, 'shipped')
+def test_update_order_status_to_shipped(order, courier):
+    order.status = 'ready'
+    order.courier = courier
+    order.save(update_fields=['status', 'courier'])
+
+    success, error = update_order_status(order, 'shipped')
 
-    assert result is True
+    assert success is True
     assert order.status == 'shipped'
     assert order.timeline.shipped_at is not None
 
 
+def test_update_order_status_to_ready_from_created_is_refused(order):
+    success, error = update_order_status(order, 'ready')
+
+    assert success is False
+    order.refresh_from_db()
+    assert order.status == 'created'
+
+
+def test_forced_update_order_status_to_pending(order):
+    order.status = 'accepted'
+    order.save(update_fields=['status'])
+
+    success, error = update_order_status(order, 'pending', force=True)
+
+    assert success is True
+    order.refresh_from_db()
+    assert order.status == 'pending'
+
+
+def test_payme_charge_is_cancelled_if_order_changed_meanwhile(order, mocker):
+    order.payment_method = 'payme'
+    order.receipt_id = 'receipt'
+    order.save()
+
+    def charge(charged):
+        # an operator moves the order while Payme is being charged
+        Order.objects.filter(pk=charged.pk).update(version=F('version') + 1)
+        charged.is_paid = True
+        charged.save(update_fields=['is_paid'])
+        return {'status': 'success'}
+
+    mocker.patch('order.status_controller.payme', side_effect=charge)
+    cancel_payment = mocker.patch('order.status_controller.cancel_payment')
+    mocker.patch('order.status_controller.send_notification')
+
+    assert update_order_status(order, 'accepted') == (False, CONFLICT_ERROR)
+    cancel_payment.assert_called_once_with('receipt')
+    order.refresh_from_db()
+    assert order.status == 'created'
+    assert order.is_paid is False
+
+
 def test_update_order_status_to_closed(order):
     order.status = 'ready'
     order.is_paid = False
-    order.save()
+    order.save(update_fields=['status', 'is_paid'])
 
-    result = update_order_status(order, 'closed')
+    success, error = update_order_status(order, 'closed')
 
-    assert result is True
+    assert success is True
     assert order.status == 'closed'
     assert order.timeline.closed_at is not None
     assert order.is_paid is True
@@ -125,3 +188,113 @@ def test_update_order_status_notifications(order, mocker):
     notify_courier.assert_called_once_with(order)
     notify_operator.assert_called_once_with(order)
     notify_institution.assert_called_once_with(order)
+
+
+@pytest.fixture
+def stats_order(db):
+    institution = Institution.objects.create(
+        name="Stats Institution",
+        phone_number="+998901234568",
+        type="restaurant",
+    )
+    order = Order.objects.create(
+        status="created", payment_method="cash", products_sum=30000, total_sum=40000
+    )
+    OrderItemGroup.objects.create(
+        order=order, institution=institution, products_sum=30000, total_sum=40000, commission=3000
+    )
+    return order
+
+
+def get_rollup(**filters):
+    return OrderStatsHourly.objects.filter(**filters).aggregate(
+        orders=Sum("orders_count"),
+        completed=Sum("completed_count"),
+        products_sum=Sum("products_sum"),
+        commission=Sum("commission"),
+    )
+
+
+def test_order_stats_follow_status_transitions(stats_order):
+    assert get_rollup(status="created")["orders"] == 1
+
+    stats_order.status = "closed"
+    stats_order.save(update_fields=["status"])
+
+    assert get_rollup(status="created")["orders"] == 0
+    assert get_rollup(status="closed") == {
+        "orders": 1, "completed": 1, "products_sum": 30000, "commission": 3000
+    }
+    assert stats_order.completed_at is not None
+
+
+def test_order_stats_count_every_item_group(stats_order):
+    other = Institution.objects.create(
+        name="Second Stats Institution",
+        phone_number="+998901234569",
+        type="restaurant",
+    )
+    OrderItemGroup.objects.create(
+        order=stats_order, institution=other, products_sum=12000, total_sum=15000, commission=1200
+    )
+
+    assert get_rollup(institution=other) == {
+        "orders": 1, "completed": None, "products_sum": 12000, "commission": 1200
+    }
+    assert get_rollup(institution=stats_order.item_groups.first().institution)["products_sum"] == 30000
+
+
+def test_rebuild_order_stats_matches_incremental_rollup(stats_order):
+    stats_order.status = "rejected"
+    stats_order.save(update_fields=["status"])
+    incremental = get_rollup(status="rejected")
+
+    rebuild_order_stats()
+
+    assert get_rollup(status="rejected") == incremental
+    assert get_rollup()["orders"] == 1
+
+
+def test_compact_order_stats_merges_delta_rows(stats_order):
+    stats_order.status = "closed"
+    stats_order.save(update_fields=["status"])
+    before = get_rollup()
+    assert OrderStatsHourly.objects.count() > 2
+
+    compact_order_stats()
+
+    assert get_rollup() == before
+    assert not OrderStatsHourly.objects.filter(status="created").exists()
+    assert OrderStatsHourly.objects.filter(status="closed").count() == 1
+
+
+def test_transition_from_stale_copy_conflicts(stats_order):
+    stale = Order.objects.get(pk=stats_order.pk)
+    assert claim_order(stats_order)
+
+    assert update_order_status(stale, 'rejected') == (False, CONFLICT_ERROR)
+    stale.refresh_from_db()
+    assert stale.status == 'created'
+    assert stale.version == 1
+
+
+def test_transition_from_unlisted_status_is_refused(stats_order):
+    success, error = update_order_status(stats_order, 'closed')
+
+    assert success is False
+    stats_order.refresh_from_db()
+    assert stats_order.status == 'created'
+    assert stats_order.version == 0
+
+
+def test_plain_save_of_stale_copy_keeps_status_and_version(stats_order):
+    stale = Order.objects.get(pk=stats_order.pk)
+    assert claim_order(stats_order, status='accepted')
+
+    stale.note = 'stale'
+    stale.save()
+    stale.refresh_from_db()
+
+    assert stale.status == 'accepted'
+    assert stale.version == 1
+    assert stale.note == 'stale'
@@ -1,7 +1,6 @@
 import time
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 
+from common.events import publish, publish_partitioned
 from .notifiers import WebsocketOrderNotifier, TelegramOrderNotifier
 
 
@@ -16,10 +15,10 @@ def notify(order, notifier_classes=None):
     notify_operator(order)
 
 def notify_operator(order):
-    channel_layer = get_channel_layer()
-    for group in order.item_groups.all():
-        async_to_sync(channel_layer.group_send)(
+    for group in order.item_groups.select_related("institution", "institution_branch"):
+        publish_partitioned(
             "operator",
+            group.institution_branch,
             {
                 "type": "order_data",
                 "status": order.status,
@@ -37,7 +36,7 @@ def notify_operator(order):
                 "branch_name": group.institution_branch.name
             },
         )
-        async_to_sync(channel_layer.group_send)(
+        publish(
             f"client_{order.customer.id}",
             {
                 "type": "order",
@@ -47,9 +46,8 @@ def notify_operator(order):
         )
 
 def notify_institution(order):
-    channel_layer = get_channel_layer()
-    for group in order.item_groups.all():
-        async_to_sync(channel_layer.group_send)(
+    for group in order.item_groups.select_related("institution", "institution_branch"):
+        publish(
             f"institution_{group.institution.id}",
             {
                 "type": "order_data",
@@ -69,10 +67,10 @@ def notify_institution(order):
         )
 
 def notify_courier(order):
-    channel_layer = get_channel_layer()
-    for group in order.item_groups.all():
-        async_to_sync(channel_layer.group_send)(
-            f"courier",
+    for group in order.item_groups.select_related("institution", "institution_branch"):
+        publish_partitioned(
+            "courier",
+            group.institution_branch,
             {
                 "type": "order_data",
                 "status": order.status,
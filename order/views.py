@@ -1,17 +1,32 @@
-from django.db.models import Count, Exists, OuterRef
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.db.models.functions import Coalesce
 from order.feedback.models import DeliveryFeedback, InstitutionFeedback
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from .models import Order
-from .serializers import OrderSerializer
+from base.api_views import KeysetPagination
+from .models import Order, OrderItem, OrderItemGroup
+from .serializers import OrderListSerializer, OrderSerializer
 from .services import OrderService
 from .status_controller import cancel_order
 
+
+class OrderHistoryPagination(KeysetPagination):
+    """Paginates the order list only for clients that pass "cursor"."""
+
+    page_size = 10
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
 
     queryset = (
         Order.objects.sorted_by_condition()
@@ -46,8 +61,46 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+    def is_history_page(self):
+        return (
+            self.action == "list"
+            and self.paginator.cursor_query_param in self.request.query_params
+        )
+
+    def get_serializer_class(self):
+        if self.is_history_page():
+            return OrderListSerializer
+        return super().get_serializer_class()
+
+    def get_list_queryset(self):
+        return (
+            Order.objects.filter(customer=self.request.user)
+            .exclude(status="pending")
+            .filter(Exists(OrderItemGroup.objects.filter(order=OuterRef("pk"))))
+            .annotate(
+                promo_discount_sum=Coalesce("discount_sum", 0),
+                has_institution_feedback=Exists(
+                    InstitutionFeedback.objects.filter(order=OuterRef("pk"))
+                ),
+                has_delivery_feedback=Exists(DeliveryFeedback.objects.filter(order=OuterRef("pk"))),
+            )
+            .prefetch_related(
+                Prefetch(
+                    "item_groups",
+                    queryset=OrderItemGroup.objects.select_related(
+                        "institution", "institution_branch"
+                    ).order_by("id"),
+                ),
+                Prefetch("item_groups__items", queryset=OrderItem.objects.select_related("product")),
+                "item_groups__items__options",
+            )
+            .order_by("-id")
+        )
+
     def get_queryset(self):
         user = self.request.user
+        if self.is_history_page():
+            return self.get_list_queryset()
         if self.request.query_params.get("all"):
             return super(OrderViewSet, self).get_queryset()
         queryset = super(OrderViewSet, self).get_queryset()
@@ -2,6 +2,7 @@ import json
 from functools import cache
 import requests
 
+from common.metrics import timed_request
 from payme.models import PaymePayment
 from payment.models import Payment
 from ofd.services import OFDReceiptService
@@ -41,8 +42,14 @@ def _create_receipt(session, order, items: list[dict]):
     if int(payment.status) == 4:
         return False
 
-    response = session.post(
-        PAYME_SETTINGS["api_url"], data=json.dumps(data), headers=_get_auth_header()
+    response = timed_request(
+        "payme",
+        data["method"],
+        "POST",
+        PAYME_SETTINGS["api_url"],
+        session=session,
+        data=json.dumps(data),
+        headers=_get_auth_header(),
     )
     response_json = response.json()
     print(data, response_json)
@@ -67,8 +74,14 @@ def _pay_receipt(session, receipt_id, token):
         "params": {"id": receipt_id, "token": token},
     }
 
-    response = session.post(
-        PAYME_SETTINGS["api_url"], data=json.dumps(data), headers=_get_auth_header()
+    response = timed_request(
+        "payme",
+        data["method"],
+        "POST",
+        PAYME_SETTINGS["api_url"],
+        session=session,
+        data=json.dumps(data),
+        headers=_get_auth_header(),
     )
     response_json = response.json()
         
@@ -106,10 +119,10 @@ def make_payment(session, order, token, items: list[dict]):
     
 
     if receipt_paying_response.status_code == 200 and receipt_state == 4:
+        # the status is written by the accept transition that charged the order
         order.is_paid = True
-        order.status = "accepted"
         order.receipt_id = receipt_id
-        order.save()
+        order.save(update_fields=["is_paid", "receipt_id"])
         
         # Создаем Payment запись для Payme платежа
         payment = Payment.objects.create(
@@ -151,8 +164,13 @@ def make_payment(session, order, token, items: list[dict]):
 def confirm_payment(receipt_id):
     payload = {"id": 1, "method": "receipts.confirm_hold", "params": {"id": receipt_id}}
 
-    response = requests.post(
-        url=PAYME_SETTINGS["api_url"], data=json.dumps(payload), headers=_get_auth_header()
+    response = timed_request(
+        "payme",
+        payload["method"],
+        "POST",
+        PAYME_SETTINGS["api_url"],
+        data=json.dumps(payload),
+        headers=_get_auth_header(),
     )
     response_json = response.json()
     
@@ -166,8 +184,13 @@ def confirm_payment(receipt_id):
 def cancel_payment(receipt_id):
     payload = {"id": 1, "method": "receipts.cancel", "params": {"id": receipt_id}}
 
-    response = requests.post(
-        url=PAYME_SETTINGS["api_url"], data=json.dumps(payload), headers=_get_auth_header()
+    response = timed_request(
+        "payme",
+        payload["method"],
+        "POST",
+        PAYME_SETTINGS["api_url"],
+        data=json.dumps(payload),
+        headers=_get_auth_header(),
     )
     
     response_json = response.json()
@@ -197,10 +220,13 @@ def set_fiscal_data(receipt_id, fiscal_data):
         }
     }
     
-    response = requests.post(
-        url=PAYME_SETTINGS["api_url"], 
-        data=json.dumps(payload), 
-        headers=_get_auth_header()
+    response = timed_request(
+        "payme",
+        payload["method"],
+        "POST",
+        PAYME_SETTINGS["api_url"],
+        data=json.dumps(payload),
+        headers=_get_auth_header(),
     )
     
     response_json = response.json()
@@ -231,7 +257,9 @@ class PaymeApiClient:
                 'save': True
             }
         }
-        response = self.session.post(self.base_url, json=payload)
+        response = timed_request(
+            "payme", payload["method"], "POST", self.base_url, session=self.session, json=payload
+        )
         if response.ok:
             res = response.json()
             return res['result']['card']['token']
@@ -245,7 +273,9 @@ class PaymeApiClient:
                 'token': token
             }
         }
-        response = self.session.post(self.base_url, json=payload)
+        response = timed_request(
+            "payme", payload["method"], "POST", self.base_url, session=self.session, json=payload
+        )
         if response.ok:
             res = response.json()
             return res['result']
@@ -260,5 +290,7 @@ class PaymeApiClient:
                 'code': code
             }
         }
-        response = self.session.post(self.base_url, json=payload)
+        response = timed_request(
+            "payme", payload["method"], "POST", self.base_url, session=self.session, json=payload
+        )
         return response.json() if response.ok else None
@@ -1,8 +1,22 @@
 from django.contrib import admin
 
-from payment.models import Payment
+from payment.models import BalanceEntry, Payment
 
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(BalanceEntry)
+class BalanceEntryAdmin(admin.ModelAdmin):
+    list_display = ("id", "institution", "courier", "order", "amount", "name", "created_at")
+    list_filter = ("name",)
+    raw_id_fields = ("institution", "courier", "order")
+
+    # the ledger is append-only, mistakes are corrected with another entry
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
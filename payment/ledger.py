@@ -0,0 +1,188 @@
+"""
+Institution and courier balances kept as an append-only ledger.
+
+Money movements only ever insert BalanceEntry rows, so closing orders of the same
+restaurant or courier at once never waits on a row lock. A balance is its
+BalanceSnapshot plus the entries after it. rollup_balances() (celery beat) moves the
+snapshots forward and copies the full balances, snapshot plus the entries after the
+watermark, into Institution.balance and Courier.balance, which stay as cached values for
+lists and forms and may lag behind the ledger until the next rollup.
+
+Entry ids are handed out when a row is inserted but become visible when its transaction
+commits, so a lower id can show up after a higher one. Each rollup therefore records a
+watermark: the newest visible entry id and the xmax of a snapshot taken right after it.
+Every transaction still holding a lower id had started by then, so once the oldest
+running transaction is newer than that xmax, a later rollup moves the snapshots up to the
+watermark without skipping any entry.
+"""
+import logging
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from payment.models import BalanceEntry, BalanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+# entry field -> model whose balance column mirrors the ledger
+ACCOUNT_MODELS = {
+    "institution": "institution.Institution",
+    "courier": "courier.Courier",
+}
+ROLLUP_LOCK_KEY = "balance-rollup-lock"
+ROLLUP_LOCK_TIMEOUT = 10 * 60
+ROLLUP_WATERMARK_KEY = "balance-rollup-watermark"
+
+
+def get_account(institution=None, courier=None):
+    if (institution is None) == (courier is None):
+        raise ValueError("Exactly one of institution and courier is required")
+    if institution is not None:
+        return "institution", institution.pk
+    return "courier", courier.pk
+
+
+def add_entry(amount, name, institution=None, courier=None, order=None):
+    field, account_id = get_account(institution, courier)
+    return BalanceEntry.objects.create(
+        **{f"{field}_id": account_id}, amount=amount, name=name, order=order
+    )
+
+
+def get_balance(institution=None, courier=None):
+    field, account_id = get_account(institution, courier)
+    snapshot = BalanceSnapshot.objects.filter(**{f"{field}_id": account_id}).first()
+    balance, last_entry_id = (snapshot.balance, snapshot.last_entry_id) if snapshot else (0, 0)
+    tail = BalanceEntry.objects.filter(
+        **{f"{field}_id": account_id}, id__gt=last_entry_id
+    ).aggregate(total=Sum("amount"))["total"]
+    return balance + (tail or 0)
+
+
+def set_balance(balance, institution=None, courier=None):
+    """Records the difference to "balance" as an adjustment, for manual corrections."""
+    difference = balance - get_balance(institution=institution, courier=courier)
+    if difference:
+        add_entry(difference, "adjustment", institution=institution, courier=courier)
+    return difference
+
+
+def get_balances(field, account_ids=None):
+    """Ledger balances of all accounts of a kind with entries, by account id."""
+    snapshots = BalanceSnapshot.objects.filter(**{f"{field}__isnull": False})
+    entries = BalanceEntry.objects.filter(**{f"{field}__isnull": False})
+    if account_ids is not None:
+        snapshots = snapshots.filter(**{f"{field}_id__in": account_ids})
+        entries = entries.filter(**{f"{field}_id__in": account_ids})
+
+    # accounts without entries since an older snapshot have none after the newest either
+    last_entry_id = BalanceSnapshot.objects.aggregate(last=Max("last_entry_id"))["last"] or 0
+    balances = dict(snapshots.values_list(f"{field}_id", "balance"))
+    tails = (
+        entries.filter(id__gt=last_entry_id)
+        .values(f"{field}_id")
+        .annotate(total=Sum("amount"))
+        .values_list(f"{field}_id", "total")
+    )
+    for account_id, total in tails:
+        balances[account_id] = balances.get(account_id, 0) + total
+    return balances
+
+
+def sync_balance_columns(field, account_ids):
+    """Copies the current balances, not just the snapshots, into the cached columns."""
+    model = apps.get_model(ACCOUNT_MODELS[field])
+    balances = get_balances(field, account_ids)
+    model.objects.bulk_update(
+        [model(pk=account_id, balance=balances.get(account_id, 0)) for account_id in account_ids],
+        ["balance"],
+        batch_size=500,
+    )
+
+
+def get_snapshot_bounds():
+    """(xmin, xmax) of a fresh snapshot: the oldest running and the next transaction id."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint,"
+            " pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+        )
+        return cursor.fetchone()
+
+
+def take_watermark():
+    # the id is read first, every transaction holding a lower one is older than the xmax
+    end = BalanceEntry.objects.aggregate(last=Max("id"))["last"] or 0
+    _, xmax = get_snapshot_bounds()
+    cache.set(ROLLUP_WATERMARK_KEY, {"end": end, "xmax": xmax}, None)
+
+
+def get_settled_entry_id():
+    """The watermark if no transaction that was running when it was taken is left, else None."""
+    watermark = cache.get(ROLLUP_WATERMARK_KEY)
+    if watermark is None:
+        return None
+    xmin, _ = get_snapshot_bounds()
+    return watermark["end"] if xmin >= watermark["xmax"] else None
+
+
+def rollup_balances():
+    """Moves snapshots up to the settled watermark, returns the accounts updated."""
+    if not cache.add(ROLLUP_LOCK_KEY, 1, ROLLUP_LOCK_TIMEOUT):
+        logger.info("Balance rollup already running")
+        return 0
+
+    try:
+        if cache.get(ROLLUP_WATERMARK_KEY) is None:
+            take_watermark()
+            return 0
+        end = get_settled_entry_id()
+        if end is None:
+            logger.info("Balance rollup waits for transactions older than the watermark")
+            return 0
+
+        updated = 0
+        with transaction.atomic():
+            start = BalanceSnapshot.objects.aggregate(last=Max("last_entry_id"))["last"] or 0
+            if end > start:
+                updated = roll_up_to(start, end)
+        take_watermark()
+    finally:
+        cache.delete(ROLLUP_LOCK_KEY)
+
+    logger.info(f"Balance rollup up to entry {end}: {updated} accounts")
+    return updated
+
+
+def roll_up_to(start, end):
+    updated = 0
+    for field in ACCOUNT_MODELS:
+        totals = dict(
+            BalanceEntry.objects.filter(id__gt=start, id__lte=end, **{f"{field}__isnull": False})
+            .values(f"{field}_id")
+            .annotate(total=Sum("amount"))
+            .values_list(f"{field}_id", "total")
+        )
+        snapshots = BalanceSnapshot.objects.filter(**{f"{field}_id__in": totals})
+        existing = {getattr(snapshot, f"{field}_id"): snapshot for snapshot in snapshots}
+        created = []
+        for account_id, total in totals.items():
+            snapshot = existing.get(account_id)
+            if snapshot is None:
+                created.append(
+                    BalanceSnapshot(**{f"{field}_id": account_id}, balance=total, last_entry_id=end)
+                )
+            else:
+                snapshot.balance += total
+                snapshot.last_entry_id = end
+                snapshot.updated_at = timezone.now()
+        BalanceSnapshot.objects.bulk_update(
+            existing.values(), ["balance", "last_entry_id", "updated_at"], batch_size=500
+        )
+        BalanceSnapshot.objects.bulk_create(created, batch_size=500)
+        sync_balance_columns(field, list(totals))
+        updated += len(totals)
+    return updated
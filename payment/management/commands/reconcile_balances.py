@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from payment.ledger import ACCOUNT_MODELS, get_balances, sync_balance_columns
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Institution.balance and Courier.balance with the balance ledger, "
+        "mismatches are writes that bypassed the ledger or entries not rolled up yet"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync", action="store_true", help="Overwrite mismatching balances with the ledger"
+        )
+
+    def handle(self, *args, **options):
+        for field, label in ACCOUNT_MODELS.items():
+            model = apps.get_model(label)
+            ledger = get_balances(field)
+            stored = dict(model.objects.values_list("pk", "balance"))
+
+            mismatches = [
+                (account_id, balance, ledger.get(account_id, 0))
+                for account_id, balance in stored.items()
+                if balance != ledger.get(account_id, 0)
+            ]
+            self.stdout.write(
+                f"{field}: {len(stored)} accounts, {len(mismatches)} mismatching, "
+                f"stored total {sum(stored.values())}, ledger total {sum(ledger.values())}"
+            )
+            for account_id, balance, ledger_balance in mismatches:
+                self.stdout.write(
+                    f"  {field} {account_id}: stored {balance}, ledger {ledger_balance}, "
+                    f"difference {balance - ledger_balance}"
+                )
+
+            if options["sync"] and mismatches:
+                sync_balance_columns(field, [account_id for account_id, _, _ in mismatches])
+                self.stdout.write(self.style.SUCCESS(f"  {len(mismatches)} {field} balances synced"))
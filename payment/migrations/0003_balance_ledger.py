@@ -0,0 +1,133 @@
+# Generated by Django 4.2.17 on 2026-10-19 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_balances(apps, schema_editor):
+    """The current balances become the first ledger entries."""
+    BalanceEntry = apps.get_model("payment", "BalanceEntry")
+    entries = []
+    for field, label in (("institution", "institution.Institution"), ("courier", "courier.Courier")):
+        model = apps.get_model(label)
+        for pk, balance in model.objects.exclude(balance=0).values_list("pk", "balance"):
+            entries.append(BalanceEntry(**{f"{field}_id": pk}, amount=balance, name="opening"))
+    BalanceEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("courier", "0019_transaction_name"),
+        ("institution", "0051_institution_image_variants_and_more"),
+        ("order", "0049_order_version"),
+        ("payment", "0002_payment_receipt_required"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("amount", models.IntegerField(verbose_name="Сумма")),
+                (
+                    "name",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Начальный баланс"),
+                            ("adjustment", "Корректировка"),
+                            ("commission", "Комиссия"),
+                            ("products", "Сумма продуктов"),
+                            ("delivering", "Доставка"),
+                            ("order_amount", "Сумма заказа"),
+                            ("promo_code", "Промокод"),
+                        ],
+                        max_length=50,
+                        verbose_name="Основание",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Создано")),
+                (
+                    "courier",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_entries",
+                        to="courier.courier",
+                        verbose_name="Курьер",
+                    ),
+                ),
+                (
+                    "institution",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_entries",
+                        to="institution.institution",
+                        verbose_name="Заведение",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="order.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Движение баланса",
+                "verbose_name_plural": "Движения баланса",
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(fields=["institution", "id"], name="balance_entry_institution_idx"),
+                    models.Index(fields=["courier", "id"], name="balance_entry_courier_idx"),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="balanceentry",
+            constraint=models.CheckConstraint(
+                check=models.Q(("institution__isnull", True), ("courier__isnull", True), _connector="XOR"),
+                name="balance_entry_single_account",
+            ),
+        ),
+        migrations.CreateModel(
+            name="BalanceSnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("balance", models.IntegerField(default=0)),
+                ("last_entry_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "courier",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_snapshot",
+                        to="courier.courier",
+                    ),
+                ),
+                (
+                    "institution",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_snapshot",
+                        to="institution.institution",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок баланса",
+                "verbose_name_plural": "Снимки баланса",
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
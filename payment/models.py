@@ -26,3 +26,87 @@ class Payment(TimeStampedFlagsModel):
         ordering = ["-created_at"]
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
+
+
+class BalanceEntry(models.Model):
+    """
+    Append-only movements of institution and courier balances, see payment.ledger.
+    Positive amounts are owed to the account, negative ones by it.
+    """
+
+    NAMES = (
+        ("opening", "Начальный баланс"),
+        ("adjustment", "Корректировка"),
+        ("commission", "Комиссия"),
+        ("products", "Сумма продуктов"),
+        ("delivering", "Доставка"),
+        ("order_amount", "Сумма заказа"),
+        ("promo_code", "Промокод"),
+    )
+
+    institution = models.ForeignKey(
+        "institution.Institution",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="balance_entries",
+        verbose_name="Заведение",
+    )
+    courier = models.ForeignKey(
+        "courier.Courier",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="balance_entries",
+        verbose_name="Курьер",
+    )
+    order = models.ForeignKey(
+        "order.Order", on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Заказ"
+    )
+    amount = models.IntegerField(verbose_name="Сумма")
+    name = models.CharField(max_length=50, choices=NAMES, verbose_name="Основание")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+
+    def __str__(self):
+        return f"{self.institution or self.courier} {self.amount}"
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name = "Движение баланса"
+        verbose_name_plural = "Движения баланса"
+        indexes = [
+            models.Index(fields=["institution", "id"], name="balance_entry_institution_idx"),
+            models.Index(fields=["courier", "id"], name="balance_entry_courier_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(institution__isnull=True) ^ models.Q(courier__isnull=True),
+                name="balance_entry_single_account",
+            ),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """The balance of an account up to and including entry last_entry_id."""
+
+    institution = models.OneToOneField(
+        "institution.Institution",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="balance_snapshot",
+    )
+    courier = models.OneToOneField(
+        "courier.Courier",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="balance_snapshot",
+    )
+    balance = models.IntegerField(default=0)
+    last_entry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Снимок баланса"
+        verbose_name_plural = "Снимки баланса"
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from payment.ledger import rollup_balances
+
+
+@shared_task
+def rollup_balances_task():
+    return rollup_balances()
@@ -1 +1,83 @@
-# Create your tests here.
+import pytest
+from django.core.cache import cache
+
+from institution.models import Institution
+from payment.ledger import (
+    ROLLUP_WATERMARK_KEY,
+    add_entry,
+    get_balance,
+    get_balances,
+    rollup_balances,
+    set_balance,
+)
+from payment.models import BalanceEntry, BalanceSnapshot
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+
+
+@pytest.fixture
+def institutions(db):
+    return [
+        Institution.objects.create(
+            name=f"Ledger Institution {index}",
+            phone_number=f"+99890123456{index}",
+            type="restaurant",
+        )
+        for index in range(2)
+    ]
+
+
+def test_balance_is_sum_of_entries(institutions):
+    first, second = institutions
+    add_entry(10000, "products", institution=first)
+    add_entry(-1500, "commission", institution=first)
+    add_entry(700, "products", institution=second)
+
+    assert get_balance(institution=first) == 8500
+    assert get_balances("institution") == {first.pk: 8500, second.pk: 700}
+    assert get_balances("institution", [second.pk]) == {second.pk: 700}
+
+
+def test_set_balance_records_adjustment(institutions):
+    institution = institutions[0]
+    add_entry(1000, "products", institution=institution)
+
+    assert set_balance(400, institution=institution) == -600
+    assert get_balance(institution=institution) == 400
+    assert BalanceEntry.objects.filter(name="adjustment", amount=-600).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rollup_waits_for_watermark_and_keeps_balances(institutions):
+    first, second = institutions
+    add_entry(10000, "products", institution=first)
+    add_entry(-300, "commission", institution=second)
+
+    # the first run only takes the watermark
+    assert rollup_balances() == 0
+    assert not BalanceSnapshot.objects.exists()
+
+    add_entry(-1500, "commission", institution=first)
+    assert rollup_balances() == 2
+
+    first.refresh_from_db()
+    # the entry after the watermark stays in the tail, the cached column includes it
+    assert BalanceSnapshot.objects.get(institution=first).balance == 10000
+    assert first.balance == 8500
+    assert get_balance(institution=first) == 8500
+    assert get_balances("institution") == {first.pk: 8500, second.pk: -300}
+
+
+def test_rollup_skips_watermark_of_running_transaction(institutions):
+    add_entry(500, "products", institution=institutions[0])
+    rollup_balances()
+    assert cache.get(ROLLUP_WATERMARK_KEY) is not None
+
+    # the test transaction holding the entry is still open
+    assert rollup_balances() == 0
+    assert not BalanceSnapshot.objects.exists()
+    assert get_balance(institution=institutions[0]) == 500
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_branch_links(apps, schema_editor):
+    ProductToBranch = apps.get_model("product", "ProductToBranch")
+    duplicates = (
+        ProductToBranch.objects.values("product", "institution_branches")
+        .annotate(first_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        ProductToBranch.objects.filter(
+            product=duplicate["product"],
+            institution_branches=duplicate["institution_branches"],
+        ).exclude(id=duplicate["first_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("institution", "0049_alter_institution_position"),
+        ("product", "0030_optionitem_uuid_product_uuid_productoption_uuid"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_branch_links, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="productcategory",
+            constraint=models.UniqueConstraint(
+                fields=("institution", "uuid"), name="unique_product_category_uuid"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("institution", "uuid"), name="unique_product_uuid"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productoption",
+            constraint=models.UniqueConstraint(
+                fields=("product", "uuid"), name="unique_product_option_uuid"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="optionitem",
+            constraint=models.UniqueConstraint(
+                fields=("option", "uuid"), name="unique_option_item_uuid"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="producttobranch",
+            constraint=models.UniqueConstraint(
+                fields=("product", "institution_branches"), name="unique_product_to_branch"
+            ),
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.db import models
 from django.urls import reverse
 from modeltrans.fields import TranslationField
 
-from base.models import FlagsModel
+from base.models import FlagsModel, ImageVariantsModel
 
 
 class ProductCategory(models.Model):
@@ -37,6 +37,11 @@ class ProductCategory(models.Model):
         ordering = ["position"]
         verbose_name = "Категория продуктов"
         verbose_name_plural = "Категории продуктов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["institution", "uuid"], name="unique_product_category_uuid"
+            ),
+        ]
 
     def __str__(self):
         return self.name_i18n
@@ -45,7 +50,7 @@ class ProductCategory(models.Model):
         return self.translation_fields
 
 
-class Product(models.Model):
+class Product(ImageVariantsModel, models.Model):
     STATUS_CHOICES = (("active", "активен"), ("inactive", "неактивен"))
     external_id = models.BigIntegerField(null=True, blank=True, verbose_name="Внешний id")
     uuid = models.UUIDField(blank=True, null=True)
@@ -99,6 +104,9 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        constraints = [
+            models.UniqueConstraint(fields=["institution", "uuid"], name="unique_product_uuid"),
+        ]
 
     def __str__(self):
         return self.name_i18n
@@ -116,6 +124,9 @@ class ProductOption(FlagsModel):
     class Meta:
         verbose_name = "Дополнение"
         verbose_name_plural = "Дополнения"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "uuid"], name="unique_product_option_uuid"),
+        ]
 
     def __str__(self):
         return self.title_i18n
@@ -141,6 +152,9 @@ class OptionItem(models.Model):
     class Meta:
         verbose_name = "Элемент дополнения"
         verbose_name_plural = "Элементы дополнения"
+        constraints = [
+            models.UniqueConstraint(fields=["option", "uuid"], name="unique_option_item_uuid"),
+        ]
 
     def __str__(self):
         return self.title_i18n
@@ -168,3 +182,10 @@ class ProductToBranch(models.Model):
         related_name='products'
     )
     is_available = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "institution_branches"], name="unique_product_to_branch"
+            ),
+        ]
@@ -7,14 +7,27 @@ from .models import Product, ProductCategory, ProductOption, OptionItem, Product
 
 
 class ThumbnailSerializer(serializers.ImageField):
-    def __init__(self, alias, **kwargs):
+    """
+    Emits the URL precomputed into "image_variants" by the background image job and
+    falls back to a lazily generated easy_thumbnails JPEG until the job has finished.
+    """
+
+    def __init__(self, alias, format="jpeg", **kwargs):
         super().__init__(**kwargs)
         self.alias = alias
+        self.format = format
         self.read_only = True
 
+    def get_variant_url(self, value):
+        variants = getattr(value.instance, "image_variants", None) or {}
+        entry = variants.get(value.field.name)
+        if not entry or entry.get("source") != value.name:
+            return None
+        return entry.get(self.alias, {}).get(self.format)
+
     def to_representation(self, value):
         request = self.context.get("request")
-        url = thumbnail_url(value, self.alias)
+        url = self.get_variant_url(value) or thumbnail_url(value, self.alias)
         if request:
             url = request.build_absolute_uri(url)
         return url
@@ -49,6 +62,7 @@ class OptionSerializer(serializers.ModelSerializer):
 class ProductListSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name="product-detail")
     image = ThumbnailSerializer("small")
+    image_webp = ThumbnailSerializer("small", format="webp", source="image")
     price_display = serializers.SerializerMethodField()
     old_price = serializers.SerializerMethodField()
     options = OptionSerializer(many=True, read_only=True)
@@ -62,6 +76,7 @@ class ProductListSerializer(serializers.ModelSerializer):
             "name_uz",
             "name_en",
             "image",
+            "image_webp",
             "price",
             "old_price",
             "status",
@@ -136,6 +151,7 @@ class ProductDetailSerializer(ProductListSerializer):
     options = OptionSerializer(many=True, read_only=True)
     is_liked = serializers.BooleanField(read_only=True)
     image = ThumbnailSerializer("big")
+    image_webp = ThumbnailSerializer("big", format="webp", source="image")
 
     class Meta(ProductListSerializer.Meta):
         fields = [
@@ -144,6 +160,7 @@ class ProductDetailSerializer(ProductListSerializer):
             "name_uz",
             "name_en",
             "image",
+            "image_webp",
             "price",
             "description_ru",
             "description_uz",
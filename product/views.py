@@ -15,18 +15,28 @@ from django.contrib.gis.db.models import Func, PointField
 
 
 
+from base.db_router import ReplicaReadMixin
+from common.cache import cached_response
 from .serializers import ProductDetailSerializer, ProductListSerializer, CategoryListSerializer
 from .models import Product, LikedProducts, ProductCategory, ProductToBranch
 
 
-class ProductCategoryViewSet(ViewSetMixin, ListAPIView, RetrieveAPIView):
+class ProductCategoryViewSet(ReplicaReadMixin, ViewSetMixin, ListAPIView, RetrieveAPIView):
     serializer_class = CategoryListSerializer
     queryset = ProductCategory.objects.filter(
         is_deleted=False, is_active=True, institution__is_deleted=False
     )
 
+    @cached_response(tags=["product"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-class ProductViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    @cached_response(tags=["product"])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ProductViewSet(ReplicaReadMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     serializer_class = ProductDetailSerializer
     queryset = Product.objects.filter(
         is_deleted=False, institution__is_deleted=False, status='active').prefetch_related("options", "options__items")
@@ -44,6 +54,14 @@ class ProductViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.
                 is_liked=Q(id__in=user.liked_products.values_list("product_id", flat=True))
             )
         return queryset
+
+    @cached_response(tags=["product"], vary_on_user=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(tags=["product"], vary_on_user=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
     
     @action(detail=False, methods=["post"], url_path="available")
     def available(self, request):
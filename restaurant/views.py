@@ -3,14 +3,15 @@ from datetime import timedelta, datetime
 
 from django.contrib.auth import get_user_model
 from django.db.models import Q, Count, Sum, F, Avg
+from django.db.models.functions import Coalesce, ExtractDay
 from django.utils.timezone import now
 from django_filters.rest_framework import DjangoFilterBackend
 
-from base.api_views import MultiSerializerViewSetMixin, CustomPagination
+from base.api_views import MultiSerializerViewSetMixin, CustomPagination, KeysetModeMixin
 from institution.models import InstitutionBranch
 from order.feedback.models import InstitutionFeedback
 from order.feedback.serializers import InstitutionFeedbackSerializer
-from order.models import Order, ORDER_STATUS
+from order.models import Order, OrderStatsHourly, ORDER_STATUS
 from order.utils import notify_courier, notify_institution, notify_operator
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -82,13 +83,18 @@ class OptionalPagination(PageNumberPagination):
             'per_page': self.get_page_size(self.request),
             'results': data
         })
-    
+
+
+class KeysetOptionalPagination(KeysetModeMixin, OptionalPagination):
+    pass
+
+
 class OrderActionsViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderRestaurantSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderFilter
-    pagination_class = OptionalPagination
+    pagination_class = KeysetOptionalPagination
     
     def get_queryset(self):
         inst = self.request.user.get_institution()
@@ -148,10 +154,9 @@ class OrderActionsViewSet(ModelViewSet):
             return Response({"message": f'Эту операцию нельзя выполнить для данного заказа {order.id}. Текущий статус заказа: {order.get_status_display()}.'}, status=400)
         preparing_time = request.data.get("preparing_time", 0)
         order.preparing_time = preparing_time
-        update_order_status(order, "accepted", preparing_time)
-        notify_courier(order)
-        notify_operator(order)
-        notify_institution(order)
+        success, error = update_order_status(order, "accepted", preparing_time)
+        if not success:
+            return Response({"message": error}, status=400)
         return Response({"message": f"Заказ {order.id} принят и перемещен в статус 'accepted'."})
     
     @action(methods=["post"], detail=True)
@@ -160,14 +165,18 @@ class OrderActionsViewSet(ModelViewSet):
         is_process = request.data.get("is_process")
         if is_process:
             order.is_process = is_process
+            order.save(update_fields=["is_process"])
+            notify_courier(order)
+            notify_operator(order)
+            notify_institution(order)
         else:
             order.is_process = False
             order.preparing_time = request.data.get("preparing_time", 0)
-            order.status = ORDER_STATUS.INCIDENT
-        order.save()
-        notify_courier(order)
-        notify_operator(order)
-        notify_institution(order)
+            order.save(update_fields=["is_process", "preparing_time"])
+            if order.status != ORDER_STATUS.INCIDENT:
+                success, error = update_order_status(order, ORDER_STATUS.INCIDENT, force=True)
+                if not success:
+                    return Response({"message": error}, status=400)
         return Response({"message": f'Заказ {order.id} в процессе обработки.'})
 
     @action(methods=["post"], detail=True)
@@ -186,17 +195,18 @@ class OrderActionsViewSet(ModelViewSet):
     @action(methods=["post"], detail=True)
     def cancel(self, request: Request, pk):
         order = Order.objects.get(pk=pk)
-        update_order_status(order, "rejected")
-        notify_courier(order)
-        notify_operator(order)
-        notify_institution(order)
+        success, error = update_order_status(order, "rejected")
+        if not success:
+            return Response({"message": error}, status=400)
         return Response({"message": f'Заказ {order.id} отменен и перемещен в статус "closed"'})
     
     @action(methods=["post"], detail=True)
     def cooking(self, request: Request, pk):
         order = Order.objects.get(pk=pk)
         if order.status == ORDER_STATUS.ACCEPTED:
-            update_order_status(order, "cooking")
+            success, error = update_order_status(order, "cooking")
+            if not success:
+                return Response({"message": error}, status=400)
             return Response({"message": f'Заказ {order.id} приготовится и перемещен в статус "cooking"'})
         if order.status == ORDER_STATUS.COOKING:
             return Response({"message": f'Заказ {order.id} уже в статусе "cooking"'})
@@ -206,10 +216,9 @@ class OrderActionsViewSet(ModelViewSet):
     def ready(self, request, pk):
         order = self.get_object()
         if order.status in [ORDER_STATUS.ACCEPTED, ORDER_STATUS.COOKING]:
-            update_order_status(order, "ready")
-            notify_courier(order)
-            notify_operator(order)
-            notify_institution(order)
+            success, error = update_order_status(order, "ready")
+            if not success:
+                return Response({"message": error}, status=400)
             return Response({"message": f'Заказ {order.id} готов и перемещен в статус "ready". '})
         return Response({"message": f'Заказ {order.id} не принят или не приготовлен.'})
 
@@ -236,11 +245,10 @@ class OrderActionsViewSet(ModelViewSet):
                                                       f'{today.year}-{today.month}-'
                                                       f'{calendar.monthrange(today.year, today.month)[1]} 23:59:59'], item_groups__institution=inst)
         
-        paginator = OptionalPagination()
-        page = paginator.paginate_queryset(queryset, request, view=self)
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = OrderRestaurantSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializer.data)
 
         serializer = OrderRestaurantSerializer(queryset, many=True)
         return Response(serializer.data)
@@ -250,25 +258,32 @@ class OrderActionsViewSet(ModelViewSet):
         start_date, end_date = request.GET.get("start_date", ''), request.GET.get("end_date", '')
         inst = request.user.get_institution()
         if start_date and end_date:
-            orders = Order.objects.filter(created_at__range=[start_date + " 00:00:00", end_date + " 23:59:59"], item_groups__institution=inst)
+            hours = [start_date + " 00:00:00", end_date + " 23:59:59"]
         else:
             today = datetime.today()
-            orders = Order.objects.filter(created_at__range=[f'{today.year}-{today.month}-01 00:00:00',
-                                                      f'{today.year}-{today.month}-'
-                                                      f'{calendar.monthrange(today.year, today.month)[1]} 23:59:59'], item_groups__institution=inst)
-        stats = orders.extra({
-            'day': "EXTRACT(DAY FROM order_order.created_at)",
-        }).values("day").annotate(
-            total_orders=Count("id"),
+            hours = [f'{today.year}-{today.month}-01 00:00:00',
+                     f'{today.year}-{today.month}-'
+                     f'{calendar.monthrange(today.year, today.month)[1]} 23:59:59']
+        rows = OrderStatsHourly.objects.filter(hour__range=hours, institution=inst)
+        stats = rows.annotate(day=ExtractDay("hour")).values("day").annotate(
+            total_orders=Sum("orders_count"),
             total_sum1=Sum("products_sum"),
-            # avg_preparation_time=Avg(F("prepared_at") - F("created_at"))
-        ).order_by("day")
-        total_cheque = stats.aggregate(Count('id')).get("id__count")
-        accepted_cheque = stats.filter(status='closed').aggregate(Count('id')).get("id__count")
-        canceled_cheque = stats.filter(status='rejected').aggregate(Count('id')).get("id__count")
-        total_sum = orders.filter(payment_method__in=['cash', 'payme'], status='closed').aggregate(Sum('products_sum'))['products_sum__sum'] or 0
-        cash_sum = orders.filter(payment_method='cash', status='closed').aggregate(Sum('products_sum'))['products_sum__sum'] or 0
-        payme_sum = orders.filter(payment_method='payme', status='closed').aggregate(Sum('products_sum'))['products_sum__sum'] or 0
+        ).filter(total_orders__gt=0).order_by("day")
+        closed = Q(status='closed')
+        totals = rows.aggregate(
+            total=Coalesce(Sum("orders_count"), 0),
+            accepted=Coalesce(Sum("orders_count", filter=closed), 0),
+            rejected=Coalesce(Sum("orders_count", filter=Q(status='rejected')), 0),
+            total_sum=Coalesce(Sum("products_sum", filter=closed & Q(payment_method__in=['cash', 'payme'])), 0),
+            cash_sum=Coalesce(Sum("products_sum", filter=closed & Q(payment_method='cash')), 0),
+            payme_sum=Coalesce(Sum("products_sum", filter=closed & Q(payment_method='payme')), 0),
+        )
+        total_cheque = totals['total']
+        accepted_cheque = totals['accepted']
+        canceled_cheque = totals['rejected']
+        total_sum = totals['total_sum']
+        cash_sum = totals['cash_sum']
+        payme_sum = totals['payme_sum']
 
         return Response({
             'total': total_cheque,
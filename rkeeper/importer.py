@@ -0,0 +1,348 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID
+
+import requests
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+
+from common.tasks import generate_image_variants
+from institution.models import Institution, InstitutionBranch
+from institution.services import bump_menu_version, seed_institution_branch
+from product.models import OptionItem, Product, ProductCategory, ProductOption, ProductToBranch
+from rkeeper.services import rkeeperAPI
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DOWNLOAD_WORKERS = 8
+IMAGE_DOWNLOAD_TIMEOUT = 15
+
+
+def normalize_uuid(value):
+    """An rkeeper id formatted like str() of a UUIDField value, None if it is no uuid."""
+    try:
+        return str(UUID(str(value)))
+    except ValueError:
+        return None
+
+
+class MenuImporter:
+    """
+    Imports rkeeper menus of all institution branches with a constant number of queries.
+
+    Existing categories, products, options and option items are loaded into memory once,
+    menus are diffed against them and the changes are written with bulk upserts.
+    """
+
+    def __init__(self, institution: Institution, progress=None):
+        self.institution = institution
+        self.progress = progress or (lambda stage, done, total: None)
+        self.rkeeper = rkeeperAPI(
+            endpoint_url=institution.endpoint_url,
+            client_id=institution.client_id,
+            client_secret=institution.client_secret,
+        )
+
+    def run(self):
+        places = self.rkeeper.get_restaurants()["places"]
+
+        menus = {}
+        for index, place in enumerate(places, start=1):
+            seed_institution_branch(self.institution, place)
+            menus[place["id"]] = self.rkeeper.get_menu(place["id"])
+            self.progress("menus", index, len(places))
+
+        branches = {
+            branch.places_id: branch
+            for branch in InstitutionBranch.objects.filter(
+                institution=self.institution, places_id__in=menus.keys()
+            )
+        }
+
+        categories, items, branch_items = self._merge_menus(menus)
+
+        with transaction.atomic():
+            category_ids = self._sync_categories(categories)
+            self.progress("categories", len(category_ids), len(categories))
+
+            product_ids = self._sync_products(items, category_ids)
+            self.progress("products", len(product_ids), len(items))
+
+            self._sync_options(items, product_ids)
+            self.progress("options", len(items), len(items))
+
+            self._sync_branches(branch_items, branches, product_ids)
+            self.progress("branches", len(branches), len(branches))
+
+            bump_menu_version([branch.id for branch in branches.values()])
+
+        self._sync_images(items, product_ids)
+
+        return {
+            "branches": len(branches),
+            "categories": len(category_ids),
+            "products": len(product_ids),
+        }
+
+    @staticmethod
+    def _merge_menus(menus):
+        """Collects unique categories and items over all branch menus."""
+        categories = {}
+        items = {}
+        branch_items = {}
+        for places_id, menu in menus.items():
+            for category in menu.get("categories", []):
+                uuid = normalize_uuid(category["id"])
+                if uuid is not None:
+                    categories[uuid] = category
+            branch_items[places_id] = set()
+            for item in menu.get("items", []):
+                uuid = normalize_uuid(item["id"])
+                if uuid is None:
+                    logger.warning(f"Skipping rkeeper item with invalid id {item['id']}")
+                    continue
+                items[uuid] = item
+                branch_items[places_id].add(uuid)
+        return categories, items, branch_items
+
+    def _sync_categories(self, categories):
+        existing = {
+            str(category.uuid): category
+            for category in ProductCategory.objects.filter(
+                institution=self.institution, uuid__isnull=False
+            )
+        }
+        to_create = [
+            ProductCategory(uuid=uuid, name=data["name"], position=1, institution=self.institution)
+            for uuid, data in categories.items()
+            if uuid not in existing
+        ]
+        to_update = []
+        for uuid, category in existing.items():
+            if uuid in categories and category.name != categories[uuid]["name"]:
+                category.name = categories[uuid]["name"]
+                to_update.append(category)
+
+        ProductCategory.objects.bulk_create(to_create)
+        ProductCategory.objects.bulk_update(to_update, ["name"])
+
+        return {
+            str(uuid): pk
+            for uuid, pk in ProductCategory.objects.filter(
+                institution=self.institution, uuid__in=categories.keys()
+            ).values_list("uuid", "id")
+        }
+
+    def _sync_products(self, items, category_ids):
+        products = []
+        for uuid, data in items.items():
+            category_id = category_ids.get(normalize_uuid(data["categoryId"]))
+            if category_id is None:
+                continue
+            service_codes = data.get("serviceCodesUz") or {}
+            products.append(
+                Product(
+                    uuid=uuid,
+                    name=data["name"],
+                    description=data.get("description"),
+                    short_description="",
+                    status="active",
+                    price=data["price"],
+                    commission=18,
+                    spic_id=service_codes.get("mxikCodeUz", 0),
+                    package_code=service_codes.get("packageCodeUz", 0),
+                    vat=12,
+                    category_id=category_id,
+                    institution=self.institution,
+                    is_available=True,
+                    is_deleted=False,
+                )
+            )
+
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=["institution", "uuid"],
+            update_fields=[
+                "name",
+                "description",
+                "price",
+                "spic_id",
+                "package_code",
+                "category",
+                "is_available",
+                "is_deleted",
+            ],
+        )
+
+        product_ids = {
+            str(uuid): pk
+            for uuid, pk in Product.objects.filter(
+                institution=self.institution, uuid__in=[product.uuid for product in products]
+            ).values_list("uuid", "id")
+        }
+
+        Product.objects.filter(
+            institution=self.institution, uuid__isnull=False, is_deleted=False
+        ).exclude(id__in=product_ids.values()).update(is_deleted=True, is_available=False)
+
+        return product_ids
+
+    def _sync_options(self, items, product_ids):
+        options = []
+        for uuid, data in items.items():
+            if uuid not in product_ids:
+                continue
+            for group in data.get("modifierGroups") or []:
+                group_uuid = normalize_uuid(group.get("id"))
+                if group_uuid is None:
+                    continue
+                options.append(
+                    ProductOption(
+                        uuid=group_uuid,
+                        title=group["name"],
+                        is_required=False,
+                        product_id=product_ids[uuid],
+                        is_deleted=False,
+                    )
+                )
+
+        ProductOption.objects.bulk_create(
+            options,
+            update_conflicts=True,
+            unique_fields=["product", "uuid"],
+            update_fields=["title", "is_deleted"],
+        )
+
+        option_ids = {
+            (product_id, str(uuid)): pk
+            for product_id, uuid, pk in ProductOption.objects.filter(
+                product_id__in=product_ids.values(), uuid__isnull=False
+            ).values_list("product_id", "uuid", "id")
+        }
+        stale_options = set(option_ids.values()) - {
+            option_ids[(option.product_id, str(option.uuid))] for option in options
+        }
+        ProductOption.objects.filter(id__in=stale_options).update(is_deleted=True)
+
+        option_items = []
+        for uuid, data in items.items():
+            if uuid not in product_ids:
+                continue
+            for group in data.get("modifierGroups") or []:
+                option_id = option_ids.get((product_ids[uuid], normalize_uuid(group.get("id"))))
+                if option_id is None:
+                    continue
+                for modifier in group.get("modifiers", []):
+                    modifier_uuid = normalize_uuid(modifier["id"])
+                    if modifier_uuid is None:
+                        continue
+                    option_items.append(
+                        OptionItem(
+                            uuid=modifier_uuid,
+                            title=modifier["name"],
+                            option_id=option_id,
+                            adding_price=modifier["price"],
+                            is_default=True,
+                            is_deleted=False,
+                        )
+                    )
+
+        OptionItem.objects.bulk_create(
+            option_items,
+            update_conflicts=True,
+            unique_fields=["option", "uuid"],
+            update_fields=["title", "adding_price", "is_deleted"],
+        )
+        fresh = {(item.option_id, str(item.uuid)) for item in option_items}
+        stale_items = [
+            pk
+            for option_id, uuid, pk in OptionItem.objects.filter(
+                option_id__in=option_ids.values(), uuid__isnull=False, is_deleted=False
+            ).values_list("option_id", "uuid", "id")
+            if (option_id, str(uuid)) not in fresh
+        ]
+        OptionItem.objects.filter(id__in=stale_items).update(is_deleted=True)
+
+    def _sync_branches(self, branch_items, branches, product_ids):
+        links = []
+        for places_id, uuids in branch_items.items():
+            branch = branches.get(places_id)
+            if branch is None:
+                continue
+            branch_links = [
+                ProductToBranch(product_id=product_ids[uuid], institution_branches=branch)
+                for uuid in uuids
+                if uuid in product_ids
+            ]
+            links.extend(branch_links)
+            ProductToBranch.objects.filter(
+                institution_branches=branch,
+                product__institution=self.institution,
+                product__uuid__isnull=False,
+            ).exclude(product_id__in=[link.product_id for link in branch_links]).delete()
+
+        ProductToBranch.objects.bulk_create(
+            links, ignore_conflicts=True, unique_fields=["product", "institution_branches"]
+        )
+
+    def _sync_images(self, items, product_ids):
+        """
+        Downloads images of products which have none yet. Every URL is fetched once and
+        identical contents are stored as a single file shared by their products.
+        """
+        missing = set(
+            Product.objects.filter(id__in=product_ids.values())
+            .filter(Q(image="") | Q(image__isnull=True))
+            .values_list("id", flat=True)
+        )
+        urls = {}
+        for uuid, data in items.items():
+            images = data.get("images") or []
+            if uuid in product_ids and product_ids[uuid] in missing and images:
+                urls.setdefault(images[0]["url"], []).append(product_ids[uuid])
+
+        if not urls:
+            return
+
+        session = requests.Session()
+
+        def download(url):
+            try:
+                response = session.get(url, timeout=IMAGE_DOWNLOAD_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"Image download failed {url}: {e}")
+                return url, None
+            if response.status_code != 200:
+                return url, None
+            return url, response.content
+
+        contents = {}
+        with ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS) as executor:
+            for index, (url, content) in enumerate(executor.map(download, urls), start=1):
+                if content is not None:
+                    contents[url] = content
+                self.progress("images", index, len(urls))
+
+        # storage name of every distinct content, products sharing an image share the file
+        names = {}
+        products = Product.objects.in_bulk([pk for url in contents for pk in urls[url]])
+        updated = []
+        for url, content in contents.items():
+            digest = hashlib.sha256(content).hexdigest()
+            extension = os.path.splitext(url.split("?")[0])[1] or ".jpg"
+            for pk in urls[url]:
+                product = products[pk]
+                if digest in names:
+                    product.image.name = names[digest]
+                else:
+                    product.image.save(f"{digest[:16]}{extension}", ContentFile(content), save=False)
+                    names[digest] = product.image.name
+                updated.append(product)
+
+        Product.objects.bulk_update(updated, ["image"])
+        for product in updated:
+            generate_image_variants.delay(product._meta.label, product.pk, ["image"])
@@ -0,0 +1,8 @@
+from rest_framework import serializers
+
+from rkeeper.status import RESTAURANT_STATUSES
+
+
+class StatusCallbackSerializer(serializers.Serializer):
+    orderId = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=RESTAURANT_STATUSES)
@@ -1,11 +1,14 @@
+import hashlib
+import hmac
 import os
-import requests
 import redis
 
 import pytz
 import random
 from datetime import datetime, timedelta
 
+from common.metrics import timed_request
+
 def create_random_date():
 
     tz = pytz.timezone("Asia/Tashkent")
@@ -19,6 +22,17 @@ def create_random_date():
     print(new_time.isoformat())
     return new_time.isoformat()
 
+def sign_payload(body: bytes, secret=None):
+    secret = secret or os.getenv("RKEEPER_WEBHOOK_SECRET", "")
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def is_valid_signature(body: bytes, signature):
+    if not signature or not os.getenv("RKEEPER_WEBHOOK_SECRET"):
+        return False
+    return hmac.compare_digest(sign_payload(body), signature)
+
+
 class rkeeperAPI:
     BASE_URL = "https://yesexpress.burgerandco.deliveryhub.uz"
     TOKEN_EXPIRE_SECONDS = 3600
@@ -54,7 +68,7 @@ class rkeeperAPI:
             "grant_type": "client_credentials"
         }
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        response = requests.post(url, data=data, headers=headers)
+        response = timed_request("rkeeper", "get_token", "POST", url, data=data, headers=headers)
         response.raise_for_status()
         
         response_data = response.json()
@@ -68,35 +82,47 @@ class rkeeperAPI:
 
     def get_restaurants(self):
         url = f"{self.endpoint_url}/restaurants"
-        response = requests.get(url, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "get_restaurants", "GET", url, headers=self._get_headers()
+        )
         return response.json()
 
     def get_menu(self, restaurant_id):
         url = f"{self.endpoint_url}/menu/{restaurant_id}/composition"
         headers = self._get_headers()
         headers["Accept"] = "application/vnd.eats.menu.composition.v2+json"
-        response = requests.get(url, headers=headers)
+        response = timed_request("rkeeper", "get_menu", "GET", url, headers=headers)
         json_data = response.json()
         return json_data
 
     def get_stop_list(self, restaurant_id):
         url = f"{self.endpoint_url}/menu/{restaurant_id}/availability"
-        response = requests.get(url, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "get_stop_list", "GET", url, headers=self._get_headers()
+        )
+        # an error body must not be read as an empty stop-list
+        response.raise_for_status()
         return response.json()
 
     def create_order(self, order_data):
         url = f"{self.endpoint_url}/order"
-        response = requests.post(url, json=order_data, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "create_order", "POST", url, json=order_data, headers=self._get_headers()
+        )
         return response.json()
 
     def get_order_info(self, order_id):
         url = f"{self.endpoint_url}/order/{order_id}"
-        response = requests.get(url, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "get_order_info", "GET", url, headers=self._get_headers()
+        )
         return response.json()
 
     def get_order_status(self, order_id):
         url = f"{self.endpoint_url}/order/{order_id}/status"
-        response = requests.get(url, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "get_order_status", "GET", url, headers=self._get_headers()
+        )
         return response.json()
 
     def cancel_order(self, order_id, eats_id, comment):
@@ -105,7 +131,9 @@ class rkeeperAPI:
             "eatsId": eats_id,
             "comment": comment
         }
-        response = requests.delete(url, json=payload, headers=self._get_headers())
+        response = timed_request(
+            "rkeeper", "cancel_order", "DELETE", url, json=payload, headers=self._get_headers()
+        )
         return response.json()
 
 
@@ -146,4 +174,4 @@ class rkeeperAPI:
         response = self.create_order(_order)
         if response and isinstance(response, dict):
             order.uuid = response.get('orderId', None)
-            order.save()
+            order.save(update_fields=["uuid"])
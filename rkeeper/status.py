@@ -0,0 +1,61 @@
+import logging
+
+from django.db.models import Q
+from django.utils import timezone
+
+from order.models import Order
+from order.push_notifications.services import send_notification
+from order.status_controller import update_order_status
+
+logger = logging.getLogger(__name__)
+
+RESTAURANT_STATUSES = ["NEW", "ACCEPTED_BY_RESTAURANT", "COOKING", "READY", "CANCELLED"]
+
+# Statuses a restaurant status may be reached from, besides having none yet. Late or
+# replayed callbacks (e.g. COOKING after READY) are ignored instead of moving the order back.
+ALLOWED_PREVIOUS = {
+    "NEW": [],
+    "ACCEPTED_BY_RESTAURANT": ["NEW"],
+    "COOKING": ["NEW", "ACCEPTED_BY_RESTAURANT"],
+    "READY": ["NEW", "ACCEPTED_BY_RESTAURANT", "COOKING"],
+    "CANCELLED": ["NEW", "ACCEPTED_BY_RESTAURANT", "COOKING", "READY"],
+}
+
+
+def apply_restaurant_status(order: Order, status):
+    """
+    Moves the order to the restaurant status reported by rkeeper.
+
+    The status is set with a conditional UPDATE so that duplicated callbacks and
+    the polling fallback can't apply the same transition twice. Returns True if
+    the status was changed.
+    """
+    updated = (
+        Order.objects.filter(pk=order.pk, status="accepted")
+        .filter(
+            Q(restaurant_status__isnull=True) | Q(restaurant_status__in=ALLOWED_PREVIOUS[status])
+        )
+        .update(restaurant_status=status)
+    )
+    if not updated:
+        return False
+
+    order.restaurant_status = status
+    logger.info(f"Order {order.id} restaurant status set to {status}")
+
+    if status == "ACCEPTED_BY_RESTAURANT":
+        order.timeline.preparing_start_at = timezone.now()
+        order.timeline.save()
+        send_notification(
+            order.id,
+            f"Ваш заказ №{order.id} принят заведением",
+            "Ваш заказ принят заведением и скоро будет готов!",
+        )
+
+    if status == "READY":
+        update_order_status(order, "ready")
+
+    if status == "CANCELLED":
+        update_order_status(order, "rejected")
+
+    return True
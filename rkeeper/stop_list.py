@@ -0,0 +1,85 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from institution.models import InstitutionBranch
+from institution.services import bump_menu_version
+from product.models import ProductToBranch
+from rkeeper.importer import normalize_uuid
+from rkeeper.services import rkeeperAPI
+
+logger = logging.getLogger(__name__)
+
+STOP_LIST_WORKERS = 8
+
+
+def get_stopped_items(rkeeper, places_id):
+    """
+    Returns uuids of the items which are out of stock in the restaurant, raises if the
+    response carries no stop-list, so the branch is skipped instead of made available.
+    """
+    response = rkeeper.get_stop_list(places_id)
+    if not isinstance(response, dict) or not isinstance(response.get("items"), list):
+        raise ValueError(f"Unexpected stop-list response: {response}")
+    return {
+        normalize_uuid(item["itemId"]) for item in response["items"] if not item.get("stock")
+    }
+
+
+def sync_branch_stop_list(branch, stopped):
+    """Applies a fetched stop-list to the branch and returns True if anything changed."""
+    links = ProductToBranch.objects.filter(
+        institution_branches=branch, product__uuid__isnull=False
+    ).select_related("product").only("id", "is_available", "product__uuid")
+
+    changed = []
+    for link in links:
+        is_available = str(link.product.uuid) not in stopped
+        if link.is_available != is_available:
+            link.is_available = is_available
+            changed.append(link)
+
+    ProductToBranch.objects.bulk_update(changed, ["is_available"])
+    return bool(changed)
+
+
+def sync_stop_lists():
+    branches = list(
+        InstitutionBranch.objects.get_available()
+        .filter(
+            places_id__isnull=False,
+            institution__client_id__isnull=False,
+            institution__client_secret__isnull=False,
+        )
+        .exclude(places_id="")
+        .select_related("institution")
+    )
+
+    clients = {}
+    for branch in branches:
+        institution = branch.institution
+        if institution.id not in clients:
+            clients[institution.id] = rkeeperAPI(
+                endpoint_url=institution.endpoint_url,
+                client_id=institution.client_id,
+                client_secret=institution.client_secret,
+            )
+
+    def fetch(branch):
+        try:
+            return branch, get_stopped_items(clients[branch.institution_id], branch.places_id)
+        except Exception as e:
+            logger.warning(f"Stop-list fetch failed for branch {branch.id}: {e}")
+            return branch, None
+
+    with ThreadPoolExecutor(max_workers=STOP_LIST_WORKERS) as executor:
+        stop_lists = list(executor.map(fetch, branches))
+
+    changed_branches = [
+        branch.id
+        for branch, stopped in stop_lists
+        if stopped is not None and sync_branch_stop_list(branch, stopped)
+    ]
+    bump_menu_version(changed_branches)
+
+    logger.info(f"Stop-lists synced for {len(branches)} branches, changed {len(changed_branches)}")
+    return changed_branches
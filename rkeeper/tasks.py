@@ -0,0 +1,20 @@
+from celery import shared_task
+
+from institution.models import Institution
+from rkeeper.importer import MenuImporter
+from rkeeper.stop_list import sync_stop_lists
+
+
+@shared_task(bind=True)
+def import_menu(self, institution_id):
+    institution = Institution.objects.get(pk=institution_id)
+
+    def progress(stage, done, total):
+        self.update_state(state="PROGRESS", meta={"stage": stage, "done": done, "total": total})
+
+    return MenuImporter(institution, progress=progress).run()
+
+
+@shared_task
+def sync_stop_lists_task():
+    return sync_stop_lists()
@@ -0,0 +1,165 @@
+import json
+import threading
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from institution.models import Institution
+from order.models import Order, OrderItemGroup, OrderStatusTimeline
+from order.tasks import bulk_check_order_statuses
+from rkeeper.services import sign_payload
+from rkeeper.stop_list import get_stopped_items
+
+WEBHOOK_SECRET = "test-secret"
+
+
+class StubRkeeperHandler(BaseHTTPRequestHandler):
+    """Minimal rkeeper API: oauth token and order statuses from `server.statuses`."""
+
+    def _send(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.calls.append(self.path)
+        if self.path == "/security/oauth/token":
+            return self._send({"access_token": "stub-token", "expires_in": 3600})
+        self._send({}, status=404)
+
+    def do_GET(self):
+        self.server.calls.append(self.path)
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "order" and parts[2] == "status":
+            return self._send({"status": self.server.statuses.get(parts[1], "NEW")})
+        self._send({}, status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_rkeeper():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRkeeperHandler)
+    server.statuses = {}
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def order(db, mocker, monkeypatch, stub_rkeeper):
+    monkeypatch.setenv("RKEEPER_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    redis = mocker.patch("rkeeper.services.redis.StrictRedis").return_value
+    redis.get.return_value = None
+
+    institution = Institution.objects.create(
+        name="Test Institution",
+        phone_number="+998901234567",
+        type="restaurant",
+        endpoint_url=stub_rkeeper.url,
+        client_id="client",
+        client_secret="secret",
+    )
+    order = Order.objects.create(status="accepted", payment_method="cash", uuid=uuid.uuid4())
+    OrderItemGroup.objects.create(order=order, institution=institution)
+    OrderStatusTimeline.objects.create(order=order)
+
+    mocker.patch("rkeeper.status.send_notification")
+    mocker.patch("rkeeper.status.update_order_status")
+    return order
+
+
+def post_status(order, status, secret=WEBHOOK_SECRET):
+    body = json.dumps({"orderId": str(order.uuid), "status": status}).encode()
+    return APIClient().post(
+        "/api/rkeeper/status/",
+        body,
+        content_type="application/json",
+        HTTP_X_SIGNATURE=sign_payload(body, secret),
+    )
+
+
+def test_webhook_rejects_invalid_signature(order):
+    response = post_status(order, "COOKING", secret="wrong")
+
+    assert response.status_code == 403
+    order.refresh_from_db()
+    assert order.restaurant_status is None
+
+
+def test_webhook_deduplicates_callbacks(order):
+    first = post_status(order, "COOKING")
+    second = post_status(order, "COOKING")
+
+    assert first.data["changed"] is True
+    assert second.data["changed"] is False
+    order.refresh_from_db()
+    assert order.restaurant_status == "COOKING"
+
+
+def test_webhook_ignores_stale_callbacks(order):
+    post_status(order, "READY")
+    response = post_status(order, "COOKING")
+
+    assert response.data["changed"] is False
+    order.refresh_from_db()
+    assert order.restaurant_status == "READY"
+
+
+def test_webhook_routes_ready_into_update_order_status(order, mocker):
+    update_order_status = mocker.patch("rkeeper.status.update_order_status")
+
+    post_status(order, "READY")
+
+    update_order_status.assert_called_once()
+    assert update_order_status.call_args.args[1] == "ready"
+
+
+def test_polling_reconciles_missed_callbacks(order, stub_rkeeper):
+    stub_rkeeper.statuses[str(order.uuid)] = "COOKING"
+    Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+
+    bulk_check_order_statuses()
+
+    order.refresh_from_db()
+    assert order.restaurant_status == "COOKING"
+    assert f"/order/{order.uuid}/status" in stub_rkeeper.calls
+
+
+def test_polling_skips_recently_updated_orders(order, stub_rkeeper):
+    stub_rkeeper.statuses[str(order.uuid)] = "COOKING"
+
+    bulk_check_order_statuses()
+
+    order.refresh_from_db()
+    assert order.restaurant_status is None
+    assert stub_rkeeper.calls == []
+
+
+class StubStopListClient:
+    def __init__(self, response):
+        self.response = response
+
+    def get_stop_list(self, places_id):
+        return self.response
+
+
+def test_stop_list_requires_items():
+    item_id = uuid.uuid4()
+    client = StubStopListClient({"items": [{"itemId": str(item_id).upper(), "stock": 0}]})
+
+    assert get_stopped_items(client, "place") == {str(item_id)}
+    with pytest.raises(ValueError):
+        get_stopped_items(StubStopListClient({"error": "unavailable"}), "place")
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("status/", views.StatusWebhookView.as_view()),
+]
@@ -0,0 +1,37 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from order.models import Order
+from rkeeper.serializers import StatusCallbackSerializer
+from rkeeper.services import is_valid_signature
+from rkeeper.status import apply_restaurant_status
+
+
+class StatusWebhookView(APIView):
+    """
+    Receives order status changes pushed by rkeeper.
+
+    Requests are signed with HMAC-SHA256 of the raw body using RKEEPER_WEBHOOK_SECRET
+    and sent in the X-Signature header.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request):
+        if not is_valid_signature(request.body, request.headers.get("X-Signature")):
+            return Response({"detail": "Invalid signature"}, status=403)
+
+        serializer = StatusCallbackSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        order = (
+            Order.objects.select_related("timeline")
+            .filter(uuid=serializer.validated_data["orderId"])
+            .first()
+        )
+        if order is None:
+            return Response({"detail": "Not found"}, status=404)
+
+        changed = apply_restaurant_status(order, serializer.validated_data["status"])
+        return Response({"status": "ok", "changed": changed})
@@ -1,5 +1,6 @@
 from rest_framework.permissions import AllowAny
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from common.cache import cached_response
 from stories.models import Stories
 from .serializers import StoriesSerializer
 from django.utils.timezone import now
@@ -23,6 +24,10 @@ class StoriesList(ListAPIView):
         ).filter(
             end_date__gte=now()
         )
+
+    @cached_response(tags=["stories"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
     
 
 
@@ -32,3 +37,7 @@ class StoriesDetail(RetrieveAPIView):
     permission_classes = [
         AllowAny,
     ]
+
+    @cached_response(tags=["stories"])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
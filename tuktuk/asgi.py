@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 import os
 
 import django
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
 from channels.auth import AuthMiddlewareStack
@@ -21,6 +22,13 @@ from order.websocket_urls import websocket_urlpatterns as order_urls
 from order.consumers import TelegramBotConsumer
 from order.push_notifications.consumers import FirebaseConsumer
 from courier.websocket_urls import websocket_urlpatterns as courier_urls
+from common.metrics import BacklogCollector, start_metrics_server
+
+# set for runworker only, daphne serves /metrics/ through the http router
+if settings.METRICS_PORT:
+    start_metrics_server(
+        int(settings.METRICS_PORT), BacklogCollector(channels=settings.METRICS_CHANNELS)
+    )
 
 websocket_urlpatterns = order_urls + courier_urls
 
@@ -1,6 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 import os
+import time
+
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tuktuk.settings')
 
@@ -12,6 +15,34 @@ app.conf.broker_connection_retry_on_startup = True
 
 app.autodiscover_tasks()
 
+_task_started = {}
+
+
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    from django.conf import settings
+    from common.metrics import BacklogCollector, start_metrics_server
+
+    if settings.METRICS_PORT:
+        start_metrics_server(
+            int(settings.METRICS_PORT),
+            BacklogCollector(celery_queues=settings.METRICS_CELERY_QUEUES),
+        )
+
+
+@task_prerun.connect
+def remember_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task_duration(task_id=None, task=None, state=None, **kwargs):
+    from common.metrics import CELERY_TASK_DURATION
+
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, state).observe(time.perf_counter() - started)
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
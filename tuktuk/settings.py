@@ -70,12 +70,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "common.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "base.db_router.PrimaryPinMiddleware",
+    "common.events.EventBatchMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -112,6 +115,18 @@ DATABASES = {
         'CONN_MAX_AGE': 60, 
     }
 }
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["base.db_router.ReplicaRouter"]
+# seconds the replica may lag behind before reads fall back to the primary
+REPLICA_MAX_LAG = int(os.getenv("DB_REPLICA_MAX_LAG", 5))
+# seconds a user reads from the primary after their own write
+REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", 10))
 DISABLE_SERVER_SIDE_CURSORS = True
 
 FCM_DJANGO_SETTINGS = {
@@ -179,6 +194,17 @@ LOGGING = {
         },
     },
 }
+
+# requests slower or issuing more queries than this are logged with their repeated SQL
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 1000))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", 100))
+REQUEST_METRICS_FLUSH_INTERVAL = 10
+
+# Prometheus scrape endpoints, see common.metrics; /metrics/ requires this bearer token if set
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_CELERY_QUEUES = ["celery", "sms"]
+METRICS_CHANNELS = ["telegram-notify", "firebase-notify"]
         
 WSGI_APPLICATION = "tuktuk.wsgi.application"
 
@@ -227,12 +253,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "base.authentication.CachedTokenAuthentication",
+        "base.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (),
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "base.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "base.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "EXCEPTION_HANDLER": "core.exception_handlers.custom_exception_handler",
     "DEFAULT_SCHEMA_CLASS": "rest_framework_gis.schema.GeoFeatureAutoSchema",
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -265,6 +300,18 @@ PLAY_MOBILE_SETTINGS = {
         "PLAY_MOBILE_NICKNAME"
     ),  # if this field is empty default 3700 or set your originator name
 }
+# seconds a gateway call may take, sms are sent from celery and retried on errors
+SMS_TIMEOUT = 10
+SMS_POOL_SIZE = 10
+SMS_MAX_RETRIES = 4
+SMS_RETRY_BACKOFF_MAX = 30
+
+# one time passwords, see user.services
+OTP_TTL = 80
+OTP_MAX_ATTEMPTS = 5
+OTP_THROTTLE_WINDOW = 60 * 10
+OTP_PHONE_LIMIT = int(os.getenv("OTP_PHONE_LIMIT", 3))
+OTP_IP_LIMIT = int(os.getenv("OTP_IP_LIMIT", 20))
 
 THUMBNAIL_ALIASES = {
     "": {
@@ -289,12 +336,52 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f'redis://{os.getenv("REDIS_HOST")}:{os.getenv("REDIS_PORT")}/1',
+        "KEY_PREFIX": "tuktuk",
+    }
+}
+# seconds catalog responses are cached for, changes invalidate them earlier
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60))
+
+# seconds authenticated users are cached for in Redis and in each process, see base.authentication
+AUTH_CACHE_TIMEOUT = int(os.getenv("AUTH_CACHE_TIMEOUT", 300))
+AUTH_LOCAL_CACHE_TIMEOUT = int(os.getenv("AUTH_LOCAL_CACHE_TIMEOUT", 5))
+
+# events kept per websocket group for reconnecting sockets, see common.events
+WEBSOCKET_STREAM_MAXLEN = int(os.getenv("WEBSOCKET_STREAM_MAXLEN", 500))
+WEBSOCKET_STREAM_TTL = 60 * 60 * 24
+
 # Redis broker
 CELERY_BROKER_URL = f'redis://{os.getenv("REDIS_HOST")}:{os.getenv("REDIS_PORT")}/0'
 CELERY_RESULT_BACKEND = f'redis://{os.getenv("REDIS_HOST")}:{os.getenv("REDIS_PORT")}/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+# one time password SMS have a worker of their own, see celery_sms_worker
+CELERY_TASK_ROUTES = {
+    "user.tasks.send_sms": {"queue": "sms"},
+}
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    "rkeeper-stop-lists": {
+        "task": "rkeeper.tasks.sync_stop_lists_task",
+        "schedule": int(os.getenv("RKEEPER_STOP_LIST_INTERVAL", 120)),
+    },
+    "rkeeper-order-statuses": {
+        "task": "order.tasks.bulk_check_order_statuses",
+        "schedule": int(os.getenv("RKEEPER_STATUS_RECONCILE_INTERVAL", 300)),
+    },
+    "order-stats-compaction": {
+        "task": "order.tasks.compact_order_stats_task",
+        "schedule": int(os.getenv("ORDER_STATS_COMPACTION_INTERVAL", 900)),
+    },
+    "balance-rollup": {
+        "task": "payment.tasks.rollup_balances_task",
+        "schedule": int(os.getenv("BALANCE_ROLLUP_INTERVAL", 300)),
+    },
+}
 
 PAYME_SETTINGS = {
     "api_url": os.getenv("PAYME_URL"),
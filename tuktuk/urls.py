@@ -17,6 +17,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from common.views import metrics
 from crm.admin_views import OrderReportView, UserCheckView
 from .settings import DEBUG, MEDIA_URL, MEDIA_ROOT, STATIC_ROOT, STATIC_URL
 
@@ -24,6 +25,7 @@ urlpatterns = [
     path("admin/order-reports/", OrderReportView.as_view(), name="order-reports"),
     path("user-check/", UserCheckView.as_view(), name="order-reports"),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics, name="metrics"),
     path("", include("crm.urls")),
     path("api/", include("api.urls")),
     path("api/crm/", include("api.crm_urls")),
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0012_customfcmdevice"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="user",
+            name="otp_change_number",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="otp_change_number_expires",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="otp_expires",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="otp",
+        ),
+    ]
@@ -1,6 +1,3 @@
-from datetime import datetime, timedelta
-from random import randint
-
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -30,14 +27,6 @@ class User(AbstractUser):
 
     USERNAME_FIELD = "phone_number"
 
-    # one time password fields for registering
-    otp = models.IntegerField(verbose_name="SMS код", null=True, blank=True)
-    otp_expires = models.DateTimeField(verbose_name="Срок SMS кода", null=True)
-
-    # otp fields for change number
-    otp_change_number = models.IntegerField(null=True, blank=True)
-    otp_change_number_expires = models.DateTimeField(null=True, blank=True)
-
     objects = CustomUserManager()
 
     def __str__(self):
@@ -52,22 +41,6 @@ class User(AbstractUser):
             return self.worker_branch.institution_branch_id
         return None
 
-    def set_otp(self, number_change=False) -> int:
-        otp = randint(1000, 9999)
-        expires = datetime.now() + timedelta(seconds=80)
-
-        if number_change:
-            self.otp_change_number = otp
-            self.otp_change_number_expires = expires
-        else:
-            self.otp = otp
-            self.otp_expires = expires
-
-        self.save(
-            update_fields=["otp", "otp_expires", "otp_change_number", "otp_change_number_expires"]
-        )
-        return otp
-
     @staticmethod
     def get_worker_types():
         return ["main_admin", "admin", "operator", "content_manager", "logist"]
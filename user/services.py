@@ -1,14 +1,54 @@
+"""
+One time passwords kept in Redis and sent by SMS from a celery task.
+
+A code lives OTP_TTL seconds in a hash with the number of checks made against it and
+is dropped once it matched or OTP_MAX_ATTEMPTS checks failed. Sending is limited per
+destination phone and per client IP within OTP_THROTTLE_WINDOW.
+"""
 import json
 import logging
+import os
+import time
+from random import randint
 
-from django.utils import timezone
-from django.conf import settings
-
+import redis
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import Throttled
 
+from common.metrics import timed_request
 from .models import User
 from user.config_sms import Config
 
+OTP_KEY = "otp:{}:{}"
+THROTTLE_KEY = "otp-throttle:{}:{}"
+
+_redis = {}
+_session = {}
+
+
+def get_redis():
+    if "client" not in _redis:
+        _redis["client"] = redis.StrictRedis(
+            host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=0
+        )
+    return _redis["client"]
+
+
+def get_sms_session():
+    """One keep-alive connection pool to the gateway per process."""
+    if "session" not in _session:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_maxsize=settings.SMS_POOL_SIZE))
+        session.mount("http://", HTTPAdapter(pool_maxsize=settings.SMS_POOL_SIZE))
+        _session["session"] = session
+    return _session["session"]
+
+
+def get_otp_key(user: User, number_change: bool = False) -> str:
+    return OTP_KEY.format("change_number" if number_change else "login", user.id)
+
 
 def handle_user_delete(user):
     if user:
@@ -17,45 +57,89 @@ def handle_user_delete(user):
         user.save()
 
 
+def set_otp(user: User, number_change: bool = False) -> int:
+    otp = randint(1000, 9999)
+    key = get_otp_key(user, number_change)
+    pipeline = get_redis().pipeline()
+    pipeline.delete(key)
+    pipeline.hset(key, mapping={"otp": otp, "attempts": 0})
+    pipeline.expire(key, settings.OTP_TTL)
+    pipeline.execute()
+    return otp
+
+
 def check_otp(user: User, otp: int, number_change: bool = False) -> bool:
     """
     Checks if the given otm is correct for this user and not dated
     """
     # for test purposes only!
     ###
-    if settings.DEBUG and otp == 1111:
+    if settings.DEBUG and str(otp) == "1111":
         return True
     ####
-    if user.phone_number == '+998995948233' and otp == 1234:
+    if user.phone_number == '+998995948233' and str(otp) == "1234":
         return True
 
-    otp_field = "otp_change_number" if number_change else "otp"
-    otp_expires_field = "otp_change_number_expires" if number_change else "otp_expires"
+    key = get_otp_key(user, number_change)
+    pipeline = get_redis().pipeline()
+    pipeline.hget(key, "otp")
+    pipeline.hincrby(key, "attempts", 1)
+    expected, attempts = pipeline.execute()
+    if expected is None:
+        get_redis().delete(key)
+        return False
+
+    is_correct = expected.decode() == str(otp).strip()
+    if is_correct or attempts >= settings.OTP_MAX_ATTEMPTS:
+        get_redis().delete(key)
+    return is_correct
 
-    if timezone.now() < getattr(user, otp_expires_field):
-        return otp == getattr(user, otp_field)
 
+def throttle(scope, value, limit):
+    """Counts a send in the current window, raises Throttled past the limit."""
+    key = THROTTLE_KEY.format(scope, value)
+    pipeline = get_redis().pipeline()
+    pipeline.set(key, 0, ex=settings.OTP_THROTTLE_WINDOW, nx=True)
+    pipeline.incr(key)
+    pipeline.ttl(key)
+    _, count, ttl = pipeline.execute()
+    if count > limit:
+        raise Throttled(wait=max(ttl, 1))
 
-def send_otp_sms(user: User, number_change: bool = False) -> bool:
+
+def send_otp_sms(user: User, number_change: bool = False, ip: str = None) -> bool:
     """
-    Generates one time password for given user and send sms to it
+    Generates one time password for given user and queues an sms with it
     """
+    from user.tasks import send_sms
+
+    throttle("phone", user.phone_number, settings.OTP_PHONE_LIMIT)
+    if ip:
+        throttle("ip", ip, settings.OTP_IP_LIMIT)
 
-    user.set_otp(number_change)
-    otp = user.otp_change_number if number_change else user.otp
+    otp = set_otp(user, number_change)
 
     text = f"YES EXPRESS: Vash kod podtverjdeniya: {otp}"
 
-    return _send_sms(user.phone_number, text)
+    try:
+        send_sms.apply_async(
+            (user.phone_number, text),
+            {"deadline": time.time() + settings.OTP_TTL},
+            expires=settings.OTP_TTL,
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при отправке смс {e}")
+        return False
+    return True
 
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
-def _send_sms(phone_number, text) -> bool:
+def _send_sms(phone_number, text):
     """
-    Sends the given text to given phone number
+    Sends the given text to given phone number, raises requests exceptions
     """
     if phone_number.startswith("+"):
         phone_number = phone_number.lstrip("+")
@@ -68,11 +152,13 @@ def _send_sms(phone_number, text) -> bool:
         # 'nickname': config.NICKNAME,
         "data": json.dumps([{"phone": phone_number, "text": text}]),
     }
-    try:
-        result = requests.post(config.URL, json=data)
-        result.raise_for_status()
-        print(result.text)
-        return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при отправке смс {e}")
-        return False
+    result = timed_request(
+        "sms",
+        "send",
+        "POST",
+        config.URL,
+        session=get_sms_session(),
+        json=data,
+        timeout=settings.SMS_TIMEOUT,
+    )
+    result.raise_for_status()
@@ -0,0 +1,29 @@
+import logging
+import time
+
+import requests
+from celery import shared_task
+from django.conf import settings
+
+from user.services import _send_sms
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=settings.SMS_MAX_RETRIES)
+def send_sms(self, phone_number, text, deadline=None):
+    """
+    "deadline" is when the code in the text expires, an sms that can't be delivered
+    before it is not sent nor retried.
+    """
+    if deadline is not None and time.time() >= deadline:
+        logger.warning(f"Смс на {phone_number} не отправлено, код уже истёк")
+        return
+    try:
+        _send_sms(phone_number, text)
+    except requests.RequestException as e:
+        logger.error(f"Ошибка при отправке смс {e}, попытка {self.request.retries + 1}")
+        countdown = min(2 ** (self.request.retries + 1), settings.SMS_RETRY_BACKOFF_MAX)
+        if deadline is not None and time.time() + countdown + settings.SMS_TIMEOUT >= deadline:
+            raise
+        raise self.retry(exc=e, countdown=countdown)
@@ -1,6 +1,7 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from base.helpers import get_client_ip
 from user.models import User
 from user.services import send_otp_sms, check_otp
 
@@ -21,7 +22,7 @@ class ChangeNumberView(APIView):
         user.phone_number = phone_number
         # set new phone number but not save it yet
 
-        is_success = send_otp_sms(user, number_change=True)
+        is_success = send_otp_sms(user, number_change=True, ip=get_client_ip(request))
 
         if not is_success:
             return Response({"detail": "error"}, status=500)
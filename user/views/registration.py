@@ -5,8 +5,9 @@ from rest_framework import views
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
 
+from base.authentication import CachedTokenAuthentication, forget_user
+from base.helpers import get_client_ip
 from user.models import CustomFCMDevice, User
 from user.serializers import CustomFCMDeviceSerializer, UserSerializer
 from user.services import check_otp, send_otp_sms
@@ -45,7 +46,7 @@ class GetVerificationCodeAPIView(views.APIView):
         if settings.DEBUG or user.phone_number == "998111111111":
             return Response(status=200)
 
-        is_success = send_otp_sms(user)
+        is_success = send_otp_sms(user, ip=get_client_ip(request))
 
         if not is_success:
             return Response({"detail": "error"}, status=500)
@@ -99,7 +100,7 @@ class VerifyAPIView(views.APIView):
             return Response({"detail": "the otp is not correct", "error_code": "-3"}, status=400)
 
 class LogoutAPIView(views.APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
@@ -114,13 +115,14 @@ class LogoutAPIView(views.APIView):
             device = CustomFCMDevice.objects.filter(user=user, registration_id=register_id, device_id=device_id, app_name=app_name, type=type).first()
             if device:
                 device.delete()
+            forget_user(user.id)
 
             return Response({"status": "success"}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"detail": f"User Device not registered, {e}", "error_code": "-2"}, status.HTTP_400_BAD_REQUEST)
 
 class CustomFCMDeviceView(views.APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = CustomFCMDeviceSerializer
 